@@ -0,0 +1,270 @@
+"""
+Records what instruments are asked and how they answer (and how long they take to), so the sessions can be played
+back later without the instruments. That way the data taking and the GUI can be tested and tuned against how the real
+instruments behave instead of the made up noise and delays in fake_gpib_devices.
+
+Record with the server:
+    server = GpibServer(capture_file="session.jsonl")
+or around any device:
+    lakeshore = capture.Recorder(gpib.Device(13), capture.Capture("session.jsonl"), "LS")
+and play it back anywhere a gpib.Fake goes, like in get.devices:
+    "LS": {"driver": "capture.Replay", "address": 13, "filename": "session.jsonl", "captured_id": "LS", "speed": 1.}
+
+author: Teddy Tortorici
+"""
+
+import builtins
+import json
+import threading
+import time
+import numpy as np
+import pyvisa
+from gpib import Fake, TimedOut
+
+
+def encode_response(response, block: bool = False):
+    """
+    Turn a response into something that can be saved as JSON: text stays text and arrays become lists
+    :param block: the response is from query_binary, so save its raw bytes as {"hex": bytes as hex} instead. That way
+    it can be played back as any data type
+    """
+    if isinstance(response, TimedOut):
+        return {"timed out": True}     # so it plays back as a timeout, not just the text
+    if isinstance(response, np.ndarray):
+        return {"hex": response.tobytes().hex()} if block else response.tolist()
+    if isinstance(response, (bytes, bytearray)):
+        return {"hex": bytes(response).hex()}
+    if hasattr(response, 'item'):
+        return response.item()
+    return response
+
+
+def decode_response(response):
+    """The opposite of encode_response(). Blocks come back as bytes, lists as arrays and timeouts as gpib.TimedOut"""
+    if isinstance(response, dict) and response.get("timed out"):
+        return TimedOut("timed out")
+    if isinstance(response, dict) and "hex" in response:
+        return bytes.fromhex(response["hex"])
+    if isinstance(response, list):
+        return np.array(response)
+    return response
+
+
+def encode_error(error: Exception) -> dict:
+    """Turn an exception a device raised into something that can be saved as JSON"""
+    encoded = {"type": type(error).__name__, "message": str(error)}
+    if isinstance(error, pyvisa.errors.VisaIOError):
+        encoded["code"] = int(error.error_code)
+    return encoded
+
+
+class CapturedError(Exception):
+    """Raised when playing back an exception that isn't a VisaIOError or a built in exception"""
+    pass
+
+
+def decode_error(error: dict) -> Exception:
+    """The opposite of encode_error(): an exception like the one that was recorded, ready to be raised"""
+    if error["type"] == "VisaIOError" and "code" in error:
+        return pyvisa.errors.VisaIOError(error["code"])
+    error_type = getattr(builtins, error["type"], None)
+    if isinstance(error_type, type) and issubclass(error_type, Exception):
+        return error_type(error["message"])
+    return CapturedError(f"{error['type']}: {error['message']}")
+
+
+class Capture:
+
+    def __init__(self, filename: str, flush_interval: float = 1.):
+        """
+        Saves every command sent to the instruments, with its response (or the exception it raised) and latency, as a
+        JSON line in a file. Lines go through the file's buffer, so recording doesn't hold up talking to the
+        instruments
+        :param filename: file to add the session to
+        :param flush_interval: push the buffer to the file when it's been at least this long (in seconds) since the
+        last time, so a crash loses at most about this much of the session
+        """
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.file = open(filename, "a", buffering=1 << 16)
+        self.lock = threading.Lock()        # devices are recorded from the server's worker threads
+        self.start = time.time()
+        self.last_flush = time.monotonic()
+        self.count = 0
+
+    def record(self, dev_id: str, method: str, message: str, response, latency: float, error: Exception = None):
+        """
+        Record one command
+        :param dev_id: id of the device it went to
+        :param method: the device method that was called: "write", "query", "read", "query_ascii" or "query_binary"
+        :param message: what was sent (empty for read)
+        :param response: what the device method returned (None if it raised)
+        :param latency: how long the device took to answer (or raise), in seconds
+        :param error: the exception the device method raised, if it did
+        """
+        entry = {"t": time.time() - self.start, "dev": dev_id, "method": method, "message": message,
+                 "response": encode_response(response, method == "query_binary"), "latency": latency}
+        if error is not None:
+            entry["error"] = encode_error(error)
+        line = json.dumps(entry, default=str) + "\n"
+        with self.lock:
+            if self.file.closed:
+                return
+            self.count += 1
+            self.file.write(line)
+            if self.flush_interval is not None and time.monotonic() - self.last_flush > self.flush_interval:
+                self.flush_locked()
+
+    def flush(self):
+        """Write everything recorded so far to the file"""
+        with self.lock:
+            if not self.file.closed:
+                self.flush_locked()
+
+    def flush_locked(self):
+        """Write everything recorded so far to the file. Must be called with self.lock held"""
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class Recorder:
+
+    def __init__(self, device, capture: Capture, dev_id: str):
+        """
+        Wraps a device (a gpib.Device, or anything with the same methods) so everything it's asked gets recorded.
+        Use it in place of the device
+        :param device: the device to record
+        :param capture: where to record to
+        :param dev_id: the id to record the commands under
+        """
+        self.device = device
+        self.capture = capture
+        self.dev_id = dev_id
+
+    def __getattr__(self, name):
+        # anything not recorded (like address or close()) goes straight to the device
+        return getattr(self.device, name)
+
+    def timed(self, method: str, message: str, function, *args, **kwargs):
+        """
+        Call one of the device's methods (function) with args and kwargs, and record it under 'method'. If it raises,
+        the exception is recorded (so it gets raised again on playback) and raised
+        """
+        start = time.perf_counter()
+        try:
+            response = function(*args, **kwargs)
+        except Exception as e:
+            self.capture.record(self.dev_id, method, message, None, time.perf_counter() - start, error=e)
+            raise
+        self.capture.record(self.dev_id, method, message, response, time.perf_counter() - start)
+        return response
+
+    def read(self) -> str:
+        return self.timed("read", "", self.device.read)
+
+    def write(self, msg: str):
+        return self.timed("write", msg, self.device.write, msg)
+
+    def query(self, msg: str) -> str:
+        return self.timed("query", msg, self.device.query, msg)
+
+    def query_ascii(self, msg: str, sep=',', converter='f') -> np.ndarray:
+        return self.timed("query_ascii", msg, self.device.query_ascii, msg, sep=sep, converter=converter)
+
+    def query_binary(self, msg: str, dtype='f4', big_endian: bool = False, expect_termination: bool = True):
+        return self.timed("query_binary", msg, self.device.query_binary, msg, dtype=dtype, big_endian=big_endian,
+                          expect_termination=expect_termination)
+
+    def get_id(self):
+        return self.query("*IDN?")
+
+
+def load(filename: str, dev_id: str = None) -> list:
+    """Read a captured session back as a list of dictionaries, optionally only the ones for one device"""
+    records = []
+    with open(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if dev_id is None or record["dev"] == dev_id.upper():
+                    records.append(record)
+    return records
+
+
+class Replay(Fake):
+
+    def __init__(self, address: int, gpib_num: int = 0, filename: str = None, captured_id: str = None,
+                 speed: float = 1., records: list = None):
+        """
+        A fake device that answers the way a device did in a captured session. Each command gets the responses
+        recorded for it in the order they were recorded (starting over when it runs out), each after the latency that
+        was recorded for it. Commands that raised when they were recorded raise the same kind of exception
+        :param address: GPIB address (only kept for show, like gpib.Fake)
+        :param filename: captured session to play back
+        :param captured_id: id of the device in the session to play back. None to use every command in the file
+        :param speed: how many times faster than real time to answer. 0 (or None) to answer right away
+        :param records: records to play back instead of loading them from a file (like from load())
+        """
+        super(self.__class__, self).__init__(address, gpib_num)
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.responses = {}     # (method, message) -> list of (response, latency, error or None)
+        self.positions = {}     # (method, message) -> index of the next response to give
+        for record in (load(filename, captured_id) if records is None else records):
+            key = (record["method"], self.normalize(record["message"]))
+            self.responses.setdefault(key, []).append((record["response"], record["latency"], record.get("error")))
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        # the server sends messages in upper case, so match them that way
+        return (message or "").strip().upper()
+
+    def replay(self, method: str, message: str):
+        """
+        Wait for and return the next recorded response to a command
+        :return: the response, or None if that command was never recorded
+        :raises Exception: the recorded exception (see decode_error()), if the command raised when it was recorded
+        """
+        key = (method, self.normalize(message))
+        if key not in self.responses:
+            return None
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = (position + 1) % len(self.responses[key])
+        response, latency, error = self.responses[key][position]
+        if self.speed:
+            time.sleep(latency / self.speed)
+        if error is not None:
+            raise decode_error(error)
+        return decode_response(response)
+
+    def read(self) -> str:
+        response = self.replay("read", "")
+        return Fake.read() if response is None else response
+
+    def write(self, msg: str):
+        return self.replay("write", msg)
+
+    def query(self, msg: str) -> str:
+        response = self.replay("query", msg)
+        return Fake.query(msg) if response is None else response
+
+    def query_ascii(self, msg: str, sep=',', converter='f') -> np.ndarray:
+        response = self.replay("query_ascii", msg)
+        return Fake.query_ascii(msg) if response is None else response
+
+    def query_binary(self, msg: str, dtype='f4', big_endian: bool = False, expect_termination: bool = True):
+        response = self.replay("query_binary", msg)
+        if response is None:
+            return Fake.query_binary(msg, dtype, big_endian)
+        if isinstance(response, str):       # like "timed out"
+            return response
+        dtype = np.dtype(dtype).newbyteorder('>' if big_endian else '<')
+        return np.frombuffer(response, dtype=dtype, count=len(response) // dtype.itemsize)
+
+    def get_id(self):
+        return self.query("*IDN?")
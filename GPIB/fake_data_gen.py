@@ -1,6 +1,8 @@
 import numpy as np
 import time
 import os
+from csv_writer import CSVWriter
+from scheduler import PeriodicScheduler
 
 
 class DataFile:
@@ -10,6 +12,7 @@ class DataFile:
         if '.csv' not in name:
             name += '.csv'
         self.filename = os.path.join(path, name)
+        self.writer = CSVWriter(self.filename)
         self.create_file()
         self.write_comment("THIS IS A FAKE DATA FILE!!")
 
@@ -17,12 +20,13 @@ class DataFile:
 
         self.write_row(self.column_labels)
 
-    def run(self):
-        while True:
+    def run(self, period: float = 1.):
+        """Make a data point every 'period' seconds, forever"""
+        scheduler = PeriodicScheduler(period)
+        while scheduler.wait():
             data = self.generate_data_point()
             print(data)
             self.write_row(data)
-            time.sleep(0.5+np.random.random())
 
     @staticmethod
     def generate_data_point():
@@ -32,17 +36,15 @@ class DataFile:
 
     def write_row(self, row_to_write: list):
         """Turns a list into a comma delimited row to write to the csv file"""
-        with open(self.filename, 'a') as f:
-            f.write(str(row_to_write).lstrip('[').rstrip(']') + '\n')
+        self.writer.write_row(row_to_write)
 
     def write_comment(self, comment: str):
         """Writes a comment line in the csv file"""
-        with open(self.filename, 'a') as f:
-            f.write(f'# {comment}\n')
+        self.writer.write_comment(comment)
 
     def create_file(self):
-        with open(self.filename, 'w') as f:
-            f.write(f'# This FAKE data file was created on {time.ctime(time.time())}\n')
+        self.writer.truncate()
+        self.writer.write_comment(f'This FAKE data file was created on {time.ctime(time.time())}')
 
 
 if __name__ == "__main__":
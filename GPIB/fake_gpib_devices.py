@@ -1,5 +1,6 @@
 import numpy as np
 import time
+import get
 from gpib import Fake
 from client_tools import DeviceClient
 
@@ -7,25 +8,31 @@ imported_time = time.time()
 
 
 class FakeVoltageSupply(DeviceClient):
-    def __init__(self):
-        super(self.__class__, self).__init__('VS')
+
+    delay = 1.      # seconds each command pretends to take on top of the server's time
+
+    def __init__(self, port: int = get.port):
+        super(self.__class__, self).__init__('VS', port=port)
 
     def set_voltage(self, voltage):
-        time.sleep(1)
+        time.sleep(self.delay)
         self.write(f'V: {voltage:.2f}')
         return f'Set voltage to {voltage:.2f}'
 
     def read_voltage(self):
-        time.sleep(1)
+        time.sleep(self.delay)
         return self.query('V?')
 
 
 class FakePhotonCounter(DeviceClient):
-    def __init__(self):
-        super(self.__class__, self).__init__('PC')
+
+    delay = 1.      # seconds each command pretends to take on top of the server's time
+
+    def __init__(self, port: int = get.port):
+        super(self.__class__, self).__init__('PC', port=port)
 
     def read_counts(self):
-        time.sleep(1)
+        time.sleep(self.delay)
         return self.query('C?')
 
 
@@ -60,3 +67,36 @@ class PhotonCounter(Fake):
             return str(3000 + 1000 * np.random.random() * np.sin(time.time()))
         else:
             return f"You queried the fake GPIB interface with {msg}"
+
+
+class Latency(Fake):
+    def __init__(self, address: int, gpib_num: int = 0, latency: float = 0.001, responses: dict = None,
+                 default: str = "1.0"):
+        """
+        A fake device that takes a set time to answer, for benchmarking
+        :param latency: seconds every command takes
+        :param responses: start of a message -> response to it, like {"PID?": "1,1,1"}
+        :param default: response to any other query
+        """
+        super(self.__class__, self).__init__(address, gpib_num)
+        self.latency = latency
+        self.responses = dict(responses or {})
+        self.default = default
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def write(self, msg: str):
+        self.wait()
+
+    def read(self) -> str:
+        self.wait()
+        return self.default
+
+    def query(self, msg: str) -> str:
+        self.wait()
+        for start, response in self.responses.items():
+            if msg.startswith(start):
+                return response
+        return self.default
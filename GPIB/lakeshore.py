@@ -12,8 +12,12 @@ import client_tools as client
 
 
 class Client(client.DeviceClient):
-    def __init__(self, inst_num: int = 331, host: str = "localhost", port: int = 62538):
-        super(self.__class__, self).__init__(dev_id="LS", host=host, port=port)
+    def __init__(self, inst_num: int = 331, host: str = "localhost", port: int = 62538, persistent: bool = True,
+                 query_pid: bool = True):
+        """
+        :param query_pid: ask for the PID values right away. If False, they're only asked for when set_pid() needs them
+        """
+        super(self.__class__, self).__init__(dev_id="LS", host=host, port=port, persistent=persistent)
 
         self.inst_num = inst_num
 
@@ -25,7 +29,13 @@ class Client(client.DeviceClient):
         else:
             self.heater_ranges = np.array([0.0, 0.5, 5.0, 50.0])
         # Get PID values set on channel 1 and 2. the 0th entry is a dummy, since the loops index from 1
-        self.PID = [0, self.read_pid(1), self.read_pid(2)]
+        self.PID = None
+        if query_pid:
+            self.load_pid()
+
+    def load_pid(self):
+        """Get the PID values set on loops 1 and 2 (the 0th entry is a dummy, since the loops index from 1)"""
+        self.PID = [0, list(self.read_pid(1)), list(self.read_pid(2))]
 
     def read_heater_output(self) -> float:
         """Query the percent power being output to the heater"""
@@ -89,10 +99,12 @@ class Client(client.DeviceClient):
     def set_pid(self, p='', i='', d='', loop=1):
         if loop != 1 and loop != 2:
             raise ValueError(f"invalid loop: {loop}")
+        if self.PID is None:
+            self.load_pid()
         if p == '':
             p = self.PID[loop][0]
         else:
-            self.PID[loop][1] = float(p)
+            self.PID[loop][0] = float(p)
         if i == '':
             i = self.PID[loop][1]
         else:
@@ -119,7 +131,10 @@ class Client(client.DeviceClient):
 
 
 class GPIB(gpib.Device):
-    def __init__(self, addr: int, inst_num: int = 331, gpib_num: int = 0):
+    def __init__(self, addr: int, inst_num: int = 331, gpib_num: int = 0, query_pid: bool = True):
+        """
+        :param query_pid: ask for the PID values right away. If False, they're only asked for when set_pid() needs them
+        """
         super(self.__class__, self).__init__(addr, gpib_num)
         self.inst_num = inst_num
 
@@ -131,7 +146,13 @@ class GPIB(gpib.Device):
         else:
             self.heater_ranges = np.array([0.0, 0.5, 5.0, 50.0])
         # Get PID values set on channel 1 and 2. the 0th entry is a dummy, since the loops index from 1
-        self.PID = [0, self.read_pid(1), self.read_pid(2)]
+        self.PID = None
+        if query_pid:
+            self.load_pid()
+
+    def load_pid(self):
+        """Get the PID values set on loops 1 and 2 (the 0th entry is a dummy, since the loops index from 1)"""
+        self.PID = [0, list(self.read_pid(1)), list(self.read_pid(2))]
 
     def read_heater_output(self) -> float:
         """Query the percent power being output to the heater"""
@@ -195,10 +216,12 @@ class GPIB(gpib.Device):
     def set_pid(self, p='', i='', d='', loop=1):
         if loop != 1 and loop != 2:
             raise ValueError(f"invalid loop: {loop}")
+        if self.PID is None:
+            self.load_pid()
         if p == '':
             p = self.PID[loop][0]
         else:
-            self.PID[loop][1] = float(p)
+            self.PID[loop][0] = float(p)
         if i == '':
             i = self.PID[loop][1]
         else:
@@ -0,0 +1,99 @@
+"""
+Polls instruments in the background on behalf of the GPIB server, so any number of readers can share one stream of
+readings instead of each one asking the instrument for itself.
+
+author: Teddy Tortorici
+"""
+
+import asyncio
+import math
+import time
+
+
+class Poller:
+
+    min_period = 0.05       # shortest period a message is polled at (in seconds), so a poll can't flood the bus
+
+    def __init__(self, dispatch):
+        """
+        Keeps track of which messages are being polled, how often, and who wants the results
+        :param dispatch: coroutine function that takes a message of the format [Device ID]::[command]::[message] and
+        returns the response from the device (GpibServer.dispatch)
+        """
+        self.dispatch = dispatch
+        self.latest = {}        # message -> (time stamp, response) of the most recent poll, while it's being polled
+        self.periods = {}       # message -> {requester: period in seconds it asked for}
+        self.callbacks = {}     # message -> {requester: function(message, time stamp, response)}
+        self.tasks = {}         # message -> task polling it
+
+    @staticmethod
+    def check_period(period) -> float:
+        """
+        Make sure a poll period makes sense
+        :return: the period in seconds, at least Poller.min_period
+        :raises ValueError: if it isn't a positive, finite number
+        """
+        period = float(period)
+        if not math.isfinite(period) or period <= 0:
+            raise ValueError(f"poll period must be a positive number of seconds, not {period}")
+        return max(period, Poller.min_period)
+
+    def start(self, message: str, period: float, requester, callback=None):
+        """
+        Start polling a message, or keep polling it for one more requester. A message is polled at the shortest period
+        any of its requesters asked for.
+        Must be called from the event loop's thread.
+        :param message: message of the format [Device ID]::[command]::[message]
+        :param period: how often to poll in seconds. Periods shorter than Poller.min_period are polled at min_period
+        :param requester: anything hashable that identifies who wants the poll
+        :param callback: optional function(message, time stamp, response) called after every poll
+        :raises ValueError: if the period isn't a positive, finite number
+        """
+        self.periods.setdefault(message, {})[requester] = self.check_period(period)
+        if callback is not None:
+            self.callbacks.setdefault(message, {})[requester] = callback
+        if message not in self.tasks:
+            self.tasks[message] = asyncio.create_task(self.poll(message))
+
+    def stop(self, message: str, requester):
+        """Let go of a poll. Polling stops once nobody wants it anymore"""
+        self.periods.get(message, {}).pop(requester, None)
+        self.callbacks.get(message, {}).pop(requester, None)
+        if not self.periods.get(message):
+            self.periods.pop(message, None)
+            self.callbacks.pop(message, None)
+            self.latest.pop(message, None)
+            task = self.tasks.pop(message, None)
+            if task:
+                task.cancel()
+
+    def stop_all(self):
+        """Stop every poll"""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks = {}
+        self.periods = {}
+        self.callbacks = {}
+        self.latest = {}
+
+    def period(self, message: str) -> float:
+        """The period a message is being polled at"""
+        return min(self.periods[message].values())
+
+    async def poll(self, message: str):
+        """Polls a message until cancelled. Polls are scheduled from when the first one was sent, so they don't drift"""
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while message in self.periods:
+            try:
+                response = await self.dispatch(message)
+            except Exception as e:
+                response = f"{type(e).__name__}: {e}"
+            self.latest[message] = (time.time(), response)
+            for callback in list(self.callbacks.get(message, {}).values()):
+                callback(message, *self.latest[message])
+            if message not in self.periods:
+                break
+            # if the device took longer than the period, poll again right away instead of trying to catch up
+            next_time = max(next_time + self.period(message), loop.time())
+            await asyncio.sleep(next_time - loop.time())
@@ -0,0 +1,78 @@
+"""
+Keeps track of the devices the GPIB server can talk to, and opens each one the first time it gets used.
+
+author: Teddy Tortorici
+"""
+
+import importlib
+import threading
+
+
+def load_class(path: str):
+    """Turn a string like "gpib.Device" into the class it names"""
+    module_name, class_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class DeviceRegistry:
+
+    def __init__(self, config: dict = None):
+        """
+        Create a registry of devices
+        :param config: device id -> settings for that device. See get.devices for what the settings look like
+        """
+        self.entries = {}       # device id -> (name, function that opens the device)
+        self.devices = {}       # device id -> device object, once it has been opened
+        self.locks = {}         # device id -> lock so a device only gets opened once
+        for dev_id, settings in (config or {}).items():
+            self.add(dev_id, **settings)
+
+    def __contains__(self, dev_id: str) -> bool:
+        return dev_id in self.entries
+
+    def ids(self) -> list:
+        return list(self.entries.keys())
+
+    def add(self, dev_id: str, driver, address: int = 0, name: str = "", **kwargs):
+        """
+        Add a device. It isn't opened until it's first used
+        :param dev_id: the id clients will use for the device
+        :param driver: class that talks to the device (like gpib.Device or a gpib.Fake), or a string naming one
+        :param address: GPIB address of the device
+        :param name: name of the device for print statements
+        :param kwargs: any other arguments the driver class takes
+        """
+        def open_device():
+            driver_class = load_class(driver) if isinstance(driver, str) else driver
+            return driver_class(address, **kwargs)
+
+        self.register(dev_id, open_device, name)
+
+    def register(self, dev_id: str, factory, name: str = ""):
+        """
+        Add a device that gets made by calling a function. Use this for devices that need custom set up
+        :param dev_id: the id clients will use for the device. Ids are upper case, since the server upper cases the
+        messages it gets
+        :param factory: function that takes no arguments and returns the device object
+        :param name: name of the device for print statements
+        """
+        dev_id = dev_id.upper()
+        self.entries[dev_id] = (name or dev_id, factory)
+        self.locks[dev_id] = threading.Lock()
+        self.devices.pop(dev_id, None)
+
+    def name(self, dev_id: str) -> str:
+        """The name of a device, for print statements and traces"""
+        return self.entries[dev_id][0] if dev_id in self.entries else "Failed to find an instument"
+
+    def get(self, dev_id: str):
+        """Returns the device for a device id, opening it if this is the first time it's used. Returns None if the id
+        isn't registered"""
+        if dev_id in self.devices:
+            return self.devices[dev_id]
+        if dev_id not in self.entries:
+            return None
+        with self.locks[dev_id]:
+            if dev_id not in self.devices:
+                self.devices[dev_id] = self.entries[dev_id][1]()
+        return self.devices[dev_id]
@@ -0,0 +1,101 @@
+"""
+A cache the GPIB server uses so queries whose answers rarely change don't have to go over the bus every time.
+
+author: Teddy Tortorici
+"""
+
+import collections
+import time
+
+
+class ResponseCache:
+
+    # query -> seconds to keep its response (None keeps it until a write invalidates it)
+    # A query is cacheable if it starts with one of these. Only put queries here whose answers change when they're set
+    # (PID, RANGE, RAMP), since the matching write invalidates them. Not SETP?: the setpoint moves on its own while a
+    # ramp is running
+    default_cacheable = {"*IDN?": None,
+                         "PID?": 60.,
+                         "RANGE?": 60.,
+                         "RAMP?": 60.}
+
+    def __init__(self, cacheable: dict = None, max_size: int = 256):
+        """
+        Create a cache of query responses
+        :param cacheable: which queries can be cached, and for how long; see ResponseCache.default_cacheable
+        :param max_size: most responses to keep. The least recently used ones get dropped first
+        """
+        if cacheable is None:
+            cacheable = ResponseCache.default_cacheable
+        self.cacheable = {query.upper(): ttl for query, ttl in cacheable.items()}
+        self.max_size = max_size
+        self.responses = collections.OrderedDict()     # (device id, query) -> (time it expires, response)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def ttl(self, query: str):
+        """Returns how long a query can be cached for, or False if it can't be cached"""
+        for cacheable_query, ttl in self.cacheable.items():
+            if query.startswith(cacheable_query):
+                return float("inf") if ttl is None else ttl
+        return False
+
+    def get(self, dev_id: str, query: str):
+        """Returns the cached response to a query, or None if there isn't a fresh one"""
+        key = (dev_id, query)
+        if key in self.responses:
+            expires, response = self.responses[key]
+            if time.monotonic() < expires:
+                self.responses.move_to_end(key)
+                self.hits += 1
+                return response
+            del self.responses[key]
+        if self.ttl(query):
+            self.misses += 1
+        return None
+
+    def put(self, dev_id: str, query: str, response: str):
+        """Remember the response to a query if it's cacheable"""
+        ttl = self.ttl(query)
+        if not ttl or not isinstance(response, str) or response == "timed out":
+            return
+        key = (dev_id, query)
+        self.responses[key] = (time.monotonic() + ttl, response)
+        self.responses.move_to_end(key)
+        while len(self.responses) > self.max_size:
+            self.responses.popitem(last=False)
+
+    def invalidate(self, dev_id: str, write: str):
+        """
+        Forget responses a write to a device could change. A write like "PID 1, 50, 20, 0" makes cached "PID?"
+        responses stale; "*RST" makes all of them stale
+        :param dev_id: device written to
+        :param write: message written to it
+        """
+        head = write.split(" ")[0].split(",")[0].strip()
+        reset = head in ("*RST", "*RCL")
+        stale = [key for key in self.responses
+                 if key[0] == dev_id and (reset or key[1].split(" ")[0] == head + "?")]
+        for key in stale:
+            del self.responses[key]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self.responses.clear()
+
+    def reset_stats(self):
+        """Start the counters over (the cached responses are kept)"""
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def stats(self) -> dict:
+        """Counters for how well the cache is doing"""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit rate": self.hits / lookups if lookups else 0.,
+                "invalidations": self.invalidations,
+                "size": len(self.responses)}
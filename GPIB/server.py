@@ -4,136 +4,564 @@ Server functions that allow us to communicate over sockets to control devices
 author: Teddy Tortorici
 """
 
+import asyncio
+import concurrent.futures
+import functools
+import json
 import time
 import socket
+import numpy as np
 import get
-import gpib
+import polling
+import protocol
+import registry
+import response_cache
+import server_stats
+import tracing
+import capture
+
+
+def to_json(obj) -> bytes:
+    """Encode responses as JSON. Arrays become lists"""
+    return json.dumps(obj, default=lambda o: o.tolist() if isinstance(o, np.ndarray) else str(o)).encode()
 
 
 class GpibServer:
     # "class attributes" go here
     shutdown_command = b"shutdown"  # the command that will shutdown the server (must be a bit string)
+    stats_command = "STATS"         # send this to get the server's (and cache's) stats as JSON ("STATS::RESET" to
+                                    # start them over)
+    text_message_size = 1024        # biggest plain text message (plain text isn't framed, so this is one read)
 
-    def __init__(self, host: str = "localhost", port: int = 62538, silent=False):
+    def __init__(self, host: str = "localhost", port: int = 62538, silent=False, max_threads: int = 32,
+                 polls: dict = None, cacheable: dict = None, cache_size: int = 256, devices: dict = None,
+                 stats_file: str = None, stats_period: float = 60., trace_file: str = None,
+                 trace_level: int = tracing.DEBUG, trace_echo: bool = False, capture_file: str = None):
         """
         Create a server object
         :param host: IP address of socket where server will be located
-        :param port: port of socket where server will be located
-        :param silent: option to allow you to "silence" all the print statements
+        :param port: port of socket where server will be located. 0 to let the OS pick a free one (self.host_port has
+        the one it picked once the server is running)
+        :param silent: option to allow you to "silence" the print statements when the server starts and stops
+        :param max_threads: most devices that can be talked to at the same time
+        :param polls: messages to poll in the background the whole time the server runs, and how often (in seconds),
+        for example {"LS::Q::KRDG? A": 1.}. Clients can get the latest result or subscribe to get every result.
+        :param cacheable: queries whose responses can be reused, and for how many seconds (None for until a write
+        changes them). Defaults to response_cache.ResponseCache.default_cacheable; give {} to turn off caching
+        :param cache_size: most responses to keep in the cache
+        :param devices: device id -> settings for each device the server can talk to. Defaults to get.devices
+        :param stats_file: file to add a JSON line of stats (see server_stats.py) to every stats_period seconds and
+        when the server shuts down. None to not save them
+        :param stats_period: how often to save the stats, in seconds
+        :param trace_file: JSON lines file to save the trace of what the server does to (see tracing.py). None to only
+        keep the most recent events in memory (in self.trace)
+        :param trace_level: lowest level of event to trace (tracing.DEBUG traces every message)
+        :param trace_echo: also print every traced event as it happens (slows the server down like print statements)
+        :param capture_file: file to record every command sent to the devices to, with the response and how long it
+        took, so the session can be played back with capture.Replay. None to not record them
         """
         self.host_port = (host, port)  # create the tuple that goes into socket.socket.bind()
         self.running = False  # when we create the object, we don't want the server to start running right away
         self.silent = silent
+        self.trace = tracing.Tracer(level=trace_level, filename=trace_file, echo=trace_echo)
+        self.max_threads = max_threads
+        self.polls = {message: polling.Poller.check_period(period) for message, period in (polls or {}).items()}
+        self.push_buffer_limit = 1 << 20    # stop pushing updates to a subscriber that has this many bytes unsent
+        self.cache = response_cache.ResponseCache(cacheable, cache_size)
+        self.stats = server_stats.ServerStats()     # request counts and latencies for every device and command
+        self.stats_file = stats_file
+        self.stats_period = stats_period
+        self.capture = capture.Capture(capture_file) if capture_file else None
+
+        # these get made when the server starts running
+        self.loop = None            # the asyncio event loop the server runs in
+        self.stop_event = None      # set this to shut down the server
+        self.executor = None        # threads that do the (blocking) talking to devices
+        self.queues = {}            # device id -> queue of commands waiting for that device
+        self.workers = []           # tasks that take commands off the queues
+        self.writers = set()        # streams of the clients that are connected
+        self.handlers = set()       # tasks serving the clients that are connected
+        self.poller = None          # polls messages in the background
 
         """CREATE OBJECTS FOR DEVICES"""
-        # all your devices will go here
-        self.lakeshore = gpib.Device(get.gpib_address["LS"])
+        # all your devices go in get.devices (or the devices argument). They are only opened once they're used.
+        # For a device that needs custom set up, use self.devices.register(dev_id, function_that_makes_it, name)
+        self.devices = registry.DeviceRegistry(get.devices if devices is None else devices)
 
         """Add any set up commands you want to have done once the server starts running
         ie, you may want to set certain settings by default when the system starts up"""
         # Put start up commands to devices here; eg setting certain units, initial setpoints, ramping, etc
 
-    def handle(self, message_to_parse: str) -> str:
+    @staticmethod
+    def parse(message_to_parse: str) -> tuple:
         """
-        Parse a message of the format [Device ID]::[command]::[optional message]
+        Split a message of the format [Device ID]::[command]::[optional message] into its parts
         :param message_to_parse: incoming message from a client
-        :return: the response from the device
+        :return: (device id, command, message)
         """
         msg_list = message_to_parse.upper().split(
             '::')  # turn the string into a list, cutting it at the "::"s (also make sure it's uppercase)
         dev_id = msg_list[0]  # the first part of the string should be the device id
-        command = msg_list[1]  # the command (read, write, query) should be the second
-        # because having a message is optional, we want to try to get it, but if it's out of range for the list
-        # we don't want it to crash
-        try:
-            message = msg_list[2]
-        except IndexError:
-            message = ""
-
-        """MUST EDIT THE FOLLOWING LINES TO MATCH THE DEVICES YOU ARE USING"""
-        if dev_id == "LS":
-            device = self.lakeshore  # device acts like a "pointer" and essentially points to self.lakeshore
-            dev_name = "Lakeshore Temperature Controller"
-        # elif statments for other devices; for example:
-        # elif dev_id == "VS":
-        #    device = self.voltage_supply
-        #    dev_name = "Keithley Voltage Supply"
-        else:
-            device = None
-            dev_name = "Failed to find an instument"
-        if not self.silent:
-            print(f"Connecting to: {dev_name:s}")
+        # the command (read, write, query) should be the second, and because having a message is optional, we want to
+        # try to get it, but if it's out of range for the list we don't want it to crash
+        command = msg_list[1] if len(msg_list) > 1 else ""
+        message = msg_list[2] if len(msg_list) > 2 else ""
+        return dev_id, command, message
 
-        if device:
-            # write to device
-            if command[0] == "W":
-                if not self.silent:
-                    print(f'Writing "{message}" to {dev_id}')
-                device.write(message)
-                msgout = 'empty'
+    def normalize(self, message_to_parse: str) -> str:
+        """Puts a message in a standard form, so the same command always looks the same"""
+        return "::".join(self.parse(message_to_parse))
 
-            # query device
-            elif command[0] == "Q":
-                if not self.silent:
-                    print(f'Querying {dev_id} with "{message}"')
-                msgout = device.query(message)
+    def execute(self, dev_id: str, command: str, message: str) -> str:
+        """
+        Send a command to a device. This blocks until the device answers (and opens the device if it isn't yet)
+        :param dev_id: id of the device to talk to
+        :param command: W to write, Q to query, R to read, A to query for an ascii list of values, or B to query for
+        a binary block
+        :param message: the message going to the device
+        :return: the response from the device (a numpy array for A, and the raw bytes of the block in one for B)
+        """
+        device = self.devices.get(dev_id)
+        if self.capture:
+            device = capture.Recorder(device, self.capture, dev_id)
 
-            # read from device
-            elif command[0] == "R":
-                if not self.silent:
-                    print(f'Reading from {dev_id}')
-                msgout = device.read()
+        # write to device
+        if command[:1] == "W":
+            self.trace.debug("server", 'Writing "{message}" to {dev_id}', dev_id=dev_id, message=message)
+            device.write(message)
+            msgout = 'empty'
+
+        # query device
+        elif command[:1] == "Q":
+            self.trace.debug("server", 'Querying {dev_id} with "{message}"', dev_id=dev_id, message=message)
+            msgout = device.query(message)
+
+        # read from device
+        elif command[:1] == "R":
+            self.trace.debug("server", 'Reading from {dev_id}', dev_id=dev_id)
+            msgout = device.read()
+
+        # query device for an ascii list of values
+        elif command[:1] == "A":
+            self.trace.debug("server", 'Querying {dev_id} with "{message}" for values', dev_id=dev_id,
+                             message=message)
+            msgout = device.query_ascii(message)
+
+        # query device for binary block; the client knows what data type it holds, so it's sent on as raw bytes
+        elif command[:1] == "B":
+            self.trace.debug("server", 'Querying {dev_id} with "{message}" for a binary block', dev_id=dev_id,
+                             message=message)
+            msgout = device.query_binary(message, dtype='u1')
+        else:
+            msgout = f'Did not give a valid command: {command}'
+        return msgout
+
+    def handle(self, message_to_parse: str) -> str:
+        """
+        Parse a message of the format [Device ID]::[command]::[optional message] and send it to the device right away
+        :param message_to_parse: incoming message from a client
+        :return: the response from the device
+        """
+        dev_id, command, message = self.parse(message_to_parse)
+        self.trace.debug("server", "Connecting to: {name}", dev_id=dev_id, name=self.devices.name(dev_id))
+
+        if dev_id in self.devices:
+            msgout = self.execute(dev_id, command, message)
         else:
             msgout = f'Did not give a valid device id: {dev_id}'
         return msgout
 
+    async def dispatch(self, message_to_parse: str, use_cache: bool = True) -> str:
+        """
+        Like handle(), but the command waits its turn in the queue for its device, so commands to different devices
+        run at the same time while commands to the same device run in the order they arrived. Cacheable queries are
+        answered from the cache when it has a fresh response
+        :param message_to_parse: incoming message from a client
+        :param use_cache: set to False to always ask the device (the response still goes in the cache)
+        :return: the response from the device
+        """
+        received = time.perf_counter()
+        dev_id, command, message = self.parse(message_to_parse)
+
+        if dev_id == GpibServer.stats_command:
+            if command == "RESET":
+                self.stats.reset()
+                self.cache.reset_stats()
+            return to_json(self.stats_snapshot()).decode()
+        self.trace.debug("server", "Connecting to: {name}", dev_id=dev_id, name=self.devices.name(dev_id))
+        if dev_id not in self.devices:
+            return f'Did not give a valid device id: {dev_id}'
+        stats = self.stats.get(dev_id, command, message)
+        stats.requests += 1
+        stats.bytes_in += len(message_to_parse)
+        if command[:1] == "Q" and use_cache:
+            response = self.cache.get(dev_id, message)
+            if response is not None:
+                stats.cached += 1
+                stats.bytes_out += server_stats.response_size(response)
+                stats.total.record(time.perf_counter() - received)
+                return response
+        elif command[:1] == "W":
+            self.cache.invalidate(dev_id, message)
+
+        try:
+            response = await self.submit(dev_id, functools.partial(self.execute, dev_id, command, message), stats)
+        except Exception as e:
+            stats.errors += 1
+            if server_stats.is_timeout(e):
+                stats.timeouts += 1
+            raise
+        finally:
+            stats.total.record(time.perf_counter() - received)
+        stats.bytes_out += server_stats.response_size(response)
+        if server_stats.is_timeout(response):
+            stats.timeouts += 1
+
+        if command[:1] == "Q":
+            self.cache.put(dev_id, message, response)
+        elif command[:1] == "W":
+            # in case a query that was ahead of the write in the queue cached what the device said before the write
+            self.cache.invalidate(dev_id, message)
+        return response
+
+    async def dispatch_batch(self, messages: list) -> list:
+        """
+        Dispatch a list of messages all at once
+        :param messages: messages of the format [Device ID]::[command]::[optional message]
+        :return: the responses, in the same order as the messages
+        """
+        # the tasks are made in order, so messages for the same device get in its queue in the order they were given
+        responses = await asyncio.gather(*[self.dispatch(message) for message in messages], return_exceptions=True)
+        return [f"{type(response).__name__}: {response}" if isinstance(response, Exception) else response
+                for response in responses]
+
+    async def submit(self, dev_id: str, function, stats: server_stats.CommandStats = None):
+        """
+        Put a function that talks to a device in that device's queue
+        :param dev_id: id of the device the function talks to
+        :param function: function that takes no arguments
+        :param stats: optional stats to record how long the function waited in the queue and how long it took in
+        :return: what the function returns, once it's had its turn
+        """
+        if dev_id not in self.queues:
+            self.queues[dev_id] = asyncio.Queue()
+            self.workers.append(asyncio.create_task(self.device_worker(self.queues[dev_id])))
+        future = self.loop.create_future()
+        await self.queues[dev_id].put((function, future, stats, time.perf_counter()))
+        return await future
+
+    @staticmethod
+    def timed(function, stats: server_stats.CommandStats, queued: float):
+        """Runs a function from a device queue, recording its time in the queue and how long it took"""
+        started = time.perf_counter()
+        try:
+            return function()
+        finally:
+            if stats is not None:
+                stats.queue_wait.record(started - queued)
+                stats.service.record(time.perf_counter() - started)
+
+    async def device_worker(self, queue: asyncio.Queue):
+        """Runs the functions in a device's queue one at a time, in a thread so the server doesn't block"""
+        while True:
+            function, future, stats, queued = await queue.get()
+            try:
+                result = await self.loop.run_in_executor(self.executor,
+                                                         functools.partial(self.timed, function, stats, queued))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
     def run(self):
         """
-        Establishes a socket server which takes and handles commands
+        Establishes a socket server which takes and handles commands from any number of clients at the same time.
+        This blocks until a client sends the shutdown command or stop() is called.
         """
+        asyncio.run(self.serve())
+
+    def stop(self):
+        """Shut down the server from another thread"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+
+    def add_poll(self, message: str, period: float):
+        """
+        Poll a message in the background for as long as the server runs. Can be called before the server starts or
+        from another thread while it's running
+        :param message: message of the format [Device ID]::[command]::[optional message]
+        :param period: how often to poll in seconds (at least polling.Poller.min_period)
+        :raises ValueError: if the period isn't a positive, finite number
+        """
+        message = self.normalize(message)
+        period = polling.Poller.check_period(period)
+        self.polls[message] = period
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.poller.start, message, period, "config")
+
+    async def latest(self, message_to_parse: str) -> tuple:
+        """
+        Get the most recent response to a polled message. If the message isn't being polled, the device is asked now
+        (and the response isn't kept, so asking for messages nobody polls doesn't fill up memory)
+        :param message_to_parse: message of the format [Device ID]::[command]::[optional message]
+        :return: (time stamp, response)
+        """
+        message = self.normalize(message_to_parse)
+        if message in self.poller.tasks and message in self.poller.latest:
+            return self.poller.latest[message]
+        response = (time.time(), await self.dispatch(message))
+        if message in self.poller.tasks and message not in self.poller.latest:
+            self.poller.latest[message] = response
+        return response
+
+    async def serve(self):
+        """The coroutine run() runs"""
         self.running = True  # set to true to allow the while loop to run
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads)
+        self.poller = polling.Poller(functools.partial(self.dispatch, use_cache=False))
+        for message, period in self.polls.items():
+            self.poller.start(self.normalize(message), period, "config")
 
-        # open a new socket
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            # bind to the (host, port)
-            s.bind(self.host_port)
+        # open a new socket bound to the (host, port) and put it into listening mode
+        server = await asyncio.start_server(self.serve_connection, *self.host_port)
+        self.host_port = (self.host_port[0], server.sockets[0].getsockname()[1])     # in case port 0 was given
+        stats_task = asyncio.create_task(self.dump_stats()) if self.stats_file else None
 
-            # confirm the socket is bound
+        # confirm the socket is bound
+        if not self.silent:
             print(f"Socket bound to port: {self.host_port[1]}")
 
-            # put the socket into listening mode
-            s.listen()
+        # wait until a client requests the server shutdown
+        async with server:
+            await self.stop_event.wait()
+            self.running = False
+            # let clients with open connections know the server is gone. This has to happen before leaving the async
+            # with, since on python 3.12+ leaving it waits for every connection to close (so any client still
+            # connected, like a DeviceClient's shared connection, would keep the server from ever stopping)
+            server.close()
+            self.poller.stop_all()
+            for writer in list(self.writers):
+                writer.close()
+            for handler in list(self.handlers):
+                handler.cancel()        # even ones waiting on a device to answer
 
-            # loop until a client requests the server shutdown
-            while self.running:
-                # establish a connection with a client
-                conn, addr = s.accept()
+        if stats_task:
+            stats_task.cancel()
+            self.stats.dump(self.stats_file, self.stats_snapshot())
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+        self.queues = {}
+        self.executor.shutdown(wait=False)
+        self.trace.info("server", "Server stopped")
+        self.trace.flush()
+        if self.capture:
+            self.capture.flush()
+        self.loop = None
+
+    async def dump_stats(self):
+        """Saves the stats to self.stats_file every self.stats_period seconds"""
+        while True:
+            await asyncio.sleep(self.stats_period)
+            # take the snapshot here, so the stats don't change while it's being taken
+            await self.loop.run_in_executor(None, self.stats.dump, self.stats_file, self.stats_snapshot())
 
-                # open the connection
-                with conn:
+    def stats_snapshot(self) -> dict:
+        """The server's stats (see server_stats.ServerStats.snapshot()) with the response cache's counters added"""
+        snapshot = self.stats.snapshot()
+        snapshot["cache"] = self.cache.stats()
+        return snapshot
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Takes messages from one client until it disconnects. Clients either send framed messages (see protocol.py)
+        or plain text messages
+        :param reader: stream coming from the client
+        :param writer: stream going to the client
+        """
+        addr = writer.get_extra_info('peername')
+        self.trace.info("server", "Connected to: {address}", address=f"{addr[0]}:{addr[1]}")
+        self.writers.add(writer)
+        self.handlers.add(asyncio.current_task())
+        try:
+            start = await reader.read(len(protocol.magic))
+            if start and protocol.magic.startswith(start) and len(start) < len(protocol.magic):
+                start += await reader.readexactly(len(protocol.magic) - len(start))
+            if start == protocol.magic:
+                await self.serve_framed(reader, writer, start)
+            elif start:
+                await self.serve_text(reader, writer, start)
+        except (OSError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError happens to connections still open when the server shuts down
+            pass
+        finally:
+            self.writers.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def serve_framed(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, start: bytes):
+        """
+        Answers framed messages, tagging each reply with the id of the request it answers. Each message is answered as
+        soon as its device gets to it, so replies can come back in a different order than the requests came in.
+        """
+        tasks = set()
+        subscriptions = {}      # request id of a subscribe message -> message it subscribed to
+        try:
+            while self.running:
+                try:
+                    kind, request_id, msg_client = await protocol.read_message(reader, start)
+                except protocol.ProtocolError as e:
+                    # we can't tell where the next message starts, so tell the client why and give up on the connection
+                    protocol.write_message(writer, 0, str(e).encode(), protocol.Kind.error)
+                    await writer.drain()
+                    break
+                start = b""
+                if kind is None:
+                    break
+                if self.trace.enabled(tracing.DEBUG):
+                    self.trace.debug("server", "Received {size} byte message: {start}", size=len(msg_client),
+                                     start=repr(bytes(msg_client[:80])), request_id=request_id, kind=kind)
+                if kind == protocol.Kind.text and msg_client == GpibServer.shutdown_command:
                     if not self.silent:
-                        print(f"Connected to: {addr[0]}:{addr[1]}  : {time.ctime(time.time())}")
-                    while True:
-                        msg_client = conn.recv(1024)
-                        if not self.silent:
-                            print(repr(msg_client))
-                        if not msg_client:
-                            break
-                        elif msg_client == GpibServer.shutdown_command:
-                            print('Received shutdown command')
-                            self.running = False
-                            break
-                        else:
-                            # decode the message from the client to make it a normal string
-                            msg_client = msg_client.decode()
-                            if not self.silent:
-                                print(f'Received message: {msg_client}')
-
-                            # put the client message through the handle method and get the response from the device
-                            msg_server = self.handle(msg_client)
-
-                            # encode as a bit string and send it back to the client
-                            conn.sendall(msg_server.encode())
+                        print('Received shutdown command')
+                    protocol.write_message(writer, request_id, b"shutting down")
+                    await writer.drain()
+                    self.stop_event.set()
+                    break
+                elif kind == protocol.Kind.text:
+                    task = asyncio.create_task(self.answer(writer, request_id, msg_client.decode()))
+                elif kind == protocol.Kind.batch:
+                    task = asyncio.create_task(self.answer_batch(writer, request_id, msg_client))
+                elif kind == protocol.Kind.latest:
+                    task = asyncio.create_task(self.answer_latest(writer, request_id, msg_client.decode()))
+                elif kind == protocol.Kind.subscribe:
+                    self.subscribe(writer, request_id, msg_client, subscriptions)
+                    continue
+                elif kind == protocol.Kind.unsubscribe:
+                    try:
+                        subscription = int(json.loads(msg_client))
+                    except (ValueError, TypeError):
+                        subscription = None
+                    if subscription in subscriptions:
+                        self.poller.stop(subscriptions.pop(subscription), (writer, subscription))
+                    protocol.write_message(writer, request_id, b"unsubscribed")
+                    continue
+                else:
+                    protocol.write_message(writer, request_id, f"Can't handle message kind {kind}".encode(),
+                                           protocol.Kind.error)
+                    continue
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for subscription, message in subscriptions.items():
+                self.poller.stop(message, (writer, subscription))
+
+    def subscribe(self, writer: asyncio.StreamWriter, request_id: int, payload: bytes, subscriptions: dict):
+        """Start sending a client an update every time a message is polled"""
+        try:
+            request = json.loads(payload)
+            message = self.normalize(request["message"])
+            period = polling.Poller.check_period(request["period"])
+        except (ValueError, KeyError, TypeError) as e:
+            protocol.write_message(writer, request_id, f"Invalid subscription: {e}".encode(), protocol.Kind.error)
+            return
+
+        def push(polled_message: str, time_stamp: float, response: str):
+            # a subscriber that can't keep up misses updates instead of making the server hold on to all of them
+            if not writer.is_closing() and writer.transport.get_write_buffer_size() < self.push_buffer_limit:
+                protocol.write_message(writer, request_id, to_json([polled_message, time_stamp, response]),
+                                       protocol.Kind.update)
+
+        subscriptions[request_id] = message
+        protocol.write_message(writer, request_id, b"subscribed")
+        self.poller.start(message, period, (writer, request_id), push)
+
+    async def answer(self, writer: asyncio.StreamWriter, request_id: int, msg_client: str):
+        """Get the response to one framed message and send it back"""
+        try:
+            msg_server = await self.dispatch(msg_client)
+        except Exception as e:
+            protocol.write_message(writer, request_id, f"{type(e).__name__}: {e}".encode(), protocol.Kind.error)
+        else:
+            self.write_response(writer, request_id, msg_server)
+        try:
+            await writer.drain()
+        except OSError:
+            pass
+
+    @staticmethod
+    def write_response(writer: asyncio.StreamWriter, request_id: int, response):
+        """Send a response as text, or straight from its memory if it's an array"""
+        if isinstance(response, np.ndarray) and response.dtype != object:
+            protocol.write_message(writer, request_id, protocol.pack_array(response), protocol.Kind.array)
+        elif isinstance(response, np.ndarray):
+            protocol.write_message(writer, request_id, to_json(response))
+        else:
+            protocol.write_message(writer, request_id, str(response).encode())
+
+    async def answer_latest(self, writer: asyncio.StreamWriter, request_id: int, msg_client: str):
+        """Send back the most recent response to a polled message"""
+        try:
+            time_stamp, response = await self.latest(msg_client)
+        except Exception as e:
+            protocol.write_message(writer, request_id, f"{type(e).__name__}: {e}".encode(), protocol.Kind.error)
+        else:
+            protocol.write_message(writer, request_id, to_json([time_stamp, response]))
+        try:
+            await writer.drain()
+        except OSError:
+            pass
+
+    async def answer_batch(self, writer: asyncio.StreamWriter, request_id: int, payload: bytes):
+        """Run a batch of messages and send back all their responses in one reply"""
+        try:
+            messages = json.loads(payload)
+            if not isinstance(messages, list):
+                raise ValueError("a batch must be a list of messages")
+            responses = await self.dispatch_batch([str(message) for message in messages])
+        except ValueError as e:
+            protocol.write_message(writer, request_id, f"Invalid batch: {e}".encode(), protocol.Kind.error)
+        else:
+            protocol.write_message(writer, request_id, to_json(responses), protocol.Kind.batch)
+        try:
+            await writer.drain()
+        except OSError:
+            pass
+
+    async def serve_text(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, start: bytes):
+        """
+        Answers plain text messages of the format [Device ID]::[command]::[optional message], one at a time.
+        Plain text has no framing, so each read (of up to GpibServer.text_message_size bytes) is taken as one message.
+        A longer command gets split, so send long commands with the framed protocol instead
+        """
+        msg_client = start + await reader.read(GpibServer.text_message_size - len(start))
+        while self.running:
+            if not msg_client:
+                break
+            elif msg_client == GpibServer.shutdown_command:
+                if not self.silent:
+                    print('Received shutdown command')
+                self.stop_event.set()
+                break
+            else:
+                # decode the message from the client to make it a normal string
+                msg_client = msg_client.decode()
+                self.trace.debug("server", "Received message: {message}", message=msg_client)
+
+                # put the client message through the dispatch method and get the response from the device
+                try:
+                    msg_server = await self.dispatch(msg_client)
+                except Exception as e:
+                    msg_server = f"{type(e).__name__}: {e}"
+
+                # encode as a bit string and send it back to the client
+                writer.write(msg_server.tobytes() if isinstance(msg_server, np.ndarray) else str(msg_server).encode())
+                await writer.drain()
+            msg_client = await reader.read(GpibServer.text_message_size)
 
 
 def server_echo_rev(host: str = "localhost", port: int = get.port):
@@ -0,0 +1,175 @@
+"""
+Counters and latency histograms the GPIB server keeps for every device and command, so you can see which instrument
+is holding up data taking.
+
+Latencies go in HDR style histograms: values are kept in microseconds in buckets whose width grows with the value, so
+every bucket is within about 1.5% of the values in it from 1 microsecond up to hours, and recording one is a couple of
+integer operations.
+
+author: Teddy Tortorici
+"""
+
+import asyncio
+import json
+import math
+import time
+import pyvisa
+import gpib
+
+
+class LatencyHistogram:
+
+    sub_bucket_bits = 7     # 2**7 buckets per power of two at the top end; that sets the precision
+    half = 1 << (sub_bucket_bits - 1)
+
+    def __init__(self):
+        self.counts = {}        # bucket index -> number of values in it
+        self.count = 0
+        self.total = 0.         # sum of the values in seconds, for the mean
+        self.min = math.inf
+        self.max = 0.
+
+    @staticmethod
+    def index(microseconds: int) -> int:
+        """The bucket a value goes in. Below 2**sub_bucket_bits every microsecond has its own bucket; above that
+        each power of two is split into 'half' buckets"""
+        if microseconds < 2 * LatencyHistogram.half:
+            return microseconds
+        shift = microseconds.bit_length() - LatencyHistogram.sub_bucket_bits
+        return LatencyHistogram.half * shift + (microseconds >> shift)
+
+    @staticmethod
+    def value(index: int) -> float:
+        """The value (in seconds) in the middle of a bucket"""
+        if index < 2 * LatencyHistogram.half:
+            return index * 1e-6
+        shift = index // LatencyHistogram.half - 1
+        lowest = (index - LatencyHistogram.half * shift) << shift
+        return (lowest + (1 << shift) / 2) * 1e-6
+
+    def record(self, seconds: float):
+        seconds = max(0., float(seconds))
+        bucket = self.index(int(seconds * 1e6))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """The value (in seconds) that 'percent' percent of the values are at or below"""
+        if not self.count:
+            return 0.
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self.value(bucket), self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """Count, mean, min, max and percentiles, in milliseconds"""
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count,
+                "mean ms": self.total / self.count * 1e3,
+                "min ms": self.min * 1e3,
+                "p50 ms": self.percentile(50) * 1e3,
+                "p90 ms": self.percentile(90) * 1e3,
+                "p99 ms": self.percentile(99) * 1e3,
+                "p99.9 ms": self.percentile(99.9) * 1e3,
+                "max ms": self.max * 1e3}
+
+
+class CommandStats:
+
+    def __init__(self):
+        """Everything counted for one command to one device"""
+        self.requests = 0
+        self.cached = 0         # answered from the response cache without asking the device
+        self.errors = 0         # raised an exception
+        self.timeouts = 0       # the device (or server) timed out
+        self.bytes_in = 0       # size of the messages from clients
+        self.bytes_out = 0      # size of the responses
+        self.queue_wait = LatencyHistogram()    # time waiting in the device's queue for its turn
+        self.service = LatencyHistogram()       # time the device took to answer
+        self.total = LatencyHistogram()         # time from the server getting the message to having the response
+
+    def summary(self) -> dict:
+        return {"requests": self.requests,
+                "cached": self.cached,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "bytes in": self.bytes_in,
+                "bytes out": self.bytes_out,
+                "queue wait": self.queue_wait.summary(),
+                "service": self.service.summary(),
+                "total": self.total.summary()}
+
+
+def response_size(response) -> int:
+    """Number of bytes a response takes to send"""
+    if hasattr(response, "nbytes"):
+        return response.nbytes
+    if isinstance(response, (bytes, bytearray)):
+        return len(response)
+    return len(str(response).encode())
+
+
+def is_timeout(result) -> bool:
+    """
+    Whether a response or an exception is a timeout, judged by its type where the timeout happened (not by what the
+    text says, so an answer that mentions "timeout" isn't counted)
+    :param result: a device's response, or the exception handling a message raised
+    """
+    if isinstance(result, (gpib.TimedOut, TimeoutError, asyncio.TimeoutError)):
+        return True
+    if isinstance(result, pyvisa.errors.VisaIOError):
+        return result.error_code == pyvisa.constants.StatusCode.error_timeout
+    return False
+
+
+class ServerStats:
+
+    def __init__(self):
+        """Stats for every (device id, command) the server has handled"""
+        self.commands = {}      # (device id, command key) -> CommandStats
+        self.started = time.time()
+
+    @staticmethod
+    def key(dev_id: str, command: str, message: str) -> tuple:
+        """Commands are grouped by their letter and the first word of their message, like ("LS", "Q KRDG?")"""
+        head = message.split(" ")[0] if message else ""
+        return dev_id, f"{command[:1]} {head}".strip()
+
+    def get(self, dev_id: str, command: str, message: str) -> CommandStats:
+        key = self.key(dev_id, command, message)
+        if key not in self.commands:
+            self.commands[key] = CommandStats()
+        return self.commands[key]
+
+    def reset(self):
+        self.commands = {}
+        self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """Everything counted so far: {"time":, "uptime s":, "devices": {device id: {command: stats}}}. Each device
+        also gets its requests per second"""
+        uptime = time.time() - self.started
+        devices = {}
+        for (dev_id, command), stats in sorted(self.commands.items()):
+            devices.setdefault(dev_id, {})[command] = stats.summary()
+        for dev_id, commands in devices.items():
+            requests = sum(stats["requests"] for stats in commands.values())
+            commands["requests per s"] = requests / uptime if uptime else 0.
+        return {"time": time.time(), "uptime s": uptime, "devices": devices}
+
+    def dump(self, filename: str, snapshot: dict = None):
+        """Add a snapshot (a new one if one isn't given) to a file as one line of JSON"""
+        if snapshot is None:
+            snapshot = self.snapshot()
+        with open(filename, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
@@ -0,0 +1,107 @@
+"""
+Passes newly taken data points from the thread taking data to anything that wants them (the plots, the text stream,
+the data file, ...) without going through the disk.
+
+A sink is a function called with every new record in the thread that publishes it, so it should be quick (like
+writing to a buffered file). A subscription holds records until its owner drains them, and can call a notify function
+(like a Qt signal's emit) so the owner knows to come get them; that's how records get to the GUI thread.
+
+author: Teddy Tortorici
+"""
+
+import collections
+import threading
+import numpy as np
+
+
+class Subscription:
+
+    def __init__(self, bus, max_records: int = None, notify=None):
+        """
+        Records published to a DataBus waiting to be collected
+        :param bus: the DataBus subscribed to
+        :param max_records: most records to hold; the oldest ones are dropped past this (and counted in dropped). None
+        to hold any number
+        :param notify: optional function with no arguments, called (in the publishing thread) after each new record
+        """
+        self.bus = bus
+        self.records = collections.deque(maxlen=max_records)
+        self.notify = notify
+        self.dropped = 0        # records dropped because max_records were already waiting. The owner can reset it
+
+    def put(self, record: np.ndarray):
+        if self.records.maxlen is not None and len(self.records) == self.records.maxlen:
+            self.dropped += 1
+        self.records.append(record)
+        if self.notify:
+            self.notify()
+
+    def drain(self) -> np.ndarray:
+        """Take every record waiting, oldest first, as one array of records"""
+        records = []
+        while self.records:
+            records.append(self.records.popleft())
+        if not records:
+            return np.empty(0, dtype=self.bus.dtype)
+        return np.concatenate(records)
+
+    def cancel(self):
+        """Stop receiving records"""
+        self.bus.unsubscribe(self)
+
+
+class DataBus:
+
+    def __init__(self, labels: list, dtype="f8"):
+        """
+        Publish and subscribe channel for data points
+        :param labels: column labels. Records have one field per label
+        :param dtype: numpy data type of the columns
+        """
+        self.labels = list(labels)
+        self.dtype = np.dtype([(label, dtype) for label in self.labels])
+        self.sinks = []
+        self.subscriptions = []
+        self.lock = threading.Lock()        # so subscribing from the GUI thread doesn't clash with publishing
+
+    def record(self, row: list) -> np.ndarray:
+        """Turn a row of values (in the order of the labels) into a record (an array of one record)"""
+        return np.array([tuple(row)], dtype=self.dtype)
+
+    def publish(self, row) -> np.ndarray:
+        """
+        Send a new data point to every sink and subscription
+        :param row: list of values in the order of the labels, or a record
+        :return: the record that was sent
+        """
+        record = row if isinstance(row, np.ndarray) and row.dtype == self.dtype else self.record(row)
+        with self.lock:
+            sinks = list(self.sinks)
+            subscriptions = list(self.subscriptions)
+        for sink in sinks:
+            sink(record)
+        for subscription in subscriptions:
+            subscription.put(record)
+        return record
+
+    def add_sink(self, sink):
+        """Call sink(record) with every record as it's published"""
+        with self.lock:
+            self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        with self.lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+
+    def subscribe(self, max_records: int = None, notify=None) -> Subscription:
+        """Hold published records until they're drained from the returned Subscription; see Subscription"""
+        subscription = Subscription(self, max_records, notify)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
@@ -2,6 +2,8 @@ import time
 import os
 import numpy as np
 import get
+from csv_writer import CSVWriter
+from sampling import ParallelSampler
 from lakeshore import Client as LakeShore
 from client_tools import DeviceClient
 
@@ -31,48 +33,57 @@ class FakePhotonCounter(DeviceClient):
 
 
 class OpenDataFile:
-    def __init__(self, file_path, port=get.port):
+    def __init__(self, file_path, port=get.port, parallel=True):
         """Create instances of devices for server communication"""
         self.ls = LakeShore(331, port=port)     # lakeshore temperature controller
         self.vs = FakeVoltageSupply()           # a fake voltage supply working as an example placeholder
         self.pc = FakePhotonCounter()           # a fake photon counter working as an example placeholder
 
+        # read the instruments at the same time instead of one after another (parallel=False for one after another)
+        self.sampler = ParallelSampler({'voltage': self.vs.read_voltage,
+                                        'temperature': self.ls.read_temperature,
+                                        'counts': self.pc.read_counts}, parallel=parallel)
+        self.reading_times = {}     # name -> time stamp of each instrument's (average) reading in the last data point
+
         """Create file"""
         self.full_name = file_path
+        self.writer = CSVWriter(self.full_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def take_data_point(self, ave: int = 1):
         """Sweep through measurements and write them in a new row
         will average a number of data points if ave > 1"""
-        ave = int(ave)
-        times = np.zeros(ave)
-        voltages = np.zeros(ave)
-        temperatures = np.zeros(ave)
-        counts = np.zeros(ave)
-        for ii in range(ave):
-            times[ii] = time.time()
-            voltages[ii] = self.vs.read_voltage()
-            temperatures[ii] = self.ls.read_temperature()
-            counts[ii] = self.pc.read_counts()
-        data_point = [sum(times)/ave, sum(voltages)/ave, sum(temperatures)/ave, sum(counts)/ave]
+        readings = self.sampler.sample_average(ave)
+        self.reading_times = {name: reading[0] for name, reading in readings.items()}
+        data_point = [float(np.mean(list(self.reading_times.values()))), readings['voltage'][1],
+                      readings['temperature'][1], readings['counts'][1]]
         self.write_row(data_point)
         return data_point
 
     def write_row(self, row_to_write: list):
         """Turns a list into a comma delimited row to write to the csv file"""
-        with open(self.full_name, 'a') as f:
-            f.write(str(row_to_write).lstrip('[').rstrip(']') + '\n')
+        self.writer.write_row(row_to_write)
 
     def write_comment(self, comment: str):
         """Writes a comment line in the csv file"""
-        with open(self.full_name, 'a') as f:
-            f.write(f'# {comment}\n')
+        self.writer.write_comment(comment)
+
+    def close(self):
+        """Write any rows that are waiting and close the file"""
+        self.writer.close()
+        self.sampler.close()
 
 
 class NewDataFile(OpenDataFile):
     def __init__(self, path: str, filename: str, comment='', port=get.port):
+        if '.csv' not in filename:
+            filename += '.csv'              # add extension if it's not given
         super(self.__class__, self).__init__(os.path.join(path, filename), port=port)
-        if '.csv' not in self.full_name:
-            self.full_name += '.csv'        # add extension if it's not given
 
         # Create header
         self.create_file()
@@ -83,5 +94,5 @@ class NewDataFile(OpenDataFile):
         self.write_row(self.column_labels)
 
     def create_file(self):
-        with open(self.full_name, 'w') as f:
-            f.write(f'# This file was created on {time.ctime(time.time())}\n')
+        self.writer.truncate()
+        self.writer.write_comment(f'This file was created on {time.ctime(time.time())}')
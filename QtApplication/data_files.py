@@ -6,8 +6,14 @@ author: Teddy Tortorici
 
 import time
 import os
+import json
 import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
 import get
+from csv_writer import CSVWriter
+from csv_tail import CSVTail
+from sampling import ParallelSampler
+from scheduler import PeriodicScheduler
 # import device clients to communicate over the server, or device gpib classes to communicate directly
 from lakeshore import Client as LakeShore
 from fake_gpib_devices import FakeVoltageSupply, FakePhotonCounter
@@ -17,13 +23,29 @@ class CSVFile:
 
     file_type = ".csv"
 
-    def __init__(self, path: str, name: str, comment: str = ""):
+    def __init__(self, path: str, name: str, comment: str = "", flush_rows: int = 100, flush_interval: float = 1.,
+                 rolling: dict = None, labels: list = None):
         """
-        Create or open a csv file and manage it.
+        Create or open a csv file and manage it. The file is kept open and rows are written in batches; call close()
+        when you're done with it.
         :param path: file path to where you want to save the file
         :param name: name of the file you wish to create or open
         :param comment: an optional comment to put in the file
+        :param flush_rows: write to the file once this many rows are waiting
+        :param flush_interval: write to the file at least this often (in seconds), so a crash loses at most this much
+        :param rolling: settings for RollingDataFile, like {"max_bytes": 100 * 2 ** 20, "max_seconds": 24 * 60 * 60},
+        to split the data into csv segment files in a folder named after the file instead of writing one file that
+        keeps growing. None (the default) for one file
+        :param labels: column labels. Only needed with rolling, since every segment starts with them
         """
+        self.rolling = rolling is not None
+        if self.rolling:
+            # rows, comments, flush() and close() all go to the rolling file instead of a CSVWriter
+            self.writer = RollingDataFile(path, name[:-len(CSVFile.file_type)] if name.endswith(CSVFile.file_type)
+                                          else name, labels, comment, CSVFile, **rolling)
+            self.filename = self.writer.path
+            self.new = self.writer.new
+            return
 
         """MAKE SURE THE FILE NAME IS VALID"""
         name = name.rstrip(CSVFile.file_type)
@@ -37,10 +59,9 @@ class CSVFile:
             os.makedirs(path)
 
         # Check if file exists, if it doesn't, make it
-        if os.path.exists(self.filename):
-            self.new = False
-        else:
-            self.new = True
+        self.new = not os.path.exists(self.filename)
+        self.writer = CSVWriter(self.filename, flush_rows, flush_interval)
+        if self.new:
             self.create_file()
 
         """APPEND OPTIONAL COMMENT"""
@@ -49,18 +70,446 @@ class CSVFile:
 
     def write_row(self, row_to_write: list):
         """Turns a list into a comma delimited row to write to the csv file"""
-        with open(self.filename, 'a') as f:
-            f.write(str(row_to_write).lstrip("[").rstrip("]") + '\n')
+        self.writer.write_row(row_to_write)
 
     def write_comment(self, comment: str):
         """Writes a comment line in the csv file"""
-        with open(self.filename, "a") as f:
-            f.write(f"# {comment}\n")
+        self.writer.write_comment(comment)
 
     def create_file(self):
         """Creates file by writing the first comment line"""
-        with open(self.filename, "w") as f:
-            f.write(f"# This data file was created on {time.ctime(time.time())}\n")
+        self.writer.truncate()
+        self.writer.write_comment(f"This data file was created on {time.ctime(time.time())}")
+
+    def flush(self):
+        """Write any rows that are waiting to the file"""
+        self.writer.flush()
+
+    def close(self):
+        """Write any rows that are waiting and close the file"""
+        self.writer.close()
+
+
+class RecordWriter(CSVWriter):
+
+    mode = 'ab'
+
+    def __init__(self, filename: str, dtype: np.dtype, flush_rows: int = 100, flush_interval: float = 1.):
+        """
+        Writes rows to a binary data file as records, batched and flushed in the background the same way CSVWriter
+        does it for lines
+        :param filename: full path to the file. It is appended to
+        :param dtype: numpy data type of one record (see record_dtype())
+        :param flush_rows: write to the file once this many rows are waiting
+        :param flush_interval: write to the file at least this often (in seconds). None to only flush on flush_rows
+        """
+        self.dtype = dtype
+        super(self.__class__, self).__init__(filename, flush_rows, flush_interval)
+
+    def write_row(self, row_to_write: list):
+        """Add a row of values (in the order of the fields) to be written"""
+        self.write_line(tuple(row_to_write))
+
+    def write_records(self, records: np.ndarray):
+        """Write an array of records right away, after any rows that are waiting"""
+        with self.lock:
+            self.flush_locked()
+            self.file.write(np.ascontiguousarray(records, dtype=self.dtype).tobytes())
+            self.file.flush()
+            self.written = self.file.tell()
+
+    def flush_locked(self):
+        """Write every waiting row to the file. Must be called with self.lock held"""
+        if self.lines and not self.file.closed:
+            self.file.write(np.array(self.lines, dtype=self.dtype).tobytes())
+            self.lines = []
+            self.file.flush()
+            self.written = self.file.tell()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+
+class BinaryFile:
+
+    file_type = ".qfd"
+    magic = b"QFDATA1\n"
+    header_size = 4096      # bytes at the start of the file for the header. Rows start right after it
+
+    def __init__(self, path: str, name: str, labels: list = None, dtypes="f8", comment: str = "",
+                 flush_rows: int = 100, flush_interval: float = 1.):
+        """
+        Create or open a binary data file and manage it. The file starts with a fixed size header holding the column
+        labels and their data types; after that every row is stored back to back as one record. Because every row is
+        the same size, the rows can be memory mapped with load_binary() without reading the file. Comments go in a text
+        file next to it (see comments_filename()), so any number of them can be added during a run.
+        :param path: file path to where you want to save the file
+        :param name: name of the file you wish to create or open
+        :param labels: column labels. Needed when creating a file; when opening one they're read from its header
+        :param dtypes: numpy data type of each column, or one data type for all of them
+        :param comment: an optional comment to put in the file
+        :param flush_rows: write to the file once this many rows are waiting
+        :param flush_interval: write to the file at least this often (in seconds), so a crash loses at most this much
+        """
+
+        """MAKE SURE THE FILE NAME IS VALID"""
+        if name.endswith(BinaryFile.file_type):
+            name = name[:-len(BinaryFile.file_type)]
+        name = name.replace(".", "")
+        name += BinaryFile.file_type
+        self.filename = os.path.join(path, name)
+
+        """CHECK IF PATH TO FILE AND FILE EXIST"""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self.new = not os.path.exists(self.filename)
+        if self.new:
+            if not labels:
+                raise ValueError("Column labels are needed to create a new binary data file")
+            if isinstance(dtypes, str) or not hasattr(dtypes, "__len__"):
+                dtypes = [dtypes] * len(labels)
+            self.header = {"labels": list(labels),
+                           "dtypes": [np.dtype(dtype).str for dtype in dtypes]}
+            self.create_file()
+        else:
+            self.header = read_header(self.filename)
+        self.dtype = record_dtype(self.header)
+
+        # drop a record that was only partly written (if the program died in the middle of writing it)
+        extra = (os.path.getsize(self.filename) - BinaryFile.header_size) % self.dtype.itemsize
+        if extra:
+            os.truncate(self.filename, os.path.getsize(self.filename) - extra)
+        self.writer = RecordWriter(self.filename, self.dtype, flush_rows, flush_interval)
+
+        """APPEND OPTIONAL COMMENT"""
+        if comment:
+            self.write_comment(comment)
+
+    @property
+    def labels(self) -> list:
+        return self.header["labels"]
+
+    def write_row(self, row_to_write: list):
+        """Adds a row of values (in the order of the labels) to be written"""
+        self.writer.write_row(row_to_write)
+
+    def write_rows(self, rows: np.ndarray):
+        """Writes many rows at once. rows can be a 2D array (one column per label) or an array of records"""
+        if rows.dtype.names is None:
+            records = np.empty(len(rows), dtype=self.dtype)
+            for ii, label in enumerate(self.labels):
+                records[label] = rows[:, ii]
+            rows = records
+        self.writer.write_records(rows)
+
+    def write_comment(self, comment: str):
+        """Adds a comment to the file's comments"""
+        write_comments(self.filename, [comment])
+
+    def create_file(self):
+        """Creates file by writing the header, and starts its comments"""
+        with open(self.filename, "wb"):
+            pass
+        write_header(self.filename, self.header)
+        write_comments(self.filename, [f"This data file was created on {time.ctime(time.time())}"], mode="w")
+
+    def flush(self):
+        """Write any rows that are waiting to the file"""
+        self.writer.flush()
+
+    def close(self):
+        """Write any rows that are waiting and close the file"""
+        self.writer.close()
+
+
+def record_dtype(header: dict) -> np.dtype:
+    """The numpy data type of one row of a binary data file; one field per column, named by its label"""
+    return np.dtype([(label, dtype) for label, dtype in zip(header["labels"], header["dtypes"])])
+
+
+def write_header(filename: str, header: dict):
+    """Write (or rewrite) the header at the start of a binary data file"""
+    encoded = BinaryFile.magic + json.dumps(header).encode()
+    if len(encoded) + 1 > BinaryFile.header_size:
+        raise ValueError(f"The header of {filename} doesn't fit in {BinaryFile.header_size} bytes; "
+                         f"use shorter labels or fewer columns")
+    # pad with spaces so the rows always start at the same place, and end in a new line so it's readable with head
+    encoded = encoded.ljust(BinaryFile.header_size - 1) + b"\n"
+    with open(filename, "r+b") as f:
+        f.write(encoded)
+
+
+def read_header(filename: str) -> dict:
+    """Returns the header of a binary data file: {"labels": [...], "dtypes": [...]}"""
+    with open(filename, "rb") as f:
+        encoded = f.read(BinaryFile.header_size)
+    if not encoded.startswith(BinaryFile.magic):
+        raise ValueError(f"{filename} is not a binary data file")
+    return json.loads(encoded[len(BinaryFile.magic):].decode())
+
+
+def comments_filename(filename: str) -> str:
+    """The text file the comments of a binary data file go in, like run_comments.txt for run.qfd"""
+    return os.path.splitext(filename)[0] + "_comments.txt"
+
+
+def write_comments(filename: str, comments: list, mode: str = "a"):
+    """Add comments (one per line) to the comments of a binary data file. Use mode="w" to replace them instead"""
+    with open(comments_filename(filename), mode) as f:
+        f.write("".join([" ".join(str(comment).splitlines()) + "\n" for comment in comments]))
+
+
+def read_comments(filename: str) -> list:
+    """Every comment of a binary data file (including any in the header of a file made before comments moved out)"""
+    comments = list(read_header(filename).get("comments", []))
+    if os.path.exists(comments_filename(filename)):
+        with open(comments_filename(filename), "r") as f:
+            comments += [line.rstrip("\n") for line in f]
+    return comments
+
+
+def load_binary(filename: str, mode: str = "r") -> np.memmap:
+    """
+    Memory map the rows of a binary data file. Nothing is read until it's used, so this is instant for any number of
+    rows. Get a column with its label, like data["Time [s]"]
+    :param filename: full path to the file
+    :param mode: "r" for read only, "r+" to be able to change values in the file
+    :return: array of records (one per row), or an empty array if the file has no rows yet
+    """
+    dtype = record_dtype(read_header(filename))
+    rows = (os.path.getsize(filename) - BinaryFile.header_size) // dtype.itemsize     # leave off a partial row
+    if rows <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode=mode, offset=BinaryFile.header_size, shape=(rows,))
+
+
+def csv_labels(filename: str, comment: str = "#") -> tuple:
+    """Returns (comments, labels) from the top of a csv data file: the comment lines before the labels, and the first
+    line that isn't a comment split into labels"""
+    comments = []
+    with open(filename, "r") as f:
+        for line in f:
+            if line.startswith(comment):
+                comments.append(line[len(comment):].strip())
+            elif line.strip():
+                return comments, [label.strip().strip("'\"") for label in line.rstrip("\n").split(",")]
+    return comments, []
+
+
+def csv_to_binary(csv_filename: str, binary_filename: str = None, dtypes="f8") -> str:
+    """
+    Convert a csv data file to a binary data file
+    :param csv_filename: full path to the csv file
+    :param binary_filename: full path of the binary file to make. Defaults to the csv file's name with .qfd instead
+    :param dtypes: numpy data type of each column, or one data type for all of them
+    :return: full path of the binary file
+    """
+    if binary_filename is None:
+        binary_filename = os.path.splitext(csv_filename)[0] + BinaryFile.file_type
+    comments, labels = csv_labels(csv_filename)
+    tail = CSVTail(csv_filename)
+    tail.update()
+    if os.path.exists(binary_filename):
+        os.remove(binary_filename)
+    path, name = os.path.split(binary_filename)
+    binary = BinaryFile(path, name, labels, dtypes)
+    write_comments(binary.filename, comments + [f"Converted from {os.path.basename(csv_filename)}"], mode="w")
+    if tail.rows:
+        binary.write_rows(tail.data)
+    binary.close()
+    return binary.filename
+
+
+def binary_to_csv(binary_filename: str, csv_filename: str = None) -> str:
+    """
+    Convert a binary data file to a csv data file (in the same layout CSVFile writes)
+    :param binary_filename: full path to the binary file
+    :param csv_filename: full path of the csv file to make. Defaults to the binary file's name with .csv instead
+    :return: full path of the csv file
+    """
+    if csv_filename is None:
+        csv_filename = os.path.splitext(binary_filename)[0] + CSVFile.file_type
+    header = read_header(binary_filename)
+    data = load_binary(binary_filename)
+    with open(csv_filename, "w") as f:
+        for comment in read_comments(binary_filename):
+            f.write(f"# {comment}\n")
+        f.write(str(header["labels"]).lstrip("[").rstrip("]") + "\n")
+        for row in data.tolist():
+            f.write(", ".join([repr(value) for value in row]) + "\n")
+    return csv_filename
+
+
+class RollingDataFile:
+
+    index_name = "index.json"
+
+    def __init__(self, path: str, name: str, labels: list, comment: str = "", segment_class=CSVFile,
+                 max_bytes: int = 100 * 2 ** 20, max_seconds: float = 24 * 60 * 60., time_column: int = 0,
+                 index_interval: float = 10.):
+        """
+        A data file for very long runs, split into segment files. A new segment is started when the current one gets
+        bigger than max_bytes or older than max_seconds. The segments go in a folder named after the file, along with
+        a small index file that records each segment's time range and number of rows, so load_window() only has to
+        read the segments a time window falls in. Opening an existing rolling file continues in a new segment.
+        :param path: file path to where you want to save the folder of segments
+        :param name: name of the data file (and its folder)
+        :param labels: column labels
+        :param comment: an optional comment to put in the first segment
+        :param segment_class: CSVFile or BinaryFile
+        :param max_bytes: start a new segment once the current one has about this many bytes
+        :param max_seconds: start a new segment once the current one has been written to for this long
+        :param time_column: index of the column holding time stamps (in seconds since the epoch)
+        :param index_interval: how often (in seconds) to save the index while writing
+        """
+        self.path = os.path.join(path, name)
+        self.name = name
+        self.labels = list(labels)
+        self.segment_class = segment_class
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.time_column = time_column
+        self.index_interval = index_interval
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.index_filename = os.path.join(self.path, RollingDataFile.index_name)
+        self.new = not os.path.exists(self.index_filename)
+        if self.new:
+            self.index = {"labels": self.labels, "time column": time_column, "segments": []}
+        else:
+            self.index = read_index(self.path)
+
+        self.segment = None
+        self.segment_started = 0.
+        self.last_index_save = 0.
+        self.roll()
+
+        if comment:
+            self.write_comment(comment)
+
+    @property
+    def segments(self) -> list:
+        return self.index["segments"]
+
+    def roll(self):
+        """Close the current segment (if there is one) and start writing a new one"""
+        if self.segment:
+            self.segment.close()
+        number = len(self.segments)
+        segment_name = f"{self.name}_{number:04d}"
+        if self.segment_class is BinaryFile:
+            self.segment = BinaryFile(self.path, segment_name, self.labels)
+        else:
+            self.segment = self.segment_class(self.path, segment_name)
+            self.segment.write_row(self.labels)
+        self.segments.append({"file": os.path.basename(self.segment.filename), "start": None, "end": None,
+                              "rows": 0})
+        self.segment_started = time.time()
+        self.save_index()
+
+    def write_row(self, row_to_write: list):
+        """Write a row to the current segment, starting a new segment first if the current one is full"""
+        if self.segments[-1]["rows"] and (self.segment_bytes() >= self.max_bytes or
+                                          time.time() - self.segment_started >= self.max_seconds):
+            self.roll()
+        self.segment.write_row(row_to_write)
+
+        # keep track of what's in the segment for the index
+        entry = self.segments[-1]
+        timestamp = float(row_to_write[self.time_column])
+        if entry["start"] is None:
+            entry["start"] = timestamp
+        entry["end"] = timestamp if entry["end"] is None else max(entry["end"], timestamp)
+        entry["rows"] += 1
+        if time.time() - self.last_index_save > self.index_interval:
+            self.save_index()
+
+    def segment_bytes(self) -> int:
+        """Bytes the segment's writer has written to its file (rows still waiting to be written aren't counted, so a
+        segment can go past max_bytes by up to its writer's flush_rows rows). A binary segment's header isn't counted,
+        so max_bytes is the size of its rows the same as for a csv segment"""
+        written = self.segment.writer.written
+        if self.segment_class is BinaryFile:
+            written -= BinaryFile.header_size
+        return written
+
+    def write_comment(self, comment: str):
+        """Writes a comment in the current segment"""
+        self.segment.write_comment(comment)
+
+    def save_index(self):
+        """Write the index file. It's written to a temporary file first so a reader never sees half of it"""
+        temporary = self.index_filename + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(temporary, self.index_filename)
+        self.last_index_save = time.time()
+
+    def flush(self):
+        """Write any rows that are waiting and bring the index up to date"""
+        self.segment.flush()
+        self.save_index()
+
+    def close(self):
+        """Write any rows that are waiting, close the current segment and save the index"""
+        self.segment.close()
+        self.save_index()
+
+    def load_window(self, start: float = None, end: float = None) -> np.ndarray:
+        """Rows with time stamps from start to end; see load_window()"""
+        self.flush()
+        return load_window(self.path, start, end)
+
+
+def read_index(path: str) -> dict:
+    """Returns the index of the rolling data file in folder path"""
+    with open(os.path.join(path, RollingDataFile.index_name), "r") as f:
+        return json.load(f)
+
+
+def load_segment(filename: str) -> np.ndarray:
+    """Loads every row of one segment file as a 2D array"""
+    if filename.endswith(BinaryFile.file_type):
+        return structured_to_unstructured(load_binary(filename), dtype=float)
+    tail = CSVTail(filename)
+    tail.update()
+    return tail.data
+
+
+def load_window(path: str, start: float = None, end: float = None) -> np.ndarray:
+    """
+    Load the rows of a rolling data file that fall in a time window. Only the segments that overlap the window are
+    read
+    :param path: the rolling data file's folder
+    :param start: earliest time stamp to include (None for no limit)
+    :param end: latest time stamp to include (None for no limit)
+    :return: 2D array with one row per data point
+    """
+    index = read_index(path)
+    time_column = index["time column"]
+    segments = index["segments"]
+    chunks = []
+    for ii, segment in enumerate(segments):
+        if not segment["rows"] and ii < len(segments) - 1:
+            continue
+        # the last segment may still be getting written to, so its end in the index could be behind
+        segment_end = float("inf") if ii == len(segments) - 1 or segment["end"] is None else segment["end"]
+        segment_start = float("-inf") if segment["start"] is None else segment["start"]
+        if (end is not None and segment_start > end) or (start is not None and segment_end < start):
+            continue
+        data = load_segment(os.path.join(path, segment["file"]))
+        if not len(data):
+            continue
+        keep = np.ones(len(data), dtype=bool)
+        if start is not None:
+            keep &= data[:, time_column] >= start
+        if end is not None:
+            keep &= data[:, time_column] <= end
+        chunks.append(data[keep])
+    if not chunks:
+        return np.empty((0, len(index["labels"])))
+    return np.concatenate(chunks)
 
 
 class DataFile(CSVFile):
@@ -68,7 +517,8 @@ class DataFile(CSVFile):
     # set column labels here
     labels = ["Time (s)", "Temperature (K)", "Voltage (V)", "Frequency Hz"]
 
-    def __init__(self, path: str, name: str, measurement_frequencies: list, comment: str = "", port: int = get.port):
+    def __init__(self, path: str, name: str, measurement_frequencies: list, comment: str = "", port: int = get.port,
+                 rolling: dict = None):
         """
         Create or open a data file and manage it.
         :param path: file path to where you want to save the file
@@ -76,9 +526,17 @@ class DataFile(CSVFile):
         :param measurement_frequencies: list of frequencies that will be measured, given in Hz
         :param comment: an optional comment to put in the file
         :param port: the port to connect to communicate over
+        :param rolling: settings to split the data into segment files for long runs; see CSVFile
         """
+        """CREATE COLUMN LABELS BASED ON FREQUENCIES MEASURED AT"""
+        # The number of columns will be equal to the number of labels specified in the class attribute times the number
+        # of frequencies you measure at.
+        self.measurement_frequencies = measurement_frequencies
+        self.labels = [""] * (len(DataFile.labels) * len(measurement_frequencies))      # initiates self.labels
+        self.get_labels()       # sets self.labels in method
+
         # This will open or create the file and give methods write_row(list) and write_comment(str)
-        super(self.__class__, self).__init__(path, name, comment)
+        super(self.__class__, self).__init__(path, name, comment, rolling=rolling, labels=self.labels)
 
         """PLACE ALL DEVICES USED IN DATA ACQUISITION FOR THIS KIND OF DATA FILE HERE"""
         # Use client versions if you are communicating over a server to ensure no communication conflicts
@@ -89,15 +547,10 @@ class DataFile(CSVFile):
         """SET RUNNING PARAMETER"""
         # This parameter gives control over turning off while loops
         self.running = False
+        self.scheduler = PeriodicScheduler()    # keeps take_data_continuous() on time; its stats show how it kept up
 
-        """CREATE COLUMN LABELS BASED ON FREQUENCIES MEASURED AT"""
-        # The number of columns will be equal to the number of labels specified in the class attribute times the number
-        # of frequencies you measure at.
-        self.measurement_frequencies = measurement_frequencies
-        self.labels = [""] * (len(DataFile.labels) * len(measurement_frequencies))      # initiates self.labels
-        self.get_labels()       # sets self.labels in method
-        # Write labels to file if we created a new file
-        if self.new:
+        # Write labels to file if we created a new file (a rolling file writes them at the top of every segment)
+        if self.new and not self.rolling:
             self.write_row(self.labels)
 
         """GET UNITS OF TEMPERATURE AS DEFINED IN THE CLASS LABELS"""
@@ -110,15 +563,26 @@ class DataFile(CSVFile):
         # gets the character in parentheses
         self.temperature_units = DataFile.labels[temperature_label_index].split('(')[1].split(')')[0]
 
-    def take_data_continuous(self, print_data=True):
-        """Takes data continuously until self.running is turned off"""
+    def take_data_continuous(self, print_data=True, period: float = None):
+        """Takes data continuously until stop() is called
+        :param print_data: print each row as it's taken
+        :param period: seconds between the start of each sweep. None to start the next sweep as soon as the last one
+        is done"""
         self.running = True
-        while self.running:
+        self.scheduler.period = period
+        self.scheduler.reset()
+        while self.running and self.scheduler.wait():
             data = self.sweep_frequencies()
             if print_data:
                 print(data)
             self.write_row(data)
 
+    def stop(self):
+        """Stop take_data_continuous(). It stops right away if it's waiting for the next sweep (instead of waiting out
+        the period), or when the sweep it's in is done"""
+        self.running = False
+        self.scheduler.stop()
+
     def get_data_point(self, frequency: float) -> list:
         """Set experiment to a given frequency and make a measurement.
         Length of return list should be the same length as DataFile.labels"""
@@ -173,40 +637,70 @@ class DataFileGuiExample(CSVFile):
 
     labels = ['Time [s]', 'Voltage [V]', 'Temperature [K]', 'Counts']
 
-    def __init__(self, file_path: str, comment: str = '', port: int = get.port):
+    # statistics that can be written after the averages (see RunningStats.names). Count is the same for every
+    # instrument, so it's only written once
+    statistics = ['std', 'sem', 'min', 'max']
+
+    def __init__(self, file_path: str, comment: str = '', port: int = get.port, parallel: bool = True,
+                 statistics: bool = False, rolling: dict = None):
         """
         Creates (or opens if it the file name already exists) a data file for the GUI App example in Activity 8
         :param file_path: full path to file
         :param comment: an optional comment to write to the script
         :param port: the port number to connect to to communicate with the GPIB server
+        :param parallel: read the instruments at the same time instead of one after another
+        :param statistics: also write the standard deviation, standard error, min and max of each averaged column,
+        and the number of readings averaged, after the usual columns
+        :param rolling: settings to split the data into segment files for long runs; see CSVFile
         """
         print(file_path)
         """CREATE OBJECTS FOR DEVICE CLIENTS"""
         self.ls = LakeShore(331, port=port)
-        self.vs = FakeVoltageSupply()
-        self.pc = FakePhotonCounter()
+        self.vs = FakeVoltageSupply(port)
+        self.pc = FakePhotonCounter(port)
+
+        # the instruments don't depend on each other, so they can all be read at once
+        self.sampler = ParallelSampler({'voltage': self.vs.read_voltage,
+                                        'temperature': self.ls.read_temperature,
+                                        'counts': self.pc.read_counts}, parallel=parallel)
+        self.reading_times = {}     # name -> time stamp of each instrument's (average) reading in the last data point
+        self.stats = {}             # name -> RunningStats of each instrument's readings in the last data point
+
+        self.statistics = statistics
+        self.labels = list(DataFileGuiExample.labels)
+        if statistics:
+            for label in DataFileGuiExample.labels[1:]:
+                self.labels += [f'{label} {statistic}' for statistic in DataFileGuiExample.statistics]
+            self.labels.append('Count')
 
         path_list = file_path.split(os.sep)
         path = os.sep.join(path_list[:-1])
         name = path_list[-1]
-        super(self.__class__, self).__init__(path, name, comment)
+        super(self.__class__, self).__init__(path, name, comment, rolling=rolling, labels=self.labels)
 
-        if self.new:
-            self.write_row(DataFileGuiExample.labels)
+        if self.new and not self.rolling:
+            self.write_row(self.labels)
 
-    def take_data_point(self, ave: int = 1):
+    def take_data_point(self, ave: int = 1, write: bool = True):
         """Sweep through measurements and write them in a new row
-        will average a number of data points if ave > 1"""
-        ave = int(ave)
-        times = np.zeros(ave)
-        voltages = np.zeros(ave)
-        temperatures = np.zeros(ave)
-        counts = np.zeros(ave)
-        for ii in range(ave):
-            times[ii] = time.time()
-            voltages[ii] = self.vs.read_voltage()
-            temperatures[ii] = self.ls.read_temperature()
-            counts[ii] = self.pc.read_counts()
-        data_point = [sum(times)/ave, sum(voltages)/ave, sum(temperatures)/ave, sum(counts)/ave]
-        self.write_row(data_point)
+        will average a number of data points if ave > 1
+        Set write to False to only return the row (when something else, like a data bus, writes it)"""
+        samples = self.sampler.sample(ave)
+        self.reading_times = {name: times.mean for name, (times, _) in samples.items()}
+        self.stats = {name: readings for name, (_, readings) in samples.items()}
+        # the row's time is the average of when each instrument was read
+        data_point = [float(np.mean(list(self.reading_times.values())))]
+        columns = ['voltage', 'temperature', 'counts']
+        data_point += [self.stats[name].mean for name in columns]
+        if self.statistics:
+            for name in columns:
+                data_point += [getattr(self.stats[name], statistic) for statistic in DataFileGuiExample.statistics]
+            data_point.append(self.stats[columns[0]].count)
+        if write:
+            self.write_row(data_point)
         return data_point
+
+    def close(self):
+        """Write any rows that are waiting, close the file and stop the sampling threads"""
+        super(self.__class__, self).close()
+        self.sampler.close()
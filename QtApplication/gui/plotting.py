@@ -6,6 +6,7 @@ Pyqtgraph plot widgets with some presets
 
 from PySide6.QtGui import QPen
 import pyqtgraph as pg
+from decimation import DecimatedCurve
 
 
 color = {'dark red': (155, 0, 0),
@@ -31,7 +32,8 @@ class Plot(pg.PlotWidget):
         :param x_label: Label for the x-axis
         :param y_label: Label for the y-axis
         :param right_axis: a view box you wish to plot to the right axis
-        :param date_axis_item: for time.time() style time stamp data on the x-axis
+        :param date_axis_item: for time.time() style time stamp data on the x-axis. Data is then decimated with a
+        min/max pyramid (x has to only go up); otherwise it's strided
         """
         super(self.__class__, self).__init__()
         self.x_label = x_label
@@ -44,6 +46,8 @@ class Plot(pg.PlotWidget):
 
         self.pen = pen
         self.curve = self.plot(pen=pen, name=y_label)
+        # use self.decimated.set_data(x, y) to draw about a point per pixel of however much data there is
+        self.decimated = DecimatedCurve(self.curve, self.getViewBox(), monotonic_x=date_axis_item)
 
         if self.right_axis:
             self.showAxis('right')
@@ -68,3 +72,5 @@ class RightAxisPlot(pg.ViewBox):
         self.pen = pen
         self.curve = pg.PlotCurveItem(pen=self.pen, name=label)
         self.addItem(self.curve)
+        # this is plotted against time, so the min/max pyramid can be used
+        self.decimated = DecimatedCurve(self.curve, self)
@@ -8,16 +8,19 @@ import os.path
 
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QPushButton, QStackedWidget, QSizePolicy,
                                QDialog, QMessageBox, QFileDialog, QMainWindow)
-from PySide6.QtCore import Slot, Signal
+from PySide6.QtCore import Slot, Signal, QTimer
 from PySide6.QtGui import QFont, QTextCursor
 from gui.new_data_file_prompt import NewDataPrompt
 import gui.built_in as built_in
 from data_files import DataFileGuiExample as DataFile
+from data_bus import DataBus
+from scheduler import PeriodicScheduler
 from server import GpibServer
 from client_tools import send as send_client
 import threading
 import time
 import datetime
+import collections
 
 
 class SignalWidget(QWidget):
@@ -31,15 +34,24 @@ class DataTab(QWidget):
 
     font = QFont("Arial", 12)
 
-    def __init__(self, parent: QMainWindow):
+    def __init__(self, parent: QMainWindow, refresh_rate: float = 30., max_lines: int = 10000,
+                 sample_period: float = None, rolling: dict = None):
         """
         Tab for managing the current data file
         :param parent: Is the MainWindow() object
+        :param refresh_rate: most times per second the text stream and plots get updated. Everything that comes in
+        between updates is shown all at once
+        :param max_lines: most lines to keep in the text stream. The oldest lines are dropped past this
+        :param sample_period: seconds between the start of each data point. None to take the next one as soon as the
+        last one is done
+        :param rolling: settings to split new data files into segment files for long runs, like
+        {"max_bytes": 100 * 2 ** 20, "max_seconds": 24 * 60 * 60} (see data_files.RollingDataFile). None to write
+        each data file as one csv file
         """
         QWidget.__init__(self)
         self.parent = parent
 
-        self.gpib_server = GpibServer(do_print=False)
+        self.gpib_server = GpibServer(silent=True)
 
         self.dialog = None
         self.data = None            # will be an object of a data file from data_file2.py
@@ -49,18 +61,20 @@ class DataTab(QWidget):
 
         self.running = False
         self.active_file = False
+        # keeps data points evenly spaced, and traces a warning whenever data points are skipped to keep up
+        self.scheduler = PeriodicScheduler(sample_period, trace=self.gpib_server.trace, source="data")
+        self.rolling = rolling
 
         """So we can write to the GUI from threads"""
-        self.writer_signaler = SignalWidget()
-        self.writer_signaler.message.connect(self.write_from_thread)
+        # text written from any thread waits here until the next refresh puts all of it in the text stream at once
+        self.pending_text = collections.deque()
 
         """So we can update plots when new data is taken"""
-        self.plot_updater = SignalWidget()
         self.plot_initializer = SignalWidget()
-        # Moved to activate_data_file()
-        # self.plot_updater = PlotUpdaterWidget()
-        # self.plot_updater.update.connect(self.parent.plot_tab.update_plots)
-        # self.plot_updater.initialize.connect(self.parent.plot_tab.initialize_plots)
+
+        """New data points get published here"""
+        # made for each data file in start_data_bus(), since how many columns there are depends on the file
+        self.data_bus = None
 
         """Create the layout of what goes in this tab"""
         self.layout = QVBoxLayout(self)
@@ -68,6 +82,7 @@ class DataTab(QWidget):
         self.data_text_stream = QTextEdit()     # this will be where data gets printed as it's collected
         self.data_text_stream.setReadOnly(True)
         self.data_text_stream.setFont(DataTab.font)
+        self.data_text_stream.document().setMaximumBlockCount(max_lines)
 
         self.bottom_row = QHBoxLayout()         # this will be a row to add widgets to bellow the text stream
         self.bottom_row.addStretch(1)
@@ -108,20 +123,40 @@ class DataTab(QWidget):
         self.layout.addWidget(self.data_text_stream)
         self.layout.addLayout(self.bottom_row)
 
+        """Update the GUI at a steady rate instead of every time something comes in"""
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(int(1000 / refresh_rate))
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+
     def write(self, text: str, end: str = "\n"):
-        """Writes to the GUI by using the write_thread widget"""
-        # print(f'sending "{text}" to thread')
-        self.writer_signaler.message.emit(text + end)
-
-    @Slot(str)
-    def write_from_thread(self, text: str):
-        """Writes to GUI from the write_thread object attribute"""
-        # print(f'received "{text}" fom thread')
-        self.data_text_stream.moveCursor(QTextCursor.End)
-        self.data_text_stream.insertPlainText(text)
-        # self.data_text_stream.moveCursor(QTextCursor.End)
-        # make the scroll bar scroll with the new text as it fills past the size of the window
-        self.data_text_stream.verticalScrollBar().setValue(self.data_text_stream.verticalScrollBar().maximum())
+        """Writes to the GUI. This is safe to call from any thread; the text shows up on the next refresh"""
+        self.pending_text.append(text + end)
+
+    @Slot()
+    def refresh(self):
+        """Runs refresh_rate times per second in the GUI thread. Puts all the text that's waiting in the text stream
+        in one go, and updates the plots once if any new data came in"""
+        if self.pending_text:
+            text = []
+            while self.pending_text:
+                text.append(self.pending_text.popleft())
+            self.data_text_stream.moveCursor(QTextCursor.End)
+            self.data_text_stream.insertPlainText("".join(text))
+            # make the scroll bar scroll with the new text as it fills past the size of the window
+            self.data_text_stream.verticalScrollBar().setValue(self.data_text_stream.verticalScrollBar().maximum())
+        plot_tab = self.parent.plot_tab
+        if plot_tab.live_plotting and plot_tab.has_new_data():
+            plot_tab.update_plots()
+
+    def save_data_point(self, record):
+        """Data bus sink that writes new data points to the data file"""
+        if self.data:
+            self.data.write_row(record[0].tolist())
+
+    def print_data_point(self, record):
+        """Data bus sink that writes new data points to the text stream"""
+        self.write(str(list(record[0].tolist())))
 
     @Slot()
     def open_file(self):
@@ -157,6 +192,7 @@ class DataTab(QWidget):
                 self.write(f'Using averaging setting of {self.dialog.averaging_entry}')
                 self.activate_data_file(filename)
                 self.data = DataFile(filename)
+                self.start_data_bus()
                 self.data_thread.start()
 
     @Slot()
@@ -202,15 +238,23 @@ class DataTab(QWidget):
 
                 file_path = os.path.join(self.parent.data_base_path, filename)
                 self.activate_data_file(file_path)
-                self.data = DataFile(file_path, comment)
+                self.data = DataFile(file_path, comment, rolling=self.rolling)
+                self.start_data_bus()
                 self.data_thread.start()
 
+    def start_data_bus(self):
+        """Make a data bus with the columns of the data file that was just made (they depend on its settings, like
+        whether statistics are saved). The data file and the text stream are its sinks, and the plot tab subscribes"""
+        self.data_bus = DataBus(self.data.labels)
+        self.data_bus.add_sink(self.save_data_point)
+        self.data_bus.add_sink(self.print_data_point)
+        self.parent.plot_tab.connect_bus(self.data_bus)
+
     def activate_data_file(self, filename):
         """Whether we open a file or make a new one, we need to do all these things"""
         self.server_thread = threading.Thread(target=self.gpib_server.run, args=())
         self.data_thread = threading.Thread(target=self.take_data, args=())
 
-        self.plot_updater.trigger.connect(self.parent.plot_tab.update_plots)
         self.plot_initializer.message.connect(self.parent.plot_tab.initialize_plots)
         self.plot_initializer.message.emit(filename)
 
@@ -231,14 +275,15 @@ class DataTab(QWidget):
     def take_data(self):
         """This should be ran in a thread"""
         self.running = True
+        self.scheduler.reset()
         while self.active_file:
-            while self.running:
-                data_point = self.data.take_data_point(ave=self.dialog.averaging_entry)
-                print(f'Got this as data: {data_point}')
-                self.data.write_row(data_point)
-                self.write(str(data_point))
-                if self.parent.plot_tab.live_plotting:
-                    self.plot_updater.trigger.emit()
+            while self.running and self.scheduler.wait():
+                # the data bus sends it to the file, the text stream, and the plots
+                data_point = self.data.take_data_point(ave=self.dialog.averaging_entry, write=False)
+                self.gpib_server.trace.debug("data", "Took data point {point}", point=list(data_point))
+                self.data_bus.publish(data_point)
+            time.sleep(0.05)        # don't spin while paused
+            self.scheduler.next_deadline = None     # restart the timeline when unpaused instead of counting overruns
 
     @Slot()
     def continue_data(self):
@@ -267,7 +312,10 @@ class DataTab(QWidget):
         if exit_question == QMessageBox.Yes:
             self.running = False
             self.active_file = False
+            self.scheduler.stop()       # so it doesn't finish waiting for the next data point
             self.data_thread.join()
+            self.write(self.scheduler.summary())
+            self.gpib_server.trace.info("data", "{summary}", summary=self.scheduler.summary())
             self.button_stop.setEnabled(False)
             self.button_play_pause.setCurrentWidget(self.button_play)
             self.button_play.setEnabled(False)
@@ -279,6 +327,11 @@ class DataTab(QWidget):
             send_client('shutdown')
             self.server_thread.join()
             self.write("Closing File")
+            # keep what the server did while taking this data next to the data file
+            trace_file = os.path.splitext(self.data.filename)[0] + "_trace.jsonl"
+            self.gpib_server.trace.dump(trace_file)
+            self.write(f"Saved trace to {trace_file}")
+            self.data.close()
             self.data = None
             self.dialog = None
             return True
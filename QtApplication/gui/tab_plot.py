@@ -8,8 +8,11 @@ from PySide6.QtWidgets import QWidget, QGridLayout, QVBoxLayout, QHBoxLayout, QT
 from PySide6.QtCore import Slot
 import gui.built_in as built_in
 from gui.plotting import Plot, RightAxisPlot
+from csv_tail import CSVTail
+from ring_buffer import RingBuffer
 import sys
 import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
 import pyqtgraph as pg
 
 
@@ -19,23 +22,38 @@ class PlotTab(QWidget):
     colors = [(0, 0, 255), (255, 0, 0), (0, 0, 0)]
     pens = dict(zip(data_columns[1:], [pg.mkPen(color, width=2) for color in colors]))
 
-    def __init__(self, parent: QMainWindow, link_x: bool = True, link_y: bool = False):
+    def __init__(self, parent: QMainWindow, link_x: bool = True, link_y: bool = False,
+                 window_seconds: float = 10 * 60., window_rows: int = 2 ** 16):
         """
         Tab for plotting
         :param parent: Is the MainWindow() object
         :param link_x: Do you want it to lock x axes of the same type together?
         :param link_y: Do you want it to lock y axes of the same type together?
+        :param window_seconds: how much time to show in live window mode
+        :param window_rows: most rows to hold in live window mode. Memory for them is set aside up front
         """
         QWidget.__init__(self)
         pg.setConfigOption('background', 'w')
         pg.setConfigOption('foreground', 'k')
 
-        self.data_line_skip = 0
         self.live_plotting = True
 
         self.parent = parent
 
         self.filename = None
+        self.tail = None        # reads the history from the data file, or just its new rows if there's no data bus
+        self.subscription = None    # new rows come from the data bus through this once connect_bus() is called
+        self.last_time = -np.inf    # time stamp of the newest row plotted, so rows aren't plotted twice
+        # set when the history is (re)loaded, so the next update makes the time plots' pyramids again instead of
+        # adding to pyramids made from other rows (like the window's, or another file's)
+        self.history_reloaded = False
+
+        # in live window mode only the last window_seconds are plotted, from a fixed size buffer, so memory and drawing
+        # time stay the same no matter how long the run goes. Otherwise the whole history is plotted
+        self.window_seconds = window_seconds
+        # (remade by fit_window() if the data has more columns, like when statistics are saved)
+        self.window = RingBuffer(window_rows, len(PlotTab.data_columns))
+        self.window_mode = False
 
         main_layout = QHBoxLayout(self)
         plot_layout = QGridLayout()
@@ -79,7 +97,11 @@ class PlotTab(QWidget):
         self.button_play_pause.clicked.connect(self.swap_live)
         self.set_live_plotting(True)
 
-        buttons = [self.button_play_pause, self.button_update]
+        self.button_window = QToolButton()
+        self.button_window.clicked.connect(self.swap_window)
+        self.set_window_mode(False)
+
+        buttons = [self.button_play_pause, self.button_update, self.button_window]
         for button in buttons:
             button_layout.addWidget(button)
         button_layout.addStretch(0)
@@ -93,6 +115,83 @@ class PlotTab(QWidget):
     def initialize_plots(self, filename):
         """Second initialize for after the MainWindow() is completely done initializing"""
         self.filename = filename
+        self.tail = CSVTail(filename)
+        # the curves may still hold a previous file's data, which the new file's rows aren't added on to
+        for plot in (self.plot_TvV, self.plot_CvT, self.plot_Tvt, self.plot_Vvt, self.plot_Cvt):
+            plot.decimated.reset()
+        self.load_history()
+        if self.window_mode:
+            self.history_to_window()
+
+    def connect_bus(self, bus):
+        """
+        Get new rows pushed from a DataBus instead of reading them back from the data file
+        :param bus: data_bus.DataBus the data taking thread publishes to
+        """
+        if self.subscription:
+            self.subscription.cancel()
+        self.fit_window(len(bus.labels))
+        # rows pile up here while live plotting is paused, so hold at most as many as the window does whatever the
+        # mode; the window can't show more than that, and the full history gets what was dropped from the file
+        # (see read_new_rows). DataTab.refresh() checks has_new_data() at a steady rate rather than being told about
+        # every row
+        self.subscription = bus.subscribe(max_records=self.window.capacity)
+
+    def fit_window(self, columns: int):
+        """Make the window's buffer hold rows with this many columns, if it doesn't already"""
+        if self.window.columns != columns:
+            self.window = RingBuffer(self.window.capacity, columns)
+
+    def has_new_data(self) -> bool:
+        """True if rows are waiting on the data bus (always True without a data bus, since the file has to be checked
+        to know)"""
+        return not self.subscription or bool(self.subscription.records)
+
+    def load_history(self):
+        """(Re)load every row from the data file"""
+        data_file = getattr(self.parent.data_tab, 'data', None)
+        if data_file:
+            data_file.flush()       # so rows the writer is holding on to are in the file
+        self.window.clear()
+        self.tail.reset()
+        if getattr(data_file, 'rolling', False):
+            # a rolling data file is a folder of segment files rather than one file to read
+            rows = data_file.writer.load_window()
+            if len(rows):
+                self.tail.append(rows)
+        else:
+            self.tail.update()
+        self.last_time = self.tail.data[-1, 0] if self.tail.rows else -np.inf
+        self.history_reloaded = True
+
+    def history_to_window(self):
+        """Start the window off with the end of the history, then let go of the history"""
+        self.window.clear()
+        if self.tail.rows:
+            self.fit_window(self.tail.data.shape[1])
+            self.window.append(self.tail.data[-self.window.capacity:])
+        self.tail.release()
+
+    def read_new_rows(self) -> np.ndarray:
+        """Rows that came in since the last update: from the data bus if it's connected, otherwise from the file"""
+        if self.subscription:
+            if self.subscription.dropped:
+                self.subscription.dropped = 0
+                if not self.window_mode and self.tail:
+                    # rows were dropped while waiting (like while paused), so get the history from the file again.
+                    # Rows still waiting that are already in the file get skipped below
+                    self.load_history()
+            records = self.subscription.drain()
+            if not len(records):
+                return np.empty((0, 0))
+            rows = structured_to_unstructured(records, dtype=float)
+            # rows that were already loaded from the file (when the history was loaded) get skipped
+            rows = rows[rows[:, 0] > self.last_time]
+        else:
+            rows = self.tail.read_new()
+        if len(rows):
+            self.last_time = rows[-1, 0]
+        return rows
 
     def set_live_plotting(self, on):
         """Turn live plotting on or off"""
@@ -110,33 +209,69 @@ class PlotTab(QWidget):
         """Switch the live plotting setting"""
         self.set_live_plotting(not self.live_plotting)
 
+    def set_window_mode(self, on: bool):
+        """Turn live window mode on (plot the last window_seconds) or off (plot the whole history)"""
+        self.window_mode = on
+        if on:
+            self.button_window.setIcon(built_in.icon(self, 'MediaSeekForward'))
+            self.button_window.setToolTip(f'Showing the last {self.window_seconds / 60:g} minutes. '
+                                          f'Click to show the full history')
+        else:
+            self.button_window.setIcon(built_in.icon(self, 'FileDialogListView'))
+            self.button_window.setToolTip(f'Showing the full history. '
+                                          f'Click to show only the last {self.window_seconds / 60:g} minutes')
+        if self.tail:
+            if on:
+                self.history_to_window()
+            else:
+                self.load_history()
+            self.update_plots()
+
+    @Slot()
+    def swap_window(self):
+        """Switch between live window mode and the full history"""
+        self.set_window_mode(not self.window_mode)
+
     @Slot()
     def update_plots(self):
         """Draw curves to update the plots to any changes in the data file"""
-        if self.parent.data_tab.active_file:
+        if self.parent.data_tab.active_file and self.tail:
+            new_rows = self.read_new_rows()
+            if len(new_rows):
+                if self.window_mode:
+                    self.window.append(new_rows)
+                else:
+                    self.tail.append(new_rows)
             data = self.load_data()
+            if not len(data):
+                return
             time_data = data[:, 0]
             voltage_data = data[:, 1]
             temperature_data = data[:, 2]
             counts_data = data[:, 3]
 
-            self.plot_TvV.curve.setData(x=voltage_data, y=temperature_data)
-            self.plot_CvT.curve.setData(x=temperature_data, y=counts_data)
-            self.plot_Tvt.curve.setData(x=time_data, y=temperature_data)
-            self.plot_Vvt.curve.setData(x=time_data, y=voltage_data)
-            self.plot_Cvt.curve.setData(x=time_data, y=counts_data)
+            # the plots only get sent about as many points as they have pixels
+            # (in window mode the data moves instead of growing, and a reloaded history isn't the old data with rows
+            # added, so either way the time plots' pyramids are made again)
+            replaced = self.window_mode or self.history_reloaded
+            self.history_reloaded = False
+            self.plot_TvV.decimated.set_data(voltage_data, temperature_data)
+            self.plot_CvT.decimated.set_data(temperature_data, counts_data)
+            self.plot_Tvt.decimated.set_data(time_data, temperature_data, replaced=replaced)
+            self.plot_Vvt.decimated.set_data(time_data, voltage_data, replaced=replaced)
+            self.plot_Cvt.decimated.set_data(time_data, counts_data, replaced=replaced)
 
     def load_data(self) -> np.ndarray:
-        """Loads data from filename. Will make attempts to load data and if it fails, it will add to the amount of lines
-        needed to skip. After the first attempt to load data, it should succeed on the first attempt every time"""
-        data = None
-        while not data:
-            try:
-                data = np.loadtxt(self.filename, comments="#", delimiter=",", skiprows=self.data_line_skip)
-                break
-            except ValueError:
-                self.data_line_skip += 1
-        return data
+        """Returns the data read from filename so far (a view, not a copy), or in window mode just the last
+        window_seconds of it"""
+        if self.window_mode:
+            data = self.window.data
+            if len(data):
+                # time stamps only go up, so the window starts at the first one inside it
+                start = np.searchsorted(data[:, 0], data[-1, 0] - self.window_seconds)
+                data = data[start:]
+            return data
+        return self.tail.data
 
 
 if __name__ == "__main__":
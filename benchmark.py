@@ -0,0 +1,272 @@
+"""
+Benchmarks for the whole server/client stack, so you can tell whether a change made data taking faster or slower.
+
+It starts a GpibServer with fake devices that take a set time to answer (fake_gpib_devices.Latency), and measures
+    - commands per second and latency percentiles with many device clients asking at once
+    - how long DataFileGuiExample.take_data_point takes per row
+    - how long writing and reloading csv data files takes, from 10^3 up to 10^7 rows
+and saves the results to a JSON file. Run it with GPIB and QtApplication on the path (like the rest of the project):
+    python benchmark.py run results.json [--quick] [--max-rows 1e7]
+(--quick only goes up to 10^5 rows unless --max-rows is given)
+and compare two runs (like before and after a change) with
+    python benchmark.py compare before.json after.json [--threshold 10]
+which marks every result that got more than threshold percent worse, and exits with 1 if any did.
+
+author: Teddy Tortorici
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import get
+from client_tools import DeviceClient
+from csv_tail import CSVTail
+from csv_writer import CSVWriter
+from server import GpibServer
+import fake_gpib_devices
+
+# results whose names end with these get better as they go up; everything else is a time, so it gets better going down
+higher_is_better = ("per s",)
+# single worst cases change a lot from run to run, so they're shown but never counted as regressions
+noisy = ("max ms",)
+
+
+def git_version() -> str:
+    """The commit the code being benchmarked is at, so results can be matched up with versions"""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def latency_summary(latencies) -> dict:
+    """Percentiles (in milliseconds) of a list of latencies in seconds"""
+    latencies = np.asarray(latencies) * 1e3
+    if not len(latencies):
+        return {}
+    return {"mean ms": float(latencies.mean()),
+            "p50 ms": float(np.percentile(latencies, 50)),
+            "p90 ms": float(np.percentile(latencies, 90)),
+            "p99 ms": float(np.percentile(latencies, 99)),
+            "max ms": float(latencies.max())}
+
+
+class BenchmarkServer:
+
+    def __init__(self, port: int, devices: int = 4, latency: float = 0.001):
+        """
+        A GpibServer running in a thread with fake devices D0, D1, ... that each take 'latency' seconds to answer,
+        plus LS, VS and PC for DataFileGuiExample. Caching is off so every command reaches its device
+        """
+        self.port = port
+        self.dev_ids = [f"D{ii}" for ii in range(devices)]
+        self.server = GpibServer(port=port, silent=True, cacheable={}, devices={})
+        for ii, dev_id in enumerate(self.dev_ids + ["LS", "VS", "PC"]):
+            self.server.devices.add(dev_id, fake_gpib_devices.Latency, ii, latency=latency,
+                                    responses={"PID?": "1,1,1"})
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while self.server.loop is None:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.stop()
+        self.thread.join(10)
+
+
+def throughput(port: int, dev_ids: list, clients: int, duration: float, persistent: bool = True) -> dict:
+    """
+    Have 'clients' device clients each query as fast as they can for 'duration' seconds
+    :param persistent: share one long-lived connection (like the GUI does) instead of connecting for every message
+    :return: commands per second and latency percentiles
+    """
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    start_event = threading.Event()
+    end = [0.]
+
+    def client_loop(index: int):
+        client = DeviceClient(dev_ids[index % len(dev_ids)], port=port, persistent=persistent)
+        times = latencies[index]
+        start_event.wait()
+        while time.perf_counter() < end[0]:
+            sent = time.perf_counter()
+            try:
+                client.query("KRDG? A")
+            except (OSError, ConnectionError):
+                errors[index] += 1
+                continue
+            times.append(time.perf_counter() - sent)
+
+    threads = [threading.Thread(target=client_loop, args=(ii,)) for ii in range(clients)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    end[0] = start + duration
+    start_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    every_latency = [latency for times in latencies for latency in times]
+    result = {"commands": len(every_latency), "commands per s": len(every_latency) / elapsed, "errors": sum(errors)}
+    result.update(latency_summary(every_latency))
+    return result
+
+
+def acquisition(port: int, rows: int, ave: int = 1, parallel: bool = True) -> dict:
+    """Time DataFileGuiExample.take_data_point (without the fake clients' made up one second delays)"""
+    from data_files import DataFileGuiExample
+    times = []
+    with tempfile.TemporaryDirectory() as path:
+        data = DataFileGuiExample(os.path.join(path, "benchmark.csv"), port=port, parallel=parallel)
+        data.vs.delay = 0
+        data.pc.delay = 0
+        for ii in range(rows):
+            start = time.perf_counter()
+            data.take_data_point(ave=ave)
+            times.append(time.perf_counter() - start)
+        data.close()
+    result = {"rows": rows, "rows per s": rows / sum(times)}
+    result.update(latency_summary(times))
+    return result
+
+
+def csv_round_trip(rows: int, columns: int = 4) -> dict:
+    """Time writing 'rows' rows to a csv file with CSVWriter and reading them all back with CSVTail"""
+    values = np.random.random((min(rows, 100000), columns))     # reuse a block of rows so making them isn't timed
+    with tempfile.TemporaryDirectory() as path:
+        filename = os.path.join(path, "benchmark.csv")
+        start = time.perf_counter()
+        with CSVWriter(filename, flush_rows=1000, flush_interval=None) as writer:
+            writer.write_row([f"Column {ii}" for ii in range(columns)])
+            for ii in range(rows):
+                writer.write_row(values[ii % len(values)].tolist())
+        write_time = time.perf_counter() - start
+        size = os.path.getsize(filename)
+
+        start = time.perf_counter()
+        tail = CSVTail(filename)
+        tail.update()
+        read_time = time.perf_counter() - start
+        loaded = len(tail.data)
+    return {"rows": rows, "loaded rows": loaded, "MB": size / 1e6,
+            "write s": write_time, "write rows per s": rows / write_time,
+            "reload s": read_time, "reload rows per s": rows / read_time}
+
+
+def run(filename: str, quick: bool = False, max_rows: int = None, port: int = get.port + 100,
+        latency: float = 0.001):
+    """
+    Run every benchmark and save the results
+    :param filename: JSON file to save the results to
+    :param quick: shorter runs with fewer settings, for a quick check
+    :param max_rows: most rows to write and reload csv files with (in powers of ten from 10^3). None for 10^7, or
+    10^5 with quick. The 10^7 row file is about 800 MB, takes a few minutes, and needs about 1 GB of RAM to reload, so
+    it's only the default for a full run
+    :param port: port to run the benchmark server on (so it doesn't get in the way of a real one)
+    :param latency: seconds each fake device takes to answer
+    """
+    duration = 1. if quick else 5.
+    if max_rows is None:
+        max_rows = 100000 if quick else 10000000
+    results = {}
+
+    with BenchmarkServer(port, latency=latency) as bench:
+        for clients in ([1, 8] if quick else [1, 4, 16, 64]):
+            name = f"throughput {clients} clients"
+            results[name] = throughput(port, bench.dev_ids, clients, duration)
+            print(f"{name}: {results[name]['commands per s']:.0f} commands per s, "
+                  f"p99 {results[name].get('p99 ms', 0):.2f} ms")
+        name = "throughput 8 clients, connecting each time"
+        results[name] = throughput(port, bench.dev_ids, 8, duration, persistent=False)
+        print(f"{name}: {results[name]['commands per s']:.0f} commands per s")
+
+        for parallel in (True, False):
+            name = f"take_data_point {'parallel' if parallel else 'sequential'}"
+            results[name] = acquisition(port, 10 if quick else 50, parallel=parallel)
+            print(f"{name}: {results[name]['mean ms']:.2f} ms per row")
+
+    rows = 1000
+    while rows <= max_rows:
+        name = f"csv {rows} rows"
+        results[name] = csv_round_trip(rows)
+        print(f"{name}: write {results[name]['write s']:.3f} s, reload {results[name]['reload s']:.3f} s")
+        rows *= 10
+
+    with open(filename, "w") as f:
+        json.dump({"version": git_version(),
+                   "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "python": sys.version.split()[0],
+                   "machine": platform.platform(),
+                   "device latency s": latency,
+                   "results": results}, f, indent=2)
+    print(f"Saved results to {filename}")
+
+
+def compare(before_file: str, after_file: str, threshold: float = 10.) -> bool:
+    """
+    Print how every result changed between two runs
+    :param threshold: percent change that counts as a regression (or an improvement)
+    :return: True if anything got worse by more than threshold percent
+    """
+    with open(before_file, "r") as f:
+        before = json.load(f)
+    with open(after_file, "r") as f:
+        after = json.load(f)
+    print(f"before: {before['version']} ({before['time']})    after: {after['version']} ({after['time']})")
+
+    regressed = False
+    for name, metrics in after["results"].items():
+        if name not in before["results"]:
+            continue
+        print(name)
+        for metric, value in metrics.items():
+            old = before["results"][name].get(metric)
+            if metric in ("rows", "loaded rows", "commands", "errors", "MB") or not old:
+                continue
+            change = (value - old) / old * 100
+            worse = -change if metric.endswith(higher_is_better) else change
+            mark = ""
+            if metric in noisy:
+                pass
+            elif worse > threshold:
+                mark = "  <-- slower"
+                regressed = True
+            elif worse < -threshold:
+                mark = "  faster"
+            print(f"    {metric:20s} {old:14.4f} -> {value:14.4f}  {change:+7.1f}%{mark}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the server/client stack")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and save the results")
+    run_parser.add_argument("filename")
+    run_parser.add_argument("--quick", action="store_true")
+    run_parser.add_argument("--max-rows", type=float, default=None,
+                            help="most rows to write and reload csv files with (default 1e7, or 1e5 with --quick)")
+    run_parser.add_argument("--port", type=int, default=get.port + 100)
+    run_parser.add_argument("--latency", type=float, default=0.001, help="seconds each fake device takes to answer")
+    compare_parser = subparsers.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=10., help="percent change to mark")
+    args = parser.parse_args()
+
+    if args.action == "run":
+        run(args.filename, args.quick, None if args.max_rows is None else int(args.max_rows), args.port, args.latency)
+    else:
+        sys.exit(1 if compare(args.before, args.after, args.threshold) else 0)
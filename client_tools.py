@@ -4,33 +4,288 @@ Tools for communicating with the server with sockets
 author: Teddy Tortorici
 """
 
+import itertools
+import json
 import socket
+import threading
+import traceback
+import numpy as np
 import get
+import protocol
 
 
 def send(msg: str, host: str = "localhost", port: int = get.port) -> str:
     if msg:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            # connect to server
-            s.connect((host, port))
-
-            # send message to server
-            s.send(msg.encode())
-
-            # get response from the server
-            msg_back = s.recv(1024)
-        # print(msg_back)
-        return msg_back.decode()
+        return exchange(msg.encode(), protocol.Kind.text, host, port)[1].decode()
     else:
         return 'did not send anything'
 
 
+def exchange(payload: bytes, kind: int = protocol.Kind.text, host: str = "localhost", port: int = get.port) -> tuple:
+    """
+    Connect to the server, send it one message, and wait for its reply
+    :param payload: content of the message
+    :param kind: one of the protocol.Kind attributes
+    :param host: IP address of the server
+    :param port: port of the server
+    :return: (kind, content) of the reply
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        # connect to server
+        s.connect((host, port))
+
+        # send message to server
+        protocol.send_message(s, 0, payload, kind)
+
+        # get response from the server
+        reply_kind, _, reply = protocol.recv_message(s)
+    if reply_kind is None:
+        raise ConnectionError(f"Server at {host}:{port} closed the connection without replying")
+    if reply_kind == protocol.Kind.error:
+        raise protocol.ProtocolError(reply.decode())
+    return reply_kind, reply
+
+
+def get_stats(host: str = "localhost", port: int = get.port, reset: bool = False) -> dict:
+    """
+    Get the server's request counts and latencies for every device and command (see GPIB/server_stats.py)
+    :param host: IP address of the server
+    :param port: port of the server
+    :param reset: start the stats over after getting them
+    """
+    stats = json.loads(get_connection(host, port).request("STATS"))
+    if reset:
+        get_connection(host, port).request("STATS::RESET")
+    return stats
+
+
+class Connection:
+    """A long-lived connection to the server that can be shared by any number of device clients and threads"""
+
+    def __init__(self, host: str = "localhost", port: int = get.port, timeout: float = 60.):
+        """
+        Create a connection. The socket is not opened until the first request is sent.
+        :param host: IP address of the server
+        :param port: port of the server
+        :param timeout: how long to wait for a reply (in seconds) before giving up on it
+        """
+        self.host_port = (host, port)
+        self.timeout = timeout
+
+        self.sock = None
+        self.listen_thread = None
+        self.lock = threading.Lock()        # makes sure only one thread sends at a time
+        self.request_ids = itertools.count(1)
+        self.pending = {}                   # request id -> [event that is set when the reply arrives, kind, reply]
+        self.subscriptions = {}             # request id of a subscription -> function to call with its updates
+
+    def request(self, msg: str) -> str:
+        """Send a message to the server and wait for the reply that belongs to it"""
+        return self.exchange(msg.encode())[1].decode()
+
+    def exchange(self, payload: bytes, kind: int = protocol.Kind.text) -> tuple:
+        """
+        Send a message to the server and wait for the reply that belongs to it
+        :param payload: content of the message
+        :param kind: one of the protocol.Kind attributes
+        :return: (kind, content) of the reply
+        """
+        return self.wait(*self.submit(payload, kind))
+
+    def submit(self, payload: bytes, kind: int = protocol.Kind.text, callback=None) -> tuple:
+        """
+        Send a message to the server without waiting for the reply
+        :param payload: content of the message
+        :param kind: one of the protocol.Kind attributes
+        :param callback: function to call with every update the server pushes for this request (for subscriptions)
+        :return: (request id, reply slot) to pass to wait()
+        """
+        reply_slot = [threading.Event(), None, None]
+        with self.lock:
+            if self.sock is None:
+                self.connect()
+            request_id = next(self.request_ids) & 0xFFFFFFFF
+            self.pending[request_id] = reply_slot
+            if callback is not None:
+                self.subscriptions[request_id] = callback
+            try:
+                protocol.send_message(self.sock, request_id, payload, kind)
+            except OSError:
+                self.pending.pop(request_id, None)
+                self.subscriptions.pop(request_id, None)
+                self.disconnect()
+                raise
+        return request_id, reply_slot
+
+    def wait(self, request_id: int, reply_slot: list) -> tuple:
+        """Wait for the (kind, content) of the reply to a message sent with submit()"""
+        if not reply_slot[0].wait(self.timeout):
+            # forget about the request so a late reply gets thrown away
+            self.pending.pop(request_id, None)
+            return protocol.Kind.text, b"timed out"
+        reply_kind, reply = reply_slot[1:]
+        if reply_kind is None:
+            raise ConnectionError(f"Lost connection to server at {self.host_port[0]}:{self.host_port[1]}")
+        if reply_kind == protocol.Kind.error:
+            raise protocol.ProtocolError(reply.decode())
+        return reply_kind, reply
+
+    def subscribe(self, message: str, period: float, callback) -> int:
+        """
+        Ask the server to poll a message and send every response it gets. Subscriptions end if the connection is lost
+        :param message: message of the format [Device ID]::[command]::[optional message]
+        :param period: how often the server should poll, in seconds
+        :param callback: function(message, time stamp, response). It's called from the thread that listens to the
+        server, so it should be quick
+        :return: subscription id to give to unsubscribe()
+        """
+        payload = json.dumps({"message": message, "period": period}).encode()
+        request_id, reply_slot = self.submit(payload, protocol.Kind.subscribe, callback)
+        try:
+            self.wait(request_id, reply_slot)
+        except Exception:
+            self.subscriptions.pop(request_id, None)
+            raise
+        return request_id
+
+    def unsubscribe(self, subscription: int):
+        """Stop getting updates from a subscription"""
+        self.subscriptions.pop(subscription, None)
+        if self.sock is not None:
+            self.exchange(json.dumps(subscription).encode(), protocol.Kind.unsubscribe)
+
+    def latest(self, message: str) -> tuple:
+        """Get (time stamp, response) of the most recent time the server polled a message"""
+        return tuple(json.loads(self.exchange(message.encode(), protocol.Kind.latest)[1]))
+
+    def connect(self):
+        """Open the socket and start the thread that listens for replies"""
+        self.sock = socket.create_connection(self.host_port)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.listen_thread = threading.Thread(target=self.listen, args=(self.sock,), daemon=True)
+        self.listen_thread.start()
+
+    def listen(self, sock: socket.socket):
+        """Receives replies and hands each one to the request that is waiting on it. This runs in its own thread"""
+        try:
+            while True:
+                kind, request_id, msg = protocol.recv_message(sock)
+                if kind is None:
+                    break
+                if kind == protocol.Kind.update:
+                    callback = self.subscriptions.get(request_id)
+                    if callback is not None:
+                        try:
+                            callback(*json.loads(msg))
+                        except Exception:
+                            traceback.print_exc()
+                    continue
+                reply_slot = self.pending.pop(request_id, None)
+                if reply_slot:
+                    reply_slot[1:] = kind, msg
+                    reply_slot[0].set()
+        except OSError:
+            pass
+        with self.lock:
+            if self.sock is sock:
+                self.disconnect()
+
+    def disconnect(self):
+        """Close the socket and wake up every request still waiting for a reply. Must be called with self.lock held"""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        for reply_slot in self.pending.values():
+            reply_slot[0].set()         # kind stays None, so request() knows the connection was lost
+        self.pending.clear()
+        self.subscriptions.clear()
+
+    def close(self):
+        """Close the connection. It will reopen if another request is sent"""
+        with self.lock:
+            self.disconnect()
+
+
+connections = {}                        # (host, port) -> Connection shared by everything in this process
+connections_lock = threading.Lock()
+
+
+def get_connection(host: str = "localhost", port: int = get.port) -> Connection:
+    """Returns the shared connection to a server, making it if it doesn't exist yet"""
+    with connections_lock:
+        if (host, port) not in connections:
+            connections[(host, port)] = Connection(host, port)
+        return connections[(host, port)]
+
+
+class Batch:
+    """Collects commands so they can all go to the server in one message and come back in one reply. The server runs
+    commands for different devices at the same time, and commands for the same device in the order they were added."""
+
+    def __init__(self, dev_id: str = None, host: str = "localhost", port: int = get.port, persistent: bool = True):
+        """
+        :param dev_id: device id to use when one isn't given to query(), write() or read()
+        :param host: IP address of the server
+        :param port: port of the server
+        :param persistent: send over the connection shared by the device clients in this process
+        """
+        self.dev_id = dev_id
+        self.host = host
+        self.port = port
+        self.persistent = persistent
+        self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, message: str) -> int:
+        """Add a message of the format [Device ID]::[command]::[optional message]. Returns where its response will be
+        in the list send() returns"""
+        self.messages.append(message)
+        return len(self.messages) - 1
+
+    def query(self, msg: str, dev_id: str = None) -> int:
+        return self.add(f"{dev_id or self.dev_id}::Q::{msg}")
+
+    def write(self, msg: str, dev_id: str = None) -> int:
+        return self.add(f"{dev_id or self.dev_id}::W::{msg}")
+
+    def read(self, dev_id: str = None) -> int:
+        return self.add(f"{dev_id or self.dev_id}::R")
+
+    def send(self) -> list:
+        """Send every message that has been added and empty the batch. Returns the responses in the order the
+        messages were added"""
+        messages, self.messages = self.messages, []
+        if not messages:
+            return []
+        payload = json.dumps(messages).encode()
+        if self.persistent:
+            _, reply = get_connection(self.host, self.port).exchange(payload, protocol.Kind.batch)
+        else:
+            _, reply = exchange(payload, protocol.Kind.batch, self.host, self.port)
+        if reply == b"timed out":
+            return ["timed out"] * len(messages)
+        return json.loads(reply)
+
+
 class DeviceClient:
     """This class is meant to be inherited by classes dedicated to specific devices"""
-    def __init__(self, dev_id, host='localhost', port=get.port):
+    def __init__(self, dev_id, host='localhost', port=get.port, persistent=True):
+        """
+        :param dev_id: the id the server knows the device by
+        :param host: IP address of the server
+        :param port: port of the server
+        :param persistent: send messages over a long-lived connection shared with every other device client in this
+        process, instead of connecting to the server for every message
+        """
         self.dev_id = dev_id
         self.host = host
         self.port = port
+        self.persistent = persistent
 
     def query(self, msg):
         return self.send(f"{self.dev_id}::Q::{msg}")
@@ -42,6 +297,42 @@ class DeviceClient:
     def read(self):
         return self.send(f"{self.dev_id}::R")
 
+    def query_binary(self, msg: str, dtype: str = 'f4', big_endian: bool = False):
+        """
+        Query for an IEEE 488.2 binary block (like a scope trace). The data comes from the server as raw bytes and is
+        turned into an array without being copied
+        :param msg: the query
+        :param dtype: numpy data type of each value in the block
+        :param big_endian: whether the device sends the most significant byte first
+        :return: the array of values, or a string explaining what went wrong (like "timed out")
+        """
+        reply = self.send_for_array(f"{self.dev_id}::B::{msg}")
+        if isinstance(reply, np.ndarray):
+            dtype = np.dtype(dtype).newbyteorder('>' if big_endian else '<')
+            if reply.nbytes % dtype.itemsize:
+                raise ValueError(f"{self.dev_id} sent a {reply.nbytes} byte block, which isn't a whole number of "
+                                 f"{dtype.itemsize} byte {dtype.name} values")
+            return reply.view(dtype)
+        return reply
+
+    def query_ascii(self, msg: str):
+        """
+        Query for a comma separated list of values (the server turns them into floats). The array comes from the
+        server as raw data and isn't copied when it arrives
+        :return: the array of values, or a string explaining what went wrong (like "timed out")
+        """
+        return self.send_for_array(f"{self.dev_id}::A::{msg}")
+
+    def send_for_array(self, msg: str):
+        """Send a message that gets answered with an array. Returns the array, or the text reply if there isn't one"""
+        if self.persistent:
+            kind, reply = get_connection(self.host, self.port).exchange(msg.encode())
+        else:
+            kind, reply = exchange(msg.encode(), protocol.Kind.text, self.host, self.port)
+        if kind == protocol.Kind.array:
+            return protocol.unpack_array(reply)
+        return reply.decode()
+
     def get_id(self):
         return self.query('*IDN?')
 
@@ -49,7 +340,39 @@ class DeviceClient:
         self.write('*RST')
         return "reset"
 
+    def subscribe(self, msg: str, callback, period: float = 1.) -> int:
+        """
+        Have the server query this device every 'period' seconds and call callback(time stamp, response) with every
+        response. Every client subscribed to the same query shares the same polling, so the device only gets asked once
+        per period however many subscribers there are
+        :return: subscription id to give to unsubscribe()
+        """
+        return get_connection(self.host, self.port).subscribe(f"{self.dev_id}::Q::{msg}", period,
+                                                              lambda message, time_stamp, response:
+                                                              callback(time_stamp, response))
+
+    def unsubscribe(self, subscription: int):
+        get_connection(self.host, self.port).unsubscribe(subscription)
+
+    def latest(self, msg: str) -> tuple:
+        """Returns (time stamp, response) of the most recent time the server polled this query. If the server isn't
+        polling it, the device gets queried now"""
+        return get_connection(self.host, self.port).latest(f"{self.dev_id}::Q::{msg}")
+
+    def batch(self) -> Batch:
+        """Start a batch of commands that go to the server together. Commands go to this device unless you give a
+        different dev_id, for example:
+            batch = lakeshore.batch()
+            temperature = batch.query("KRDG? A")
+            voltage = batch.query("V?", dev_id="VS")
+            responses = batch.send()
+            print(responses[temperature], responses[voltage])
+        """
+        return Batch(self.dev_id, self.host, self.port, self.persistent)
+
     def send(self, msg):
+        if self.persistent:
+            return get_connection(self.host, self.port).request(msg)
         return send(msg, self.host, self.port)
 
 
@@ -0,0 +1,159 @@
+"""
+Reads a csv data file as it grows. Only lines added since the last read get parsed, so keeping a plot up to date
+costs the same whether the file has a hundred rows or a million.
+
+author: Teddy Tortorici
+"""
+
+import os
+import numpy as np
+
+
+class CSVTail:
+
+    chunk_size = 1 << 24    # most bytes read and parsed at once, so a big file doesn't need many times its size in RAM
+
+    def __init__(self, filename: str, comment: str = "#", delimiter: str = ",", capacity: int = 1024):
+        """
+        Keeps the numerical rows of a csv file in memory and adds new ones as they get written to the file
+        :param filename: full path to the csv file
+        :param comment: lines starting with this are skipped
+        :param delimiter: what separates the columns
+        :param capacity: number of rows to make room for at first. Room is doubled every time it runs out
+        """
+        self.filename = filename
+        self.comment = comment.encode()
+        self.delimiter = delimiter
+        self.capacity = max(1, int(capacity))
+
+        self.offset = 0         # byte in the file the next read starts from
+        self.rows = 0           # number of rows in the buffer
+        self.buffer = None      # (capacity, columns) array; made once the number of columns is known
+
+    @property
+    def data(self) -> np.ndarray:
+        """The rows read so far. This is a view of the buffer, not a copy, so it's cheap to get every update"""
+        if self.buffer is None:
+            return np.empty((0, 0))
+        return self.buffer[:self.rows]
+
+    def column(self, index: int) -> np.ndarray:
+        """A view of one column of the rows read so far"""
+        return self.data[:, index]
+
+    def reset(self):
+        """Forget everything read so far, so the next update() reads the file from the start"""
+        self.offset = 0
+        self.rows = 0
+        self.buffer = None
+
+    def release(self):
+        """Let go of the rows read so far, but keep reading from where it left off. Use read_new() afterwards to get
+        new rows without holding on to them"""
+        columns = self.buffer.shape[1] if self.buffer is not None else None
+        self.rows = 0
+        self.buffer = None
+        if columns:
+            self.buffer = np.empty((self.capacity, columns))
+
+    def update(self) -> int:
+        """
+        Read whatever has been added to the file since the last update and add it to the rows read so far. A line that
+        is only partly written is left for next time.
+        :return: the number of new rows
+        """
+        count = 0
+        for new_rows in self.read_chunks():
+            self.append(new_rows)       # chunk by chunk, so only one chunk's worth of text is parsed at a time
+            count += len(new_rows)
+        return count
+
+    def read_new(self) -> np.ndarray:
+        """Read whatever has been added to the file since the last read and return it without keeping it. A line that
+        is only partly written is left for next time"""
+        chunks = []
+        for new_rows in self.read_chunks():
+            if not chunks or new_rows.shape[1] == chunks[0].shape[1]:
+                chunks.append(new_rows)
+        if not chunks:
+            return np.empty((0, 0))
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def read_chunks(self):
+        """
+        Read whatever has been added to the file since the last read, chunk_size bytes at a time. A line cut off at
+        the end of a chunk is carried over to the next one, and a line that is only partly written is left for next
+        time
+        :return: generator of 2D arrays of the new rows in each chunk
+        """
+        try:
+            size = os.path.getsize(self.filename)
+        except OSError:
+            return
+        if size < self.offset:
+            self.reset()        # the file was truncated or replaced, so start over
+        if size == self.offset:
+            return
+
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset)
+            remaining = size - self.offset
+            carried = b""
+            while remaining > 0:
+                read = f.read(min(self.chunk_size, remaining))
+                if not read:
+                    return      # the file got shorter while it was being read
+                remaining -= len(read)
+                chunk = carried + read
+                end = chunk.rfind(b"\n") + 1
+                if not end:
+                    carried = chunk     # no complete line yet (or a line longer than a chunk)
+                    continue
+                self.offset += end
+                carried = chunk[end:]
+                lines = [line for line in chunk[:end].splitlines()
+                         if line.strip() and not line.startswith(self.comment)]
+                rows = self.parse(lines)
+                if len(rows):
+                    yield rows
+
+    def parse(self, lines: list) -> np.ndarray:
+        """Turn lines of text into a 2D array of floats. Lines that aren't numbers (like the column labels) are
+        skipped"""
+        delimiter = self.delimiter.encode()
+        try:
+            # fast path: every line is numbers with the same number of columns, so split everything at once into one
+            # flat list (far fewer python objects than a list per line) and shape it afterwards
+            if len({line.count(delimiter) for line in lines}) > 1:
+                raise ValueError("rows have different lengths")
+            rows = np.array(delimiter.join(lines).split(delimiter), dtype=float).reshape(len(lines), -1)
+        except ValueError:
+            # something in there isn't a number (or a row is a different length); go line by line
+            rows = []
+            for line in lines:
+                try:
+                    rows.append([float(value) for value in line.split(delimiter)])
+                except ValueError:
+                    pass
+            columns = self.buffer.shape[1] if self.buffer is not None else (len(rows[0]) if rows else 0)
+            rows = np.array([row for row in rows if len(row) == columns], dtype=float)
+        if rows.ndim != 2 or not rows.size:
+            return np.empty((0, 0))
+        if self.buffer is not None and rows.shape[1] != self.buffer.shape[1]:
+            return np.empty((0, 0))
+        return rows
+
+    def append(self, new_rows: np.ndarray):
+        """Copy rows into the end of the buffer, doubling its size as many times as it takes to fit them"""
+        if self.buffer is None:
+            self.buffer = np.empty((self.capacity, new_rows.shape[1]))
+        needed = self.rows + len(new_rows)
+        if needed > len(self.buffer):
+            capacity = len(self.buffer)
+            while capacity < needed:
+                capacity *= 2
+            buffer = np.empty((capacity, self.buffer.shape[1]))
+            buffer[:self.rows] = self.buffer[:self.rows]
+            self.buffer = buffer
+        self.buffer[self.rows:needed] = new_rows
+        self.rows = needed
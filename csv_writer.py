@@ -0,0 +1,153 @@
+"""
+Writes rows to csv data files without opening and closing the file for every row.
+
+author: Teddy Tortorici
+"""
+
+import atexit
+import functools
+import os
+import threading
+import weakref
+import numpy as np
+
+open_writers = weakref.WeakSet()    # so anything still buffered gets written if the program exits normally
+
+
+def format_value(value) -> str:
+    """Format one value the same way str(list) would, but without building the list's string first"""
+    if isinstance(value, np.generic):      # numpy numbers print as np.float64(...) otherwise
+        value = value.item()
+    return repr(value)
+
+
+@functools.lru_cache(maxsize=64)
+def row_format(columns: int) -> str:
+    """The format string for a row with this many columns, so a row is formatted with one % instead of a join"""
+    return ", ".join(["%r"] * columns)
+
+
+def format_row(row) -> str:
+    """Turns a list (or a 1D array) into a comma delimited row (without the new line), the same way str(list) would"""
+    if isinstance(row, np.ndarray):
+        row = row.tolist()          # python numbers, which print the same as they would in a list
+    values = tuple(row)
+    line = row_format(len(values)) % values
+    if "np." in line:
+        # a numpy number in a list printed as np.float64(...), so do it value by value (rare, so the usual path stays
+        # one format)
+        line = ", ".join([format_value(value) for value in values])
+    return line
+
+
+class CSVWriter:
+
+    mode = 'a'      # how the file is opened
+
+    def __init__(self, filename: str, flush_rows: int = 100, flush_interval: float = 1., fsync: bool = False):
+        """
+        Keeps a csv file open and writes lines to it in batches. Lines are held in memory until flush_rows of them
+        are waiting, flush_interval seconds have passed, or flush() or close() gets called; whichever comes first.
+        If the program crashes, at most flush_interval seconds of data is lost.
+        :param filename: full path to the file. It is appended to
+        :param flush_rows: write to the file once this many lines are waiting
+        :param flush_interval: write to the file at least this often (in seconds). None to only flush on flush_rows
+        :param fsync: also make the operating system write to disk every flush (slower, but survives a power cut)
+        """
+        self.filename = filename
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.file = open(filename, self.mode)
+        self.written = self.file.tell()     # bytes in the file, as of the last flush
+        self.lines = []
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+
+        # write waiting lines in the background so they don't sit in memory when data comes in slowly.
+        # The thread only keeps a weak reference, so a writer nobody closed still gets flushed and closed by __del__
+        self.flush_thread = None
+        if flush_interval:
+            self.flush_thread = threading.Thread(target=CSVWriter.flush_periodically,
+                                                 args=(weakref.ref(self), self.closed, flush_interval), daemon=True)
+            self.flush_thread.start()
+        open_writers.add(self)
+
+    def __del__(self):
+        if hasattr(self, "file"):       # the file may not have opened
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_line(self, line: str):
+        """Add a line (without the new line character) to be written"""
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) >= self.flush_rows:
+                self.flush_locked()
+
+    def write_row(self, row_to_write: list):
+        """Turns a list into a comma delimited row to write to the csv file"""
+        self.write_line(format_row(row_to_write))
+
+    def write_comment(self, comment: str):
+        """Writes a comment line in the csv file"""
+        self.write_line(f"# {comment}")
+
+    def flush(self):
+        """Write every waiting line to the file"""
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        """Write every waiting line to the file. Must be called with self.lock held"""
+        if self.lines and not self.file.closed:
+            self.lines.append("")       # so the join ends in a new line
+            self.file.write("\n".join(self.lines))
+            self.lines = []
+            self.file.flush()
+            self.written = self.file.tell()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+    @staticmethod
+    def flush_periodically(writer_ref: weakref.ref, closed: threading.Event, flush_interval: float):
+        """
+        Flushes every flush_interval seconds until the writer is closed or garbage collected. This runs in its own
+        thread
+        :param writer_ref: weak reference to the writer, so this thread doesn't keep it alive
+        :param closed: the writer's closed event
+        :param flush_interval: seconds between flushes
+        """
+        while not closed.wait(flush_interval):
+            writer = writer_ref()
+            if writer is None:
+                return
+            writer.flush()
+            del writer          # don't hold on to it while waiting
+
+    def truncate(self):
+        """Throw away everything in the file and anything waiting to be written"""
+        with self.lock:
+            self.lines = []
+            self.file.truncate(0)
+            self.written = 0
+
+    def close(self):
+        """Write every waiting line and close the file. Closing more than once does nothing"""
+        self.closed.set()
+        with self.lock:
+            self.flush_locked()
+            self.file.close()
+        open_writers.discard(self)
+
+
+@atexit.register
+def close_all():
+    for writer in list(open_writers):
+        writer.close()
@@ -33,7 +33,7 @@ class Manager:
         """CREATE DATA FILE AND SERVER AND PUT THEM IN THREADS"""
         comment = "This data was generated from data_taking_example.py"
         self.data = DataFile(path=Manager.path, name=filename, comment=comment)
-        self.server = GpibServer(do_print=False)
+        self.server = GpibServer(silent=True)
         self.data_taking_thread = Thread(target=self.data.take_data_continuous, args=(False,))
         self.server_thread = Thread(target=self.server.run)
 
@@ -45,7 +45,7 @@ class Manager:
 
     def stop(self):
         """Lets the program conclude"""
-        self.data.running = False
+        self.data.stop()
         self.data_taking_thread.join()
         send_to_server(GpibServer.shutdown_command.decode())
         self.server_thread.join()
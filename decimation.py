@@ -0,0 +1,227 @@
+"""
+Cuts large data sets down to about as many points as there are pixels to draw them on, so plots stay fast no matter
+how much data there is.
+
+For data where x only goes up (like time stamps), a min/max pyramid is kept: level 1 holds the index of the smallest
+and largest y in every block of 'factor' points, level 2 in every block of factor**2 points, and so on. Drawing the
+min and max of each block keeps every spike visible, and picking the level for the visible x range means only about
+one block per pixel is drawn whether the whole run or a few seconds of it is on screen. The pyramid is updated as rows
+come in, and only the new rows are looked at.
+
+author: Teddy Tortorici
+"""
+
+import numpy as np
+
+
+class Level:
+
+    def __init__(self, capacity: int = 256):
+        """Index of the min and max y in each block of one level of a MinMaxPyramid. Room doubles when it runs out"""
+        self.imin = np.empty(capacity, dtype=np.int64)
+        self.imax = np.empty(capacity, dtype=np.int64)
+        self.blocks = 0
+
+    def append(self, imin: np.ndarray, imax: np.ndarray):
+        needed = self.blocks + len(imin)
+        if needed > len(self.imin):
+            capacity = len(self.imin)
+            while capacity < needed:
+                capacity *= 2
+            for name in ("imin", "imax"):
+                grown = np.empty(capacity, dtype=np.int64)
+                grown[:self.blocks] = getattr(self, name)[:self.blocks]
+                setattr(self, name, grown)
+        self.imin[self.blocks:needed] = imin
+        self.imax[self.blocks:needed] = imax
+        self.blocks = needed
+
+
+class MinMaxPyramid:
+
+    def __init__(self, factor: int = 4):
+        """
+        Min/max decimation levels over one column of data
+        :param factor: how many blocks of one level make up a block of the next level
+        """
+        self.factor = max(2, int(factor))
+        self.levels = []        # self.levels[k - 1] is level k; its blocks are factor**k points long
+        self.points = 0         # number of points the levels have been updated with
+
+    def reset(self):
+        self.levels = []
+        self.points = 0
+
+    def update(self, y: np.ndarray):
+        """
+        Bring the levels up to date with y. y must be the same data as last time with any new points on the end
+        (like CSVTail.column()); only the new points are looked at
+        """
+        if len(y) < self.points:
+            self.reset()        # the data started over
+        self.points = len(y)
+
+        # level 1 is made from the points themselves
+        self.add_blocks(0, y, lambda start, stop: (np.arange(start, stop), np.arange(start, stop)))
+        # each level after that is made from the blocks of the level below it
+        k = 1
+        while k <= len(self.levels):
+            below = self.levels[k - 1]
+            self.add_blocks(k, y, lambda start, stop: (below.imin[start:stop], below.imax[start:stop]))
+            k += 1
+
+    def add_blocks(self, k: int, y: np.ndarray, candidates):
+        """
+        Add the blocks to level k + 1 that have been completed since the last update
+        :param k: level the blocks are made from (0 for the points themselves)
+        :param y: the data
+        :param candidates: function(start, stop) that returns the indices of the mins and maxes in level k from
+        block start to stop
+        """
+        available = self.points if k == 0 else self.levels[k - 1].blocks
+        if available < self.factor:
+            return
+        if len(self.levels) <= k:
+            self.levels.append(Level())
+        level = self.levels[k]
+        new_blocks = available // self.factor - level.blocks
+        if new_blocks <= 0:
+            return
+        start = level.blocks * self.factor
+        stop = start + new_blocks * self.factor
+        imin, imax = candidates(start, stop)
+        imin = imin.reshape(new_blocks, self.factor)
+        imax = imax.reshape(new_blocks, self.factor)
+        rows = np.arange(new_blocks)
+        level.append(imin[rows, np.argmin(y[imin], axis=1)], imax[rows, np.argmax(y[imax], axis=1)])
+
+    def indices(self, start: int, stop: int, max_points: int) -> np.ndarray:
+        """
+        Indices of the points to draw to show points start to stop with no more than about max_points points
+        :param start: first index that's visible
+        :param stop: one past the last index that's visible
+        :param max_points: about how many points to return
+        """
+        start = max(0, start)
+        stop = min(self.points, stop)
+        if stop <= start:
+            return np.empty(0, dtype=np.int64)
+        # each block gives 2 points, so pick the finest level with at most max_points / 2 blocks in view
+        k = 0
+        while k < len(self.levels) and (stop - start) / self.factor ** k > max_points / 2:
+            k += 1
+        return self.indices_at(start, stop, k)
+
+    def indices_at(self, start: int, stop: int, k: int) -> np.ndarray:
+        """Indices of the min and max of every level k block from start to stop. Points past the last complete
+        block are filled in from the levels below"""
+        if k == 0:
+            return np.arange(start, stop)
+        level = self.levels[k - 1]
+        size = self.factor ** k
+        first = start // size
+        last = min(-(-stop // size), level.blocks)
+        if last <= first:
+            return self.indices_at(start, stop, k - 1)
+        # draw the min and max of a block in the order they happened, so the line goes through them the right way
+        pairs = np.sort(np.stack([level.imin[first:last], level.imax[first:last]], axis=1), axis=1).ravel()
+        if last * size < stop:
+            return np.concatenate([pairs, self.indices_at(last * size, stop, k - 1)])
+        return pairs
+
+
+def stride(x: np.ndarray, y: np.ndarray, max_points: int) -> tuple:
+    """Every n-th point so no more than max_points are left. For data where x doesn't only go up (like y vs
+    temperature), where a pyramid can't be used. Returns views, not copies"""
+    step = max(1, -(-len(x) // max(1, max_points)))
+    return x[::step], y[::step]
+
+
+class DecimatedCurve:
+
+    def __init__(self, curve, view_box, monotonic_x: bool = True, points_per_pixel: float = 1.,
+                 symbol: str = None, symbol_limit: int = 1000):
+        """
+        Draws a decimated version of its data on a pyqtgraph curve and redraws when the x range of the view changes,
+        so zooming in shows more detail
+        :param curve: PlotDataItem or PlotCurveItem to draw on
+        :param view_box: ViewBox the curve is in
+        :param monotonic_x: True if x only goes up (like time), so the min/max pyramid can be used. Otherwise the data
+        is strided
+        :param points_per_pixel: about how many blocks to draw per pixel of width
+        :param symbol: symbol to draw on each point when there are few enough of them (only for a PlotDataItem)
+        :param symbol_limit: draw symbols when there are fewer than this many points drawn
+        """
+        self.curve = curve
+        self.view_box = view_box
+        self.monotonic_x = monotonic_x
+        self.points_per_pixel = points_per_pixel
+        self.symbol = symbol
+        self.symbol_limit = symbol_limit
+
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.first_x = None     # x[0] of the last data, to notice data that was replaced rather than added to
+        self.pyramid = MinMaxPyramid()
+        self.drawn = None       # what was drawn last, so it isn't redrawn for nothing
+        self.drawing = False
+        self.view_box.sigXRangeChanged.connect(self.redraw)
+
+    def set_data(self, x: np.ndarray, y: np.ndarray, replaced: bool = False):
+        """
+        Give the curve all of its data (views are fine). Only what's needed to draw is sent to the curve
+        :param x: x data
+        :param y: y data
+        :param replaced: True if this isn't the last data with rows added on the end (like a window that moved
+        forward), so the pyramid has to be made again. Data that starts at a different x is always taken as replaced
+        """
+        first_x = x[0] if len(x) else None
+        if first_x != self.first_x:
+            replaced = True     # like a different data file, even if it has as many rows or more
+        self.first_x = first_x
+        self.x = x
+        self.y = y
+        self.drawn = None
+        if self.monotonic_x:
+            if replaced:
+                self.pyramid.reset()
+            self.pyramid.update(y)
+        self.redraw()
+
+    def reset(self):
+        """Forget the data, so the next set_data() starts over"""
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.first_x = None
+        self.drawn = None
+        self.pyramid.reset()
+
+    def max_points(self) -> int:
+        return max(100, int(self.view_box.width() * self.points_per_pixel))
+
+    def redraw(self, *args):
+        """Send the curve the decimated data for what's in view"""
+        if self.drawing or not len(self.x):
+            return
+        self.drawing = True     # setData can change the view range, which would call this again
+        try:
+            if self.monotonic_x:
+                x_min, x_max = self.view_box.viewRange()[0]
+                start = max(0, np.searchsorted(self.x, x_min) - 1)
+                stop = min(len(self.x), np.searchsorted(self.x, x_max, side="right") + 1)
+                if start >= stop or stop - start < 2:
+                    start, stop = 0, len(self.x)     # nothing in view; draw everything so auto range finds it
+                indices = self.pyramid.indices(start, stop, self.max_points())
+                key = (len(self.x), start, stop, len(indices))
+                if key == self.drawn:
+                    return
+                self.drawn = key
+                x, y = self.x[indices], self.y[indices]
+            else:
+                x, y = stride(self.x, self.y, self.max_points())
+            if self.symbol is not None:
+                self.curve.setData(x=x, y=y, symbol=self.symbol if len(x) < self.symbol_limit else None)
+            else:
+                self.curve.setData(x=x, y=y)
+        finally:
+            self.drawing = False
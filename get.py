@@ -31,4 +31,15 @@ gpib_address = {"LS": 13,
                 "SCOPE": 10,
                 "VS": 4}
 
+# The devices the GPIB server can talk to: device id -> settings
+# "driver" is the class that talks to the device, as "module.Class". It's made with the address the first time a client
+# uses the device. Any other settings are passed to the class as keyword arguments.
+# To play back a session recorded with GpibServer(capture_file=...) instead of using the real device, use for example
+# "LS": {"name": "Lakeshore (replay)", "driver": "capture.Replay", "address": 13, "filename": "session.jsonl",
+#        "captured_id": "LS", "speed": 1.}
+devices = {"LS": {"name": "Lakeshore Temperature Controller", "driver": "gpib.Device", "address": gpib_address["LS"]},
+           "VS": {"name": "Fake Voltage Supply", "driver": "fake_gpib_devices.VoltageSupply",
+                  "address": gpib_address["VS"]},
+           "PC": {"name": "Fake Photon Counter", "driver": "fake_gpib_devices.PhotonCounter", "address": 0}}
+
 port = 62538
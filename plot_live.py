@@ -7,7 +7,6 @@ author: Teddy Tortorici
 import get
 import os
 import sys
-import time
 from PySide6.QtWidgets import (QApplication, QWidget, QMainWindow, QToolBar, QMessageBox, QStyle, QFileDialog, QDialog,
                                QVBoxLayout, QDialogButtonBox, QLabel)
 from PySide6.QtCore import Slot, Signal, Qt
@@ -15,6 +14,9 @@ from PySide6.QtGui import QIcon, QAction
 import threading
 import numpy as np
 import pyqtgraph as pg
+from scheduler import PeriodicScheduler
+from csv_tail import CSVTail
+from decimation import DecimatedCurve
 
 
 class PlotUpdater(QWidget):
@@ -40,7 +42,9 @@ class PlotApp(QMainWindow):
 
         self.base_path = get.google_drive()
         self.filename = None
+        self.tail = None        # reads just the new rows of the file each update
         self.update_thread = None
+        self.scheduler = None       # updates the plots once a second while a file is open
         self.force_quit = True
         self.live_plotting = True
         self.active_file = False
@@ -59,6 +63,7 @@ class PlotApp(QMainWindow):
         self.setCentralWidget(self.plot)
 
         self.curves = [None]
+        self.decimated = [None]     # draws a decimated version of the data on each curve
         self.pens = [None]
 
         """MENU BAR and TOOLBAR"""
@@ -116,11 +121,10 @@ class PlotApp(QMainWindow):
             toolbar.addSeparator()
 
     def run(self):
-        while self.active_file:
-            while self.live_plotting:
+        self.scheduler = PeriodicScheduler(1.)
+        while self.active_file and self.scheduler.wait():
+            if self.live_plotting:
                 self.plot_updater.update_signal.emit()
-                time.sleep(1)
-            time.sleep(1)
 
     @Slot()
     def open_file(self):
@@ -135,6 +139,7 @@ class PlotApp(QMainWindow):
                 self.active_file = True
                 self.set_live_plotting(True)
                 self.filename = filename
+                self.tail = CSVTail(filename)
                 # Make it so next time you open in the same place you left off
                 # This removes the file from the path
                 # Applying join(list) to a string makes a string where every element of the list is put
@@ -150,16 +155,21 @@ class PlotApp(QMainWindow):
                     self.plot.addLegend()
 
                 # handle the axis as a time axis if time is in the label name.
-                if 'time' in col_labels[0].lower():
+                time_axis = 'time' in col_labels[0].lower()
+                if time_axis:
                     self.plot.setAxisItems({'bottom': pg.DateAxisItem('bottom')})
 
                 # Make curves and pens have as many elements are there are Y columns
                 y_num = len(col_labels) - 1
                 self.curves *= y_num
+                self.decimated *= y_num
                 self.pens *= y_num
                 for ii, label in enumerate(col_labels[1:]):
                     self.pens[ii] = pg.mkPen(PlotApp.pen_colors[ii], width=2, style=Qt.SolidLine)
                     self.curves[ii] = self.plot.plot(pen=self.pens[ii], name=label, symbol='o', symbolSize=5)
+                    # symbols only get drawn while there are few enough points for them to be quick
+                    self.decimated[ii] = DecimatedCurve(self.curves[ii], self.plot.getViewBox(),
+                                                        monotonic_x=time_axis, symbol='o')
 
                 self.update_thread = threading.Thread(target=self.run)
                 self.update_thread.start()
@@ -181,29 +191,23 @@ class PlotApp(QMainWindow):
             self.live_plot_action.setToolTip('Click to turn on Live Plotting')
             self.live_plot_action.setText('Live &Plotting (turn on)')
 
-    def load_data(self, attempts: int = 10) -> np.ndarray:
-        """Loads data from filename. Will make attempts to load data while skipping an
-        increasing number of rows each time. Will give up after 10 attempts"""
-        data = None
-        for attempt in range(attempts):
-            try:
-                data = np.loadtxt(self.filename, comments='#', delimiter=',', skiprows=attempt)
-                break
-            except ValueError:
-                pass
-        return data
+    def load_data(self) -> np.ndarray:
+        """Reads any rows added to filename since the last time and returns all the data read so far. This is a view
+        of the rows in memory, so it doesn't get slower as the file grows"""
+        self.tail.update()
+        return self.tail.data
 
     @Slot()
     def update_plots(self):
         """Updates the plots if live plotting is off."""
-        if self.active_file:
+        if self.active_file and self.tail:
             data = self.load_data()
-            if len(data.shape) > 1:     # then we have loaded a data set
+            if len(data):               # then we have loaded a data set
                 x = data[:, 0]          # grabs first column
                 ys = data[:, 1:]        # grabs the rest of the columns
 
-                for ii, curve in enumerate(self.curves):
-                    curve.setData(x=x, y=ys[:, ii])
+                for ii, decimated in enumerate(self.decimated):
+                    decimated.set_data(x, ys[:, ii])
 
     @Slot()
     def close_file(self):
@@ -214,11 +218,14 @@ class PlotApp(QMainWindow):
         if close_question == QMessageBox.Yes:
             self.active_file = False
             self.set_live_plotting(False)
+            self.scheduler.stop()
             self.update_thread.join()
 
             self.filename = None
+            self.tail = None
             self.pens = [None]
             self.curves = [None]
+            self.decimated = [None]
             self.update_thread = None
 
             self.plot = pg.PlotWidget()
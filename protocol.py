@@ -0,0 +1,182 @@
+"""
+The message format used between the GPIB server and its clients.
+
+Every message is a fixed size header followed by a payload:
+    magic (2 bytes) | version (1 byte) | kind (1 byte) | request id (4 bytes) | payload length (8 bytes)
+all in network byte order. The server echos the request id back with its reply so replies can be matched to the
+request that asked for them. Because the length is sent up front, payloads of any size (like waveforms) arrive whole,
+and messages sent back to back never get merged together.
+
+Messages that don't start with the magic bytes are treated as the old plain text [Device ID]::[command]::[message]
+format by the server. Plain text isn't framed, so each read of up to GpibServer.text_message_size bytes is taken as one
+message; anything longer has to be sent framed.
+
+A header claiming a payload bigger than max_payload is treated as corrupt, so a bad header can't make the receiver
+try to read (or make room for) an enormous payload.
+
+author: Teddy Tortorici
+"""
+
+import asyncio
+import json
+import socket
+import struct
+import numpy as np
+
+magic = b"QF"
+version = 1
+header = struct.Struct("!2sBBIQ")
+
+small_message = 1 << 16     # payloads smaller than this are sent in the same packet as the header
+max_payload = 1 << 30       # biggest payload accepted (1 GiB); a header claiming more is treated as corrupt
+array_header = struct.Struct("!I")     # length of the JSON description at the start of an array payload
+array_alignment = 16        # array data starts this many bytes into the payload (or a multiple of it)
+
+
+class Kind:
+    """The kinds of payload a message can carry"""
+    text = 0        # utf-8 text: a command going to the server or the response coming back
+    error = 1       # utf-8 text describing why the server couldn't handle a message
+    batch = 2       # a JSON list of text commands going to the server, or the JSON list of their responses
+    subscribe = 3   # JSON {"message": command to poll, "period": seconds} asking for updates every time it's polled
+    unsubscribe = 4     # JSON request id of the subscribe message to cancel
+    update = 5      # JSON [command, time stamp, response] pushed to a subscriber, tagged with its subscription's id
+    latest = 6      # a text command, answered with the JSON [time stamp, response] of its most recent poll
+    array = 7       # a numpy array: see pack_array()
+
+
+class ProtocolError(ConnectionError):
+    """Raised when something that doesn't follow the protocol comes over a socket"""
+    pass
+
+
+def pack(request_id: int, payload: bytes, kind: int = Kind.text) -> bytes:
+    """Put a header in front of a payload"""
+    return header.pack(magic, version, kind, request_id, len(payload)) + payload
+
+
+def pack_array(array: np.ndarray) -> list:
+    """
+    Make the payload for an array message. The payload is
+        description length (4 bytes) | JSON {"dtype": ..., "shape": ...} | padding | the array's raw data
+    where the padding lines the data up on a multiple of array_alignment bytes.
+    :return: list of the parts of the payload. The last one is the array's own memory, not a copy of it
+    """
+    array = np.ascontiguousarray(array)
+    description = json.dumps({"dtype": array.dtype.str, "shape": array.shape}).encode()
+    prefix_size = array_header.size + len(description)
+    padding = -prefix_size % array_alignment
+    prefix = array_header.pack(len(description) + padding) + description + b" " * padding
+    return [prefix, memoryview(array).cast('B')]
+
+
+def unpack_array(payload: bytearray) -> np.ndarray:
+    """Turn the payload of an array message back into an array. The array uses the payload's memory, so nothing is
+    copied"""
+    description_size, = array_header.unpack_from(payload)
+    description = json.loads(bytes(payload[array_header.size:array_header.size + description_size]))
+    return np.frombuffer(payload, dtype=np.dtype(description["dtype"]),
+                         offset=array_header.size + description_size).reshape(description["shape"])
+
+
+def payload_size(payload) -> int:
+    """Number of bytes in a payload that is either bytes-like or a list of bytes-like parts"""
+    if isinstance(payload, list):
+        return sum(memoryview(part).nbytes for part in payload)
+    return memoryview(payload).nbytes
+
+
+def send_message(sock: socket.socket, request_id: int, payload, kind: int = Kind.text):
+    """
+    Send one message
+    :param sock: socket to send over
+    :param request_id: id that ties a reply to its request
+    :param payload: the content of the message; bytes-like, or a list of bytes-like parts (like from pack_array())
+    :param kind: one of the Kind attributes
+    """
+    parts = payload if isinstance(payload, list) else [payload]
+    head = header.pack(magic, version, kind, request_id, payload_size(payload))
+    if payload_size(payload) < small_message:
+        sock.sendall(b"".join([head, *parts]))
+    else:
+        # don't make a copy of a big payload just to stick the header on the front of it
+        sock.sendall(head)
+        for part in parts:
+            sock.sendall(part)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    """Receive exactly 'size' bytes from a socket. Returns an empty bytearray if the other side closed the connection"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        chunk_size = sock.recv_into(view[received:])
+        if not chunk_size:
+            return bytearray()
+        received += chunk_size
+    return buffer
+
+
+def check_header(head: bytes, limit: int) -> tuple:
+    """
+    Unpack a header and make sure it can be trusted
+    :param head: the header's bytes
+    :param limit: biggest payload length to accept
+    :return: (kind, request id, payload length)
+    :raises ProtocolError: if the magic bytes or version are wrong or the payload is too big
+    """
+    message_magic, message_version, kind, request_id, length = header.unpack(head)
+    if message_magic != magic:
+        raise ProtocolError(f"Received a message without a valid header: {bytes(head)!r}")
+    if message_version != version:
+        raise ProtocolError(f"Received protocol version {message_version}, but only version {version} is supported")
+    if length > limit:
+        raise ProtocolError(f"Received a header for a {length} byte payload, which is more than the {limit} bytes "
+                            f"allowed")
+    return kind, request_id, length
+
+
+def recv_message(sock: socket.socket, limit: int = None) -> tuple:
+    """
+    Receive one message
+    :param sock: socket to receive from
+    :param limit: biggest payload to accept. Defaults to max_payload
+    :return: (kind, request id, payload), or (None, None, b"") if the connection closed
+    :raises ProtocolError: if the header is invalid or claims a payload bigger than limit
+    """
+    head = recv_exactly(sock, header.size)
+    if not head:
+        return None, None, b""
+    kind, request_id, length = check_header(head, max_payload if limit is None else limit)
+    payload = recv_exactly(sock, length)
+    if length and not payload:
+        return None, None, b""
+    return kind, request_id, payload
+
+
+async def read_message(reader: asyncio.StreamReader, start: bytes = b"", limit: int = None) -> tuple:
+    """
+    Receive one message from an asyncio stream
+    :param reader: stream to read from
+    :param start: the first bytes of the header, if they've already been read off the stream
+    :param limit: biggest payload to accept. Defaults to max_payload
+    :return: (kind, request id, payload), or (None, None, b"") if the connection closed
+    :raises ProtocolError: if the header is invalid or claims a payload bigger than limit
+    """
+    try:
+        head = start + await reader.readexactly(header.size - len(start))
+        kind, request_id, length = check_header(head, max_payload if limit is None else limit)
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None, None, b""
+    return kind, request_id, payload
+
+
+def write_message(writer: asyncio.StreamWriter, request_id: int, payload, kind: int = Kind.text):
+    """Queue one message on an asyncio stream. Await writer.drain() afterwards to wait for it to go out.
+    The payload can be bytes-like or a list of bytes-like parts"""
+    parts = payload if isinstance(payload, list) else [payload]
+    writer.write(header.pack(magic, version, kind, request_id, payload_size(payload)))
+    for part in parts:
+        writer.write(part)
@@ -0,0 +1,51 @@
+"""
+A fixed size buffer of the most recent rows of data, for plotting a window of a long run without its memory or drawing
+time growing.
+
+author: Teddy Tortorici
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+
+    def __init__(self, capacity: int, columns: int):
+        """
+        Holds the last 'capacity' rows. All the memory is allocated up front.
+        Every row is written twice, capacity rows apart, so the rows in order are always one contiguous slice of the
+        memory; getting them never needs a copy.
+        :param capacity: most rows to keep
+        :param columns: number of columns in a row
+        """
+        self.capacity = max(1, int(capacity))
+        self.columns = columns
+        self.buffer = np.empty((2 * self.capacity, columns))
+        self.start = 0          # where the oldest row is
+        self.rows = 0           # number of rows being held
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def data(self) -> np.ndarray:
+        """The rows being held, oldest first. This is a view, not a copy"""
+        return self.buffer[self.start:self.start + self.rows]
+
+    def clear(self):
+        self.start = 0
+        self.rows = 0
+
+    def append(self, new_rows: np.ndarray):
+        """Add rows to the end, dropping the oldest ones once it's full"""
+        new_rows = np.asarray(new_rows, dtype=float).reshape(-1, self.columns)[-self.capacity:]
+        count = len(new_rows)
+        end = (self.start + self.rows) % self.capacity      # where the next row goes
+        # write the rows at 'end' and again 'capacity' rows later, splitting them if they wrap around
+        first = min(count, self.capacity - end)
+        for offset in (0, self.capacity):
+            self.buffer[end + offset:end + offset + first] = new_rows[:first]
+            self.buffer[offset:offset + count - first] = new_rows[first:]
+        dropped = max(0, self.rows + count - self.capacity)
+        self.start = (self.start + dropped) % self.capacity
+        self.rows = min(self.capacity, self.rows + count)
@@ -0,0 +1,65 @@
+"""
+Statistics that are updated one reading at a time, so averaging any number of readings doesn't need to keep them.
+
+author: Teddy Tortorici
+"""
+
+import math
+
+
+class RunningStats:
+
+    # the statistics summary() gives, in order
+    names = ["mean", "std", "sem", "min", "max", "count"]
+
+    def __init__(self):
+        """Count, mean, standard deviation, standard error, min and max of the readings added so far. The mean and
+        variance are kept with Welford's method, which doesn't lose precision like summing squares does"""
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.            # sum of squared differences from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        """Add a reading"""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "RunningStats"):
+        """Add in the readings another RunningStats has (like one from another thread)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 with fewer than 2 readings)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation"""
+        return math.sqrt(self.variance)
+
+    @property
+    def sem(self) -> float:
+        """Standard error of the mean"""
+        return self.std / math.sqrt(self.count) if self.count else 0.
+
+    def summary(self) -> list:
+        """The statistics in the order of RunningStats.names"""
+        return [self.mean, self.std, self.sem, self.min, self.max, self.count]
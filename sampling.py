@@ -0,0 +1,61 @@
+"""
+Reads several instruments at the same time instead of one after another, so taking a data point takes about as long as
+the slowest instrument instead of all of them added up.
+
+author: Teddy Tortorici
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+from running_stats import RunningStats
+
+
+class ParallelSampler:
+
+    def __init__(self, readers: dict, parallel: bool = True):
+        """
+        Reads a set of independent instruments together
+        :param readers: name -> function with no arguments that returns a reading (like lakeshore.read_temperature)
+        :param parallel: False to read them one after another (like before) in the calling thread
+        """
+        self.readers = dict(readers)
+        self.parallel = parallel
+        # one thread per instrument; an instrument is only ever read by one thread at a time
+        self.executor = ThreadPoolExecutor(max_workers=len(self.readers)) if parallel else None
+
+    @staticmethod
+    def read(reader, ave: int) -> tuple:
+        """
+        Take 'ave' readings from one instrument one after another
+        :return: (time stamp statistics, reading statistics) as RunningStats; each time stamp is halfway through its
+        reading
+        """
+        times = RunningStats()
+        readings = RunningStats()
+        for ii in range(ave):
+            start = time.time()
+            reading = reader()
+            times.add((start + time.time()) / 2)
+            readings.add(reading)
+        return times, readings
+
+    def sample(self, ave: int = 1) -> dict:
+        """
+        Read every instrument 'ave' times. Each instrument's readings are taken back to back, while the instruments
+        are read at the same time as each other
+        :param ave: number of readings to take from each instrument
+        :return: name -> (time stamp statistics, reading statistics) as RunningStats
+        """
+        ave = max(1, int(ave))
+        if not self.parallel:
+            return {name: self.read(reader, ave) for name, reader in self.readers.items()}
+        futures = {name: self.executor.submit(self.read, reader, ave) for name, reader in self.readers.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def sample_average(self, ave: int = 1) -> dict:
+        """Like sample(), but returns name -> (average time stamp, average reading)"""
+        return {name: (times.mean, readings.mean) for name, (times, readings) in self.sample(ave).items()}
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
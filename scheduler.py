@@ -0,0 +1,112 @@
+"""
+Runs something at a steady rate. Deadlines are counted from when the scheduler started (start + n * period), not from
+when the last run finished, so how long the work takes doesn't make the rate drift.
+
+author: Teddy Tortorici
+"""
+
+import threading
+import time
+from running_stats import RunningStats
+
+
+class PeriodicScheduler:
+
+    def __init__(self, period: float = None, trace=None, source: str = "scheduler"):
+        """
+        Use like
+            scheduler = PeriodicScheduler(1.)
+            while scheduler.wait():
+                take_data()
+        :param period: seconds between runs. None (or 0) to run again as soon as the last run finishes
+        :param trace: a tracing.Tracer to record a warning to every time runs are skipped. None to only count them
+        :param source: the source to record the warnings under
+        """
+        self.period = period
+        self.trace = trace
+        self.source = source
+        self.stopped = threading.Event()
+        self.next_deadline = None
+        self.last_tick = None
+
+        self.ticks = 0              # number of times wait() has returned True
+        self.overruns = 0           # number of runs that took longer than the period
+        self.missed = 0             # number of deadlines skipped because of overruns (runs that never happened)
+        self.jitter = RunningStats()    # how late (in seconds) each run started compared to its deadline
+        self.intervals = RunningStats()     # actual time (in seconds) between the starts of runs
+
+    def wait(self) -> bool:
+        """
+        Wait for the next deadline
+        :return: False if stop() was called (right away, even in the middle of waiting), otherwise True
+        """
+        if self.stopped.is_set():
+            return False
+        now = time.monotonic()
+        if self.next_deadline is None:
+            self.next_deadline = now        # the first run starts right away
+        elif self.period:
+            late = now - self.next_deadline
+            if late > 0:
+                # the last run went past this deadline. Skip the deadlines it covered instead of running back to back
+                # to catch up, so the runs stay on the same timeline
+                missed = int(late // self.period) + 1
+                self.overruns += 1
+                self.missed += missed
+                self.next_deadline += missed * self.period
+                if self.trace is not None:
+                    self.trace.warning(self.source, "Skipped {missed} run(s): the last run went {late:.4f} s past its "
+                                                    "{period} s period", missed=missed, late=late, period=self.period)
+            if self.stopped.wait(max(0., self.next_deadline - time.monotonic())):
+                return False
+        else:
+            self.next_deadline = now
+
+        tick = time.monotonic()
+        self.jitter.add(tick - self.next_deadline)
+        if self.last_tick is not None:
+            self.intervals.add(tick - self.last_tick)
+        self.last_tick = tick
+        self.ticks += 1
+        if self.period:
+            self.next_deadline += self.period
+        return True
+
+    def stop(self):
+        """Make wait() return False, including a wait() that's happening in another thread"""
+        self.stopped.set()
+
+    def reset(self):
+        """Start a new timeline on the next wait() and clear the statistics"""
+        self.stopped.clear()
+        self.next_deadline = None
+        self.last_tick = None
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.jitter = RunningStats()
+        self.intervals = RunningStats()
+
+    def stats(self) -> dict:
+        """How well the schedule has been kept. "missed fraction" is the share of deadlines that were skipped, so 0.5
+        means data came at half the rate asked for"""
+        slots = self.ticks + self.missed
+        return {"period": self.period,
+                "ticks": self.ticks,
+                "overruns": self.overruns,
+                "missed": self.missed,
+                "missed fraction": self.missed / slots if slots else 0.,
+                "mean jitter": self.jitter.mean,
+                "max jitter": self.jitter.max if self.jitter.count else 0.,
+                "jitter std": self.jitter.std,
+                "mean interval": self.intervals.mean,
+                "interval std": self.intervals.std}
+
+    def summary(self) -> str:
+        """The stats as one line of text"""
+        stats = self.stats()
+        period = f"{self.period:g} s" if self.period else "as fast as possible"
+        return (f"{stats['ticks']} samples at {period}: {stats['overruns']} overruns skipped {stats['missed']} "
+                f"samples ({stats['missed fraction'] * 100:.1f}%), "
+                f"jitter {stats['mean jitter'] * 1e3:.2f} ms mean / {stats['max jitter'] * 1e3:.2f} ms max, "
+                f"interval {stats['mean interval']:.4f} +/- {stats['interval std']:.4f} s")
@@ -0,0 +1,15 @@
+"""
+Puts the project's folders on the path the same way running the scripts does (the modules import each other by name),
+so the tests can be run from anywhere with
+    python -m pytest tests
+
+author: Teddy Tortorici
+"""
+
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in (root, os.path.join(root, "GPIB"), os.path.join(root, "QtApplication")):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
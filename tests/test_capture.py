@@ -0,0 +1,121 @@
+"""
+Tests for capture: a session recorded with Recorder plays back through Replay with the same responses, in order,
+including timeouts and the exceptions the device raised.
+
+author: Teddy Tortorici
+"""
+
+import time
+import numpy as np
+import pytest
+import pyvisa
+import capture
+from gpib import TimedOut
+
+
+class Scripted:
+    """A stand in for a device that answers from a list, raising any exceptions in it"""
+    def __init__(self, answers: list):
+        self.answers = list(answers)
+        self.address = 13
+
+    def answer(self):
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def read(self):
+        return self.answer()
+
+    def write(self, msg):
+        return self.answer()
+
+    def query(self, msg):
+        return self.answer()
+
+    def query_ascii(self, msg, sep=',', converter='f'):
+        return self.answer()
+
+    def query_binary(self, msg, dtype='f4', big_endian=False, expect_termination=True):
+        return self.answer()
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Records a session of one device and returns its file"""
+    filename = str(tmp_path / "session.jsonl")
+    recorded = capture.Capture(filename, flush_interval=None)
+    device = capture.Recorder(Scripted([
+        "300.1", "300.2",
+        TimedOut("timed out"),
+        np.array([1., 2., 3.]),
+        np.array([0.5, -0.25], dtype="<f4"),
+        None,
+        pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout),
+        ValueError("could not convert 'OVER'"),
+        KeyError("no such thing"),
+    ]), recorded, "LS")
+    assert device.query("krdg? a") == "300.1"
+    assert device.query("KRDG? A") == "300.2"
+    assert isinstance(device.query("SETP? 1"), TimedOut)
+    device.query_ascii("RDGST? A")
+    device.query_binary("CURV?", dtype="f4")
+    device.write("SETP 1,300")
+    for message, error in (("*IDN?", pyvisa.errors.VisaIOError), ("SRDG? A", ValueError), ("HTR? 1", KeyError)):
+        with pytest.raises(error):
+            device.query(message)
+    assert device.address == 13         # not recorded, straight from the device
+    recorded.close()
+    assert recorded.count == 9
+    return filename
+
+
+def test_load(session):
+    records = capture.load(session, "ls")
+    assert [record["method"] for record in records[:6]] == ["query", "query", "query", "query_ascii", "query_binary",
+                                                            "write"]
+    assert capture.load(session, "other") == []
+    assert all(record["latency"] >= 0 for record in records)
+
+
+def test_replay_answers_in_order(session):
+    replay = capture.Replay(13, filename=session, captured_id="LS", speed=0)
+    assert [replay.query("KRDG? A") for _ in range(3)] == ["300.1", "300.2", "300.1"]     # starts over
+    timed_out = replay.query("SETP? 1")
+    assert isinstance(timed_out, TimedOut) and timed_out == "timed out"
+    assert np.array_equal(replay.query_ascii("RDGST? A"), [1., 2., 3.])
+    assert np.array_equal(replay.query_binary("CURV?", dtype="f4"), np.array([0.5, -0.25], dtype="f4"))
+    assert replay.write("SETP 1,300") is None
+
+
+def test_replay_raises_recorded_errors(session):
+    replay = capture.Replay(13, filename=session, captured_id="LS", speed=0)
+    with pytest.raises(pyvisa.errors.VisaIOError) as error:
+        replay.query("*IDN?")
+    assert error.value.error_code == pyvisa.constants.StatusCode.error_timeout
+    with pytest.raises(ValueError, match="OVER"):
+        replay.query("SRDG? A")
+    with pytest.raises(KeyError):
+        replay.query("HTR? 1")
+
+
+def test_unrecorded_commands_fall_back_to_fake(session):
+    replay = capture.Replay(13, filename=session, speed=0)
+    assert "fake" in replay.query("KRDG? B").lower()
+
+
+def test_replay_waits_the_recorded_latency():
+    records = [{"dev": "LS", "method": "query", "message": "KRDG? A", "response": "1", "latency": 0.2}]
+    replay = capture.Replay(13, records=records, speed=2.)
+    start = time.perf_counter()
+    assert replay.query("KRDG? A") == "1"
+    assert 0.09 < time.perf_counter() - start < 0.5
+
+
+def test_errors_not_built_in():
+    class Strange(Exception):
+        pass
+    error = capture.decode_error(capture.encode_error(Strange("odd")))
+    assert isinstance(error, capture.CapturedError)
+    assert str(error) == "Strange: odd"
@@ -0,0 +1,83 @@
+"""
+Tests for csv_tail.CSVTail: only new rows are read, partly written lines wait for the rest, and big files are read in
+chunks without losing the lines cut off at the end of a chunk.
+
+author: Teddy Tortorici
+"""
+
+import os
+import numpy as np
+import pytest
+from csv_tail import CSVTail
+
+
+@pytest.fixture
+def filename(tmp_path):
+    filename = str(tmp_path / "data.csv")
+    with open(filename, "w") as f:
+        f.write("# This data file was created for a test\n'Time [s]', 'Voltage [V]'\n")
+    return filename
+
+
+def add(filename: str, text: str):
+    with open(filename, "a") as f:
+        f.write(text)
+
+
+def test_reads_only_new_rows(filename):
+    tail = CSVTail(filename)
+    add(filename, "1.0, 2.0\n3.0, 4.0\n")
+    assert tail.update() == 2
+    add(filename, "5.0, 6.0\n")
+    assert tail.update() == 1
+    assert tail.update() == 0
+    np.testing.assert_array_equal(tail.data, [[1, 2], [3, 4], [5, 6]])
+
+
+def test_partial_line_waits(filename):
+    tail = CSVTail(filename)
+    add(filename, "1.0, 2.0\n3.0, 4")
+    assert tail.update() == 1
+    add(filename, ".5\n")
+    assert tail.update() == 1
+    np.testing.assert_array_equal(tail.data, [[1, 2], [3, 4.5]])
+
+
+def test_comments_and_bad_rows_are_skipped(filename):
+    tail = CSVTail(filename)
+    add(filename, "1.0, 2.0\n# a comment\n3.0, 4.0, 5.0\nnot, numbers\n6.0, 7.0\n")
+    tail.update()
+    np.testing.assert_array_equal(tail.data, [[1, 2], [6, 7]])
+
+
+@pytest.mark.parametrize("chunk_size", [7, 16, 100, 1 << 24])
+def test_chunks_carry_cut_off_lines(filename, chunk_size):
+    rows = np.random.default_rng(5).random((500, 2))
+    add(filename, "".join(f"{a!r}, {b!r}\n" for a, b in rows.tolist()) + "0.5, 0.")
+    tail = CSVTail(filename)
+    tail.chunk_size = chunk_size
+    assert tail.update() == 500
+    np.testing.assert_array_equal(tail.data, rows)
+    add(filename, "25\n")
+    np.testing.assert_array_equal(tail.read_new(), [[0.5, 0.25]])
+
+
+def test_truncated_file_starts_over(filename):
+    tail = CSVTail(filename)
+    add(filename, "1.0, 2.0\n3.0, 4.0\n")
+    tail.update()
+    with open(filename, "w") as f:
+        f.write("5.0, 6.0\n")
+    tail.update()
+    np.testing.assert_array_equal(tail.data, [[5, 6]])
+
+
+def test_release_keeps_reading_from_the_same_place(filename):
+    tail = CSVTail(filename)
+    add(filename, "1.0, 2.0\n")
+    tail.update()
+    tail.release()
+    add(filename, "3.0, 4.0\n")
+    np.testing.assert_array_equal(tail.read_new(), [[3, 4]])
+    assert tail.rows == 0
+    assert os.path.getsize(filename) == tail.offset
@@ -0,0 +1,95 @@
+"""
+Tests for csv_writer: rows are held until flush_rows of them are waiting, flush_interval passes, or the writer is
+closed (even when nobody closed it), and rows are formatted the same way str(list) would.
+
+author: Teddy Tortorici
+"""
+
+import gc
+import time
+import numpy as np
+import pytest
+import csv_writer
+from csv_writer import CSVWriter, format_row
+
+
+def read(filename: str) -> str:
+    with open(filename) as f:
+        return f.read()
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / "data.csv")
+
+
+def test_flushes_every_flush_rows(filename):
+    with CSVWriter(filename, flush_rows=3, flush_interval=None) as writer:
+        writer.write_row([1, 2])
+        writer.write_row([3, 4])
+        assert read(filename) == ""
+        writer.write_row([5, 6])
+        assert read(filename) == "1, 2\n3, 4\n5, 6\n"
+        assert writer.written == len(read(filename))
+        writer.write_comment("done")
+        assert read(filename).count("\n") == 3
+    assert read(filename).endswith("# done\n")
+
+
+def test_flushes_every_flush_interval(filename):
+    writer = CSVWriter(filename, flush_rows=1000, flush_interval=0.05)
+    writer.write_row([1.5])
+    deadline = time.monotonic() + 5.
+    while not read(filename) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert read(filename) == "1.5\n"
+    writer.close()
+    writer.flush_thread.join(1.)
+    assert not writer.flush_thread.is_alive()
+
+
+def test_close_writes_everything_once(filename):
+    writer = CSVWriter(filename, flush_rows=1000, flush_interval=None)
+    writer.write_row([1, 2])
+    writer.close()
+    writer.close()
+    assert read(filename) == "1, 2\n"
+    assert writer not in csv_writer.open_writers
+
+
+def test_appends_and_truncates(filename):
+    with open(filename, "w") as f:
+        f.write("# header\n")
+    with CSVWriter(filename, flush_rows=1, flush_interval=None) as writer:
+        writer.write_row([1])
+        assert read(filename) == "# header\n1\n"
+        writer.truncate()
+        assert writer.written == 0
+        writer.write_row([2])
+    assert read(filename) == "2\n"
+
+
+def test_forgotten_writer_is_flushed(filename):
+    writer = CSVWriter(filename, flush_rows=1000, flush_interval=0.05)
+    writer.write_row([7, 8])
+    thread = writer.flush_thread
+    del writer
+    gc.collect()
+    assert read(filename) == "7, 8\n"
+    thread.join(1.)
+    assert not thread.is_alive()
+
+
+@pytest.mark.parametrize("row", [
+    [1, 2.5, -3e-12, 1e300, "a", True, None],
+    [0.1 + 0.2],
+    [],
+])
+def test_format_row_matches_str_list(row):
+    assert format_row(row) == str(row)[1:-1]
+
+
+def test_format_row_numpy():
+    assert format_row(np.array([0.5, 1e-7, 3.])) == "0.5, 1e-07, 3.0"
+    assert format_row([np.float64(0.5), np.int64(2), 1.25]) == "0.5, 2, 1.25"
+    assert format_row((1, 2)) == "1, 2"
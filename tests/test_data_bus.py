@@ -0,0 +1,58 @@
+"""
+Tests for data_bus.DataBus: every sink and subscription gets each record, and a full subscription drops its oldest
+records and counts them.
+
+author: Teddy Tortorici
+"""
+
+from data_bus import DataBus
+
+labels = ["Time [s]", "Voltage [V]"]
+
+
+def test_sinks_and_subscriptions_get_every_record():
+    bus = DataBus(labels)
+    sunk = []
+    notified = []
+    bus.add_sink(sunk.append)
+    subscription = bus.subscribe(notify=lambda: notified.append(True))
+    for ii in range(5):
+        bus.publish([float(ii), ii * 2.])
+    assert len(sunk) == len(notified) == 5
+    drained = subscription.drain()
+    assert drained.dtype == bus.dtype
+    assert drained["Voltage [V]"].tolist() == [0., 2., 4., 6., 8.]
+    assert len(subscription.drain()) == 0
+    assert subscription.dropped == 0
+
+
+def test_published_records_pass_through():
+    bus = DataBus(labels)
+    record = bus.record([1., 2.])
+    assert bus.publish(record) is record
+
+
+def test_full_subscription_drops_the_oldest():
+    bus = DataBus(labels)
+    subscription = bus.subscribe(max_records=3)
+    for ii in range(10):
+        bus.publish([float(ii), 0.])
+    assert subscription.dropped == 7
+    assert subscription.drain()["Time [s]"].tolist() == [7., 8., 9.]
+    bus.publish([10., 0.])
+    assert subscription.dropped == 7        # nothing dropped once there's room again
+
+
+def test_cancel_and_remove():
+    bus = DataBus(labels)
+    sunk = []
+    bus.add_sink(sunk.append)
+    subscription = bus.subscribe()
+    bus.publish([0., 0.])
+    subscription.cancel()
+    bus.remove_sink(sunk.append)
+    bus.publish([1., 1.])
+    assert len(sunk) == 1
+    assert len(subscription.drain()) == 1
+    assert not bus.subscriptions and not bus.sinks
+
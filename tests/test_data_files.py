@@ -0,0 +1,145 @@
+"""
+Tests for the data files in data_files: binary files reopen where they left off and drop a partly written row, csv
+and binary files convert into each other without losing anything, and rolling files split into segments that
+load_window() reads back.
+
+author: Teddy Tortorici
+"""
+
+import os
+import numpy as np
+import pytest
+import data_files
+from data_files import BinaryFile, CSVFile, RollingDataFile
+
+labels = ["Time [s]", "Temperature [K]", "Counts"]
+
+
+def rows(start: int, stop: int) -> np.ndarray:
+    index = np.arange(start, stop, dtype=float)
+    return np.column_stack([1.7e9 + index, 300. - index / 7., index * 3])
+
+
+def test_binary_file_reopens_and_appends(tmp_path):
+    binary = BinaryFile(str(tmp_path), "run", labels, dtypes=["f8", "f8", "i4"], comment="first run")
+    binary.write_rows(rows(0, 5))
+    binary.write_row([1.7e9 + 5, 1., 15])
+    binary.close()
+
+    binary = BinaryFile(str(tmp_path), "run.qfd", comment="second run")
+    assert not binary.new
+    assert binary.labels == labels
+    binary.write_row([1.7e9 + 6, 2., 18])
+    binary.close()
+
+    data = data_files.load_binary(binary.filename)
+    assert len(data) == 7
+    assert data["Counts"].dtype == np.int32
+    assert data["Counts"].tolist() == [0, 3, 6, 9, 12, 15, 18]
+    assert data["Temperature [K]"][-2:].tolist() == [1., 2.]
+    comments = data_files.read_comments(binary.filename)
+    assert comments[1:] == ["first run", "second run"]
+
+
+def test_binary_file_drops_a_partial_row(tmp_path):
+    binary = BinaryFile(str(tmp_path), "run", labels)
+    binary.write_rows(rows(0, 3))
+    binary.close()
+    with open(binary.filename, "ab") as f:
+        f.write(b"\x00" * 5)        # what a crash in the middle of writing a row leaves
+    assert len(data_files.load_binary(binary.filename)) == 3       # loading leaves it off
+
+    binary = BinaryFile(str(tmp_path), "run")       # reopening cuts it off, so new rows line up
+    assert os.path.getsize(binary.filename) == BinaryFile.header_size + 3 * binary.dtype.itemsize
+    binary.write_row([1., 2., 3.])
+    binary.close()
+    data = data_files.load_binary(binary.filename)
+    assert data[-1].tolist() == (1., 2., 3.)
+    assert np.array_equal(data["Counts"][:3], [0., 3., 6.])
+
+
+def test_empty_binary_file(tmp_path):
+    binary = BinaryFile(str(tmp_path), "run", labels)
+    binary.close()
+    assert len(data_files.load_binary(binary.filename)) == 0
+
+
+def test_new_binary_file_needs_labels(tmp_path):
+    with pytest.raises(ValueError):
+        BinaryFile(str(tmp_path), "run")
+
+
+def test_csv_binary_round_trip(tmp_path):
+    csv = CSVFile(str(tmp_path), "run", comment="a comment")
+    csv.write_row(labels)
+    for row in rows(0, 50).tolist():
+        csv.write_row(row)
+    csv.close()
+
+    binary_filename = data_files.csv_to_binary(csv.filename)
+    assert data_files.read_header(binary_filename)["labels"] == labels
+    assert np.array_equal(data_files.load_segment(binary_filename), rows(0, 50))
+    assert "a comment" in data_files.read_comments(binary_filename)
+
+    csv_filename = data_files.binary_to_csv(binary_filename, str(tmp_path / "back.csv"))
+    comments, csv_labels = data_files.csv_labels(csv_filename)
+    assert csv_labels == labels
+    assert "a comment" in comments
+    assert np.array_equal(data_files.load_segment(csv_filename), rows(0, 50))
+
+
+@pytest.mark.parametrize("segment_class", [CSVFile, BinaryFile])
+def test_rolling_file_splits_into_segments(tmp_path, segment_class):
+    rolling = RollingDataFile(str(tmp_path), "run", labels, "a comment", segment_class, max_bytes=1000,
+                              index_interval=0.)
+    data = rows(0, 300)
+    for row in data.tolist():
+        rolling.write_row(row)
+        rolling.flush()         # so every row counts toward the segment's size right away
+    rolling.close()
+
+    index = data_files.read_index(rolling.path)
+    segments = index["segments"]
+    assert len(segments) > 2
+    assert sum(segment["rows"] for segment in segments) == len(data)
+    for segment in segments:
+        segment_data = data_files.load_segment(os.path.join(rolling.path, segment["file"]))
+        assert len(segment_data) == segment["rows"]
+        assert segment["start"] == segment_data[0, 0] and segment["end"] == segment_data[-1, 0]
+    if segment_class is BinaryFile:
+        # the header isn't counted, so a binary segment holds about max_bytes of rows
+        row_size = 3 * 8
+        assert segments[0]["rows"] == -(-1000 // row_size)
+
+    assert np.array_equal(data_files.load_window(rolling.path), data)
+    assert np.array_equal(data_files.load_window(rolling.path, data[50, 0], data[250, 0]), data[50:251])
+    assert np.array_equal(data_files.load_window(rolling.path, end=data[0, 0]), data[:1])
+    assert len(data_files.load_window(rolling.path, start=data[-1, 0] + 1)) == 0
+
+
+def test_rolling_file_reads_only_segments_in_the_window(tmp_path, monkeypatch):
+    rolling = RollingDataFile(str(tmp_path), "run", labels, max_bytes=500, index_interval=0.)
+    data = rows(0, 200)
+    for row in data.tolist():
+        rolling.write_row(row)
+        rolling.flush()
+    rolling.close()
+
+    loaded = []
+    load_segment = data_files.load_segment
+    monkeypatch.setattr(data_files, "load_segment", lambda filename: loaded.append(filename) or load_segment(filename))
+    window = data_files.load_window(rolling.path, data[-3, 0])
+    assert np.array_equal(window, data[-3:])
+    assert len(loaded) <= 2 < len(data_files.read_index(rolling.path)["segments"])
+
+
+def test_reopened_rolling_file_continues_in_a_new_segment(tmp_path):
+    rolling = RollingDataFile(str(tmp_path), "run", labels)
+    rolling.write_row(rows(0, 1)[0].tolist())
+    rolling.close()
+    rolling = RollingDataFile(str(tmp_path), "run", labels)
+    assert not rolling.new
+    rolling.write_row(rows(1, 2)[0].tolist())
+    assert np.array_equal(rolling.load_window(), rows(0, 2))
+    rolling.close()
+    assert [segment["rows"] for segment in rolling.segments] == [1, 1]
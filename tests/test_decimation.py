@@ -0,0 +1,111 @@
+"""
+Tests for decimation.MinMaxPyramid: the points it picks keep the envelope (every min and max) of the data in view.
+
+author: Teddy Tortorici
+"""
+
+import numpy as np
+import pytest
+from decimation import DecimatedCurve, MinMaxPyramid, stride
+
+
+@pytest.fixture
+def y():
+    rng = np.random.default_rng(4)
+    y = np.cumsum(rng.normal(size=20000))
+    y[rng.integers(0, len(y), 20)] += 100.      # spikes that must not disappear
+    return y
+
+
+@pytest.mark.parametrize("start, stop, max_points", [(0, 20000, 500), (1234, 5678, 300), (19990, 20000, 100),
+                                                     (0, 20000, 100000), (5000, 5003, 10), (4096, 8192, 256)])
+def test_envelope_is_kept(y, start, stop, max_points):
+    pyramid = MinMaxPyramid()
+    pyramid.update(y)
+    indices = pyramid.indices(start, stop, max_points)
+    assert len(indices) <= max_points + 2 * pyramid.factor
+    assert np.all(np.diff(indices) >= 0)
+    # whole blocks are drawn, so the points can reach past the ends of the range by up to one block
+    block = pyramid.factor * (stop - start) / (max_points / 2)
+    assert indices[0] > start - block and indices[-1] < stop + block
+    # and every block's min and max is there, so nothing in the range is higher or lower than what's drawn
+    assert y[indices].min() <= y[start:stop].min()
+    assert y[indices].max() >= y[start:stop].max()
+
+
+def test_envelope_is_exact_on_block_edges(y):
+    pyramid = MinMaxPyramid()
+    pyramid.update(y)
+    for start, stop in [(0, 16384), (4096, 8192), (1024, 1024 + 4 ** 5)]:
+        indices = pyramid.indices(start, stop, 64)
+        assert np.all((indices >= start) & (indices < stop))
+        assert y[indices].min() == y[start:stop].min()
+        assert y[indices].max() == y[start:stop].max()
+
+
+def test_incremental_update_matches_one_update(y):
+    whole = MinMaxPyramid()
+    whole.update(y)
+    pieces = MinMaxPyramid()
+    for stop in (1, 7, 100, 4097, 12345, len(y)):
+        pieces.update(y[:stop])
+    assert len(pieces.levels) == len(whole.levels)
+    for piece_level, whole_level in zip(pieces.levels, whole.levels):
+        assert piece_level.blocks == whole_level.blocks
+        np.testing.assert_array_equal(piece_level.imin[:piece_level.blocks], whole_level.imin[:whole_level.blocks])
+        np.testing.assert_array_equal(piece_level.imax[:piece_level.blocks], whole_level.imax[:whole_level.blocks])
+
+
+def test_shorter_data_starts_over(y):
+    pyramid = MinMaxPyramid()
+    pyramid.update(y)
+    pyramid.update(y[:100])
+    assert pyramid.points == 100
+    indices = pyramid.indices(0, 100, 10)
+    assert y[indices].max() == y[:100].max()
+
+
+def test_stride():
+    x = np.arange(1000.)
+    strided_x, strided_y = stride(x, -x, 100)
+    assert len(strided_x) <= 100
+    np.testing.assert_array_equal(strided_y, -strided_x)
+
+
+class Signal:
+    def connect(self, function):
+        pass
+
+
+class ViewBox:
+    """Just enough of a pyqtgraph ViewBox for DecimatedCurve"""
+    sigXRangeChanged = Signal()
+
+    def __init__(self, x_range):
+        self.x_range = x_range
+
+    def viewRange(self):
+        return [self.x_range, [0, 1]]
+
+    def width(self):
+        return 200
+
+
+class Curve:
+    def setData(self, x, y, **kwargs):
+        self.x, self.y = x, y
+
+
+def test_curve_notices_replaced_data():
+    curve = Curve()
+    decimated = DecimatedCurve(curve, ViewBox([0, 5000]))
+    old = np.zeros(5000)
+    decimated.set_data(np.arange(5000.), old)
+    # a different file with as many rows, starting at a different time, and a spike in it
+    new = np.zeros(6000)
+    new[10] = 100.
+    decimated.set_data(np.arange(6000.) + 1e9, new)
+    decimated.view_box.x_range = [1e9, 1e9 + 6000]
+    decimated.drawn = None
+    decimated.redraw()
+    assert curve.y.max() == 100.
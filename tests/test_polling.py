@@ -0,0 +1,85 @@
+"""
+Tests for polling.Poller with a stand-in for GpibServer.dispatch: one poll is shared by every requester, at the
+shortest period any of them asked for, and stops once nobody wants it.
+
+author: Teddy Tortorici
+"""
+
+import asyncio
+import math
+import pytest
+from polling import Poller
+
+
+class Dispatch:
+    """Counts the messages it's asked to dispatch"""
+    def __init__(self):
+        self.count = 0
+
+    async def __call__(self, message: str) -> str:
+        self.count += 1
+        return f"{message} {self.count}"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_requesters_share_one_poll():
+    async def poll():
+        dispatch = Dispatch()
+        poller = Poller(dispatch)
+        updates = {"a": [], "b": []}
+        poller.start("LS::Q::KRDG? A", 0.05, "a", lambda *update: updates["a"].append(update))
+        poller.start("LS::Q::KRDG? A", 1., "b", lambda *update: updates["b"].append(update))
+        await asyncio.sleep(0.22)
+        poller.stop_all()
+        return dispatch.count, updates
+    count, updates = run(poll())
+    assert len(updates["a"]) == len(updates["b"]) == count     # both got every poll
+    assert 4 <= count <= 6      # at the shorter period
+    assert updates["a"][0][0] == "LS::Q::KRDG? A"
+
+
+def test_stops_when_nobody_wants_it():
+    async def poll():
+        dispatch = Dispatch()
+        poller = Poller(dispatch)
+        poller.start("M", 0.05, "a")
+        poller.start("M", 0.05, "b")
+        await asyncio.sleep(0.01)
+        poller.stop("M", "a")
+        still_polled = "M" in poller.tasks and "M" in poller.latest
+        poller.stop("M", "b")
+        count = dispatch.count
+        await asyncio.sleep(0.12)
+        return still_polled, poller, count, dispatch.count
+    still_polled, poller, stopped_at, count = run(poll())
+    assert still_polled
+    assert not poller.tasks and not poller.periods and not poller.latest
+    assert count == stopped_at
+
+
+def test_errors_become_responses():
+    async def fail(message):
+        raise RuntimeError("device gone")
+
+    async def poll():
+        poller = Poller(fail)
+        poller.start("M", 0.05, "a")
+        await asyncio.sleep(0.01)
+        latest = poller.latest["M"]
+        poller.stop_all()
+        return latest
+    assert run(poll())[1] == "RuntimeError: device gone"
+
+
+@pytest.mark.parametrize("period", [0, -1, math.nan, math.inf, "soon"])
+def test_bad_periods_are_refused(period):
+    with pytest.raises(ValueError):
+        Poller.check_period(period)
+
+
+def test_short_periods_are_raised_to_the_minimum():
+    assert Poller.check_period(1e-6) == Poller.min_period
+    assert Poller.check_period(2.) == 2.
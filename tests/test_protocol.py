@@ -0,0 +1,107 @@
+"""
+Tests for protocol.py: messages and arrays make it through a socket unchanged, and bad headers are refused.
+
+author: Teddy Tortorici
+"""
+
+import asyncio
+import socket
+import threading
+import numpy as np
+import pytest
+import protocol
+
+
+@pytest.fixture
+def sockets():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_text_round_trip(sockets):
+    a, b = sockets
+    protocol.send_message(a, 7, b"LS::Q::KRDG? A")
+    assert protocol.recv_message(b) == (protocol.Kind.text, 7, bytearray(b"LS::Q::KRDG? A"))
+
+
+def test_big_message_round_trip(sockets):
+    a, b = sockets
+    payload = bytes(range(256)) * (protocol.small_message // 64)     # big enough to be sent in parts
+    sender = threading.Thread(target=protocol.send_message, args=(a, 1, payload))
+    sender.start()
+    kind, request_id, received = protocol.recv_message(b)
+    sender.join()
+    assert (kind, request_id) == (protocol.Kind.text, 1)
+    assert received == payload
+
+
+@pytest.mark.parametrize("array", [np.arange(10, dtype="f4"),
+                                   np.random.random((5, 3)),
+                                   np.arange(12, dtype=">i2").reshape(3, 4),
+                                   np.empty(0)])
+def test_array_round_trip(sockets, array):
+    a, b = sockets
+    protocol.send_message(a, 3, protocol.pack_array(array), protocol.Kind.array)
+    kind, request_id, payload = protocol.recv_message(b)
+    received = protocol.unpack_array(payload)
+    assert (kind, request_id) == (protocol.Kind.array, 3)
+    assert received.dtype == array.dtype
+    np.testing.assert_array_equal(received, array)
+
+
+def test_array_data_is_aligned():
+    prefix, data = protocol.pack_array(np.arange(3.))
+    assert len(prefix) % protocol.array_alignment == 0
+
+
+def test_closed_connection(sockets):
+    a, b = sockets
+    a.close()
+    assert protocol.recv_message(b) == (None, None, b"")
+
+
+def test_oversize_header_is_refused(sockets):
+    a, b = sockets
+    a.sendall(protocol.header.pack(protocol.magic, protocol.version, protocol.Kind.text, 1, 1 << 40))
+    with pytest.raises(protocol.ProtocolError):
+        protocol.recv_message(b)
+    a.sendall(protocol.pack(2, b"x" * 100))
+    with pytest.raises(protocol.ProtocolError):
+        protocol.recv_message(b, limit=10)
+
+
+def test_bad_magic_and_version(sockets):
+    a, b = sockets
+    a.sendall(protocol.header.pack(b"XX", protocol.version, protocol.Kind.text, 1, 0))
+    with pytest.raises(protocol.ProtocolError):
+        protocol.recv_message(b)
+    a.sendall(protocol.header.pack(protocol.magic, protocol.version + 1, protocol.Kind.text, 1, 0))
+    with pytest.raises(protocol.ProtocolError):
+        protocol.recv_message(b)
+
+
+def read_from(data: bytes, **kwargs) -> tuple:
+    """Run read_message on a stream holding data"""
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await protocol.read_message(reader, **kwargs)
+    return asyncio.run(read())
+
+
+def test_read_message():
+    assert read_from(protocol.pack(5, b"hello")) == (protocol.Kind.text, 5, b"hello")
+    message = protocol.pack(5, b"hello")
+    assert read_from(message[2:], start=message[:2]) == (protocol.Kind.text, 5, b"hello")
+    assert read_from(b"") == (None, None, b"")
+
+
+def test_read_message_oversize_header():
+    with pytest.raises(protocol.ProtocolError):
+        read_from(protocol.header.pack(protocol.magic, protocol.version, protocol.Kind.text, 1,
+                                       protocol.max_payload + 1))
+    with pytest.raises(protocol.ProtocolError):
+        read_from(protocol.pack(1, b"x" * 100), limit=10)
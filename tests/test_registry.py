@@ -0,0 +1,28 @@
+"""
+Tests for registry.DeviceRegistry: ids are upper case however they're added, and each device is opened once, the
+first time it's used.
+
+author: Teddy Tortorici
+"""
+
+from registry import DeviceRegistry
+
+
+def test_ids_are_upper_case():
+    registry = DeviceRegistry({"ls": {"driver": "gpib.Fake", "address": 13, "name": "LakeShore"}})
+    registry.register("e0", object, "Echo")
+    registry.register("E1", object)
+    assert registry.ids() == ["LS", "E0", "E1"]
+    assert "E0" in registry and "e0" not in registry
+    assert registry.name("LS") == "LakeShore"
+    assert registry.name("E1") == "E1"
+    assert registry.get("LS").address == 13
+
+
+def test_devices_open_once():
+    opened = []
+    registry = DeviceRegistry()
+    registry.register("dev", lambda: opened.append(object()) or opened[-1])
+    assert registry.get("DEV") is registry.get("DEV")
+    assert len(opened) == 1
+    assert registry.get("OTHER") is None
@@ -0,0 +1,101 @@
+"""
+Tests for response_cache.ResponseCache: responses expire, the least recently used ones go first, and writes make the
+matching queries stale.
+
+author: Teddy Tortorici
+"""
+
+import pytest
+import response_cache
+from response_cache import ResponseCache
+
+
+class Clock:
+    """Stands in for time.monotonic so expiry can be tested without waiting"""
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_only_cacheable_queries_are_kept():
+    cache = ResponseCache({"PID?": 60.})
+    cache.put("LS", "PID? 1", "50,20,0")
+    cache.put("LS", "KRDG? A", "300.0")
+    assert cache.get("LS", "PID? 1") == "50,20,0"
+    assert cache.get("LS", "KRDG? A") is None
+    assert cache.get("VS", "PID? 1") is None
+
+
+def test_timeouts_are_not_cached():
+    cache = ResponseCache({"PID?": 60.})
+    cache.put("LS", "PID? 1", "timed out")
+    assert cache.get("LS", "PID? 1") is None
+
+
+def test_setpoint_is_not_cached_by_default():
+    cache = ResponseCache()
+    cache.put("LS", "SETP? 1", "300.0")
+    assert cache.get("LS", "SETP? 1") is None
+
+
+def test_ttl(clock):
+    cache = ResponseCache({"PID?": 60., "*IDN?": None})
+    cache.put("LS", "PID? 1", "50,20,0")
+    cache.put("LS", "*IDN?", "LSCI,MODEL331")
+    clock.now += 59.
+    assert cache.get("LS", "PID? 1") == "50,20,0"
+    clock.now += 2.
+    assert cache.get("LS", "PID? 1") is None
+    clock.now += 1e6
+    assert cache.get("LS", "*IDN?") == "LSCI,MODEL331"      # None keeps it until a write makes it stale
+
+
+def test_least_recently_used_go_first():
+    cache = ResponseCache({"PID?": None}, max_size=2)
+    cache.put("LS", "PID? 1", "a")
+    cache.put("LS", "PID? 2", "b")
+    assert cache.get("LS", "PID? 1") == "a"     # now PID? 2 is the least recently used
+    cache.put("VS", "PID? 1", "c")
+    assert cache.get("LS", "PID? 2") is None
+    assert cache.get("LS", "PID? 1") == "a"
+    assert cache.get("VS", "PID? 1") == "c"
+
+
+def test_write_invalidates_matching_query():
+    cache = ResponseCache({"PID?": None, "RANGE?": None})
+    cache.put("LS", "PID? 1", "50,20,0")
+    cache.put("LS", "RANGE?", "3")
+    cache.put("VS", "PID? 1", "1,1,1")
+    cache.invalidate("LS", "PID 1, 60, 20, 0")
+    assert cache.get("LS", "PID? 1") is None
+    assert cache.get("LS", "RANGE?") == "3"
+    assert cache.get("VS", "PID? 1") == "1,1,1"
+    assert cache.invalidations == 1
+
+
+def test_reset_invalidates_everything_for_the_device():
+    cache = ResponseCache({"PID?": None, "RANGE?": None})
+    cache.put("LS", "PID? 1", "50,20,0")
+    cache.put("LS", "RANGE?", "3")
+    cache.invalidate("LS", "*RST")
+    assert cache.get("LS", "PID? 1") is None
+    assert cache.get("LS", "RANGE?") is None
+
+
+def test_stats():
+    cache = ResponseCache({"PID?": None})
+    cache.get("LS", "PID? 1")
+    cache.put("LS", "PID? 1", "50,20,0")
+    cache.get("LS", "PID? 1")
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit rate": 0.5, "invalidations": 0, "size": 1}
+    cache.reset_stats()
+    assert cache.stats()["hits"] == 0 and cache.stats()["size"] == 1
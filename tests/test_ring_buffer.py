@@ -0,0 +1,59 @@
+"""
+Tests for ring_buffer.RingBuffer: it always holds the newest rows in order, however they're added.
+
+author: Teddy Tortorici
+"""
+
+import numpy as np
+from ring_buffer import RingBuffer
+
+
+def rows(start: int, stop: int) -> np.ndarray:
+    """Rows numbered start to stop - 1, in two columns"""
+    numbers = np.arange(start, stop, dtype=float)
+    return np.column_stack([numbers, -numbers])
+
+
+def test_fills_up():
+    buffer = RingBuffer(5, 2)
+    buffer.append(rows(0, 3))
+    assert len(buffer) == 3
+    np.testing.assert_array_equal(buffer.data, rows(0, 3))
+
+
+def test_wraps_around_one_row_at_a_time():
+    buffer = RingBuffer(5, 2)
+    for ii in range(23):
+        buffer.append(rows(ii, ii + 1))
+        np.testing.assert_array_equal(buffer.data, rows(max(0, ii - 4), ii + 1))
+
+
+def test_wraps_around_in_chunks():
+    buffer = RingBuffer(7, 2)
+    added = 0
+    for size in (3, 5, 6, 1, 7, 2, 4):
+        buffer.append(rows(added, added + size))
+        added += size
+        np.testing.assert_array_equal(buffer.data, rows(max(0, added - 7), added))
+
+
+def test_more_rows_than_capacity():
+    buffer = RingBuffer(4, 2)
+    buffer.append(rows(0, 2))
+    buffer.append(rows(2, 12))
+    np.testing.assert_array_equal(buffer.data, rows(8, 12))
+
+
+def test_data_is_a_view():
+    buffer = RingBuffer(4, 2)
+    buffer.append(rows(0, 6))
+    assert np.shares_memory(buffer.data, buffer.buffer)
+
+
+def test_clear():
+    buffer = RingBuffer(4, 2)
+    buffer.append(rows(0, 6))
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.append(rows(6, 7))
+    np.testing.assert_array_equal(buffer.data, rows(6, 7))
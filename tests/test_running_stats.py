@@ -0,0 +1,47 @@
+"""
+Tests for running_stats.RunningStats against numpy working on all the readings at once.
+
+author: Teddy Tortorici
+"""
+
+import numpy as np
+import pytest
+from running_stats import RunningStats
+
+
+def stats_of(values) -> RunningStats:
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+@pytest.mark.parametrize("values", [np.random.default_rng(1).normal(5., 2., 1000),
+                                    1e9 + np.random.default_rng(2).random(1000),     # big offset, small spread
+                                    np.array([3., 1., 4., 1., 5.])])
+def test_matches_numpy(values):
+    stats = stats_of(values)
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(np.mean(values), rel=1e-12)
+    # with a 1e9 offset, summing squares would lose every digit; Welford's method should keep all but a few
+    assert stats.std == pytest.approx(np.std(values, ddof=1), rel=1e-6)
+    assert stats.sem == pytest.approx(np.std(values, ddof=1) / np.sqrt(len(values)), rel=1e-6)
+    assert stats.min == np.min(values)
+    assert stats.max == np.max(values)
+
+
+def test_merge_matches_numpy():
+    values = np.random.default_rng(3).normal(0., 1., 500)
+    stats = stats_of(values[:123])
+    stats.merge(stats_of(values[123:]))
+    stats.merge(RunningStats())
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(np.mean(values), rel=1e-12)
+    assert stats.std == pytest.approx(np.std(values, ddof=1), rel=1e-9)
+    assert (stats.min, stats.max) == (np.min(values), np.max(values))
+
+
+def test_too_few_readings():
+    assert RunningStats().summary()[:3] == [0., 0., 0.]
+    stats = stats_of([2.])
+    assert (stats.mean, stats.std, stats.count) == (2., 0., 1)
@@ -0,0 +1,76 @@
+"""
+Tests for scheduler.PeriodicScheduler: runs stay on the start + n * period timeline instead of drifting, skipped runs
+are counted, and stop() takes effect right away.
+
+author: Teddy Tortorici
+"""
+
+import threading
+import time
+import pytest
+import tracing
+from scheduler import PeriodicScheduler
+
+
+def test_no_drift():
+    period = 0.02
+    scheduler = PeriodicScheduler(period)
+    ticks = []
+    while scheduler.wait():
+        ticks.append(time.monotonic())
+        time.sleep(period / 2)      # work that takes a while shouldn't push the later runs back
+        if len(ticks) == 50:
+            break
+    # if each wait were "period after the last run finished", this would be 50 % longer
+    assert ticks[-1] - ticks[0] == pytest.approx(49 * period, rel=0.1)
+    assert scheduler.ticks == 50
+    assert scheduler.missed <= 2        # only if the machine stalled for longer than the slack
+    assert scheduler.stats()["mean interval"] == pytest.approx(period, rel=0.1)
+
+
+def test_overruns_skip_deadlines():
+    period = 0.02
+    trace = tracing.Tracer()
+    scheduler = PeriodicScheduler(period, trace=trace, source="test")
+    start = time.monotonic()
+    while scheduler.wait():
+        time.sleep(1.5 * period)    # every run misses the next deadline
+        if scheduler.ticks == 10:
+            break
+    elapsed = time.monotonic() - start
+    # runs wait for the deadline after the one they missed, so the rate halves instead of running back to back
+    assert elapsed == pytest.approx(20 * period, rel=0.25)
+    assert scheduler.overruns == 9
+    assert scheduler.missed >= 9        # more if the machine was slow enough for a run to miss two
+    assert scheduler.stats()["missed fraction"] == pytest.approx(scheduler.missed / (10 + scheduler.missed))
+    assert [event[2] for event in trace.events()] == ["test"] * 9
+
+
+def test_no_period_runs_right_away():
+    scheduler = PeriodicScheduler()
+    start = time.monotonic()
+    for _ in range(100):
+        assert scheduler.wait()
+    assert time.monotonic() - start < 0.1
+
+
+def test_stop_interrupts_wait():
+    scheduler = PeriodicScheduler(60.)
+    results = []
+    thread = threading.Thread(target=lambda: results.extend([scheduler.wait(), scheduler.wait()]))
+    thread.start()
+    time.sleep(0.05)
+    stopped = time.monotonic()
+    scheduler.stop()
+    thread.join(5.)
+    assert time.monotonic() - stopped < 1.
+    assert results == [True, False]
+
+
+def test_reset():
+    scheduler = PeriodicScheduler(0.01)
+    scheduler.stop()
+    assert not scheduler.wait()
+    scheduler.reset()
+    assert scheduler.wait()
+    assert scheduler.ticks == 1
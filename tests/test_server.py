@@ -0,0 +1,174 @@
+"""
+Tests for server.GpibServer running in a thread with fake devices, talked to the way the clients do.
+
+author: Teddy Tortorici
+"""
+
+import random
+import socket
+import threading
+import time
+import pytest
+import client_tools
+import fake_gpib_devices
+import protocol
+from gpib import Fake
+from server import GpibServer
+
+
+class Echo(Fake):
+    """Answers every query with the query itself, after a short random wait so replies come back out of order"""
+    def query(self, msg: str) -> str:
+        time.sleep(random.random() * 0.002)
+        return msg
+
+
+class Log(Fake):
+    """Remembers what was written to it. Querying it gives everything written so far, in order"""
+    def __init__(self, address: int, gpib_num: int = 0):
+        super(self.__class__, self).__init__(address, gpib_num)
+        self.written = []
+
+    def write(self, msg: str):
+        time.sleep(random.random() * 0.002)
+        self.written.append(msg)
+
+    def query(self, msg: str) -> str:
+        return ",".join(self.written)
+
+
+class RunningServer:
+
+    def __init__(self, **kwargs):
+        """A GpibServer on a free port, running in a thread, with a fake LakeShore as "LS" and echoing devices as
+        "E0", "E1" and "E2" """
+        self.server = GpibServer(port=0, silent=True, devices={}, **kwargs)
+        self.server.devices.register("LS", lambda: fake_gpib_devices.LakeShore(13), "lakeshore")
+        for ii in range(3):
+            self.server.devices.register(f"E{ii}", lambda ii=ii: Echo(ii), f"echo {ii}")
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        deadline = time.monotonic() + 10.
+        while (self.server.loop is None or not self.server.host_port[1]) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.port = self.server.host_port[1]
+
+    def stop(self, timeout: float = 10.):
+        self.server.stop()
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+@pytest.fixture
+def running():
+    running = RunningServer()
+    yield running
+    running.stop()
+
+
+def test_stops_with_clients_connected(running):
+    client = client_tools.DeviceClient("LS", port=running.port)     # keeps its shared connection open
+    assert "*IDN?" in client.query("*IDN?")
+    idle = socket.create_connection(("localhost", running.port))   # connected but never sends anything
+    try:
+        assert running.stop(5.)
+    finally:
+        idle.close()
+
+
+def test_shutdown_command_with_clients_connected(running):
+    client = client_tools.DeviceClient("LS", port=running.port)
+    client.query("*IDN?")
+    with socket.create_connection(("localhost", running.port)) as shutdown:
+        shutdown.sendall(GpibServer.shutdown_command)
+        running.thread.join(5.)
+    assert not running.thread.is_alive()
+
+
+def test_replies_go_to_the_thread_that_asked(running):
+    connection = client_tools.Connection(port=running.port)
+    wrong = []
+
+    def ask(thread: int):
+        dev_id = f"E{thread % 3}"
+        for ii in range(50):
+            message = f"{dev_id}::Q::THREAD {thread} MESSAGE {ii}"
+            reply = connection.request(message)
+            if reply != f"THREAD {thread} MESSAGE {ii}":
+                wrong.append((message, reply))
+
+    threads = [threading.Thread(target=ask, args=(thread,)) for thread in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30.)
+    connection.close()
+    assert not wrong
+
+
+def test_device_clients_share_one_connection(running):
+    first = client_tools.DeviceClient("E0", port=running.port)
+    second = client_tools.DeviceClient("E1", port=running.port)
+    assert first.query("A?") == "A?"
+    assert second.query("B?") == "B?"
+    assert client_tools.get_connection(port=running.port) is client_tools.get_connection(port=running.port)
+    assert len(running.server.writers) == 1
+
+
+def test_lost_connection_raises(running):
+    connection = client_tools.Connection(port=running.port)
+    assert connection.request("E0::Q::A?") == "A?"
+    running.stop()
+    with pytest.raises(ConnectionError):
+        connection.request("E0::Q::B?")
+
+
+def test_batch_keeps_order(running):
+    running.server.devices.register("LOG", lambda: Log(20), "log")
+    batch = client_tools.Batch("LOG", port=running.port)
+    for ii in range(20):
+        batch.write(f"W{ii}")
+        if ii % 5 == 4:
+            batch.query(f"E{ii % 3}?", dev_id=f"E{ii % 3}")     # other devices, answered in between
+    last = batch.query("ALL?")
+    responses = batch.send()
+    assert len(responses) == 25
+    # writes to one device run in the order they were added, and every response is in the place of its message
+    assert responses[last] == ",".join(f"W{ii}" for ii in range(20))
+    assert [response for response in responses if response.startswith("E")] == ["E1?", "E0?", "E2?", "E1?"]
+    assert len(batch) == 0
+
+
+def test_batch_reports_errors_in_place(running):
+    batch = client_tools.Batch(port=running.port)
+    batch.query("A?", dev_id="E0")
+    batch.query("A?", dev_id="NOPE")
+    batch.query("B?", dev_id="E1")
+    responses = batch.send()
+    assert responses[0] == "A?" and responses[2] == "B?"
+    assert "NOPE" in responses[1]
+
+
+def test_subscribe_and_unsubscribe(running):
+    client = client_tools.DeviceClient("E0", port=running.port)
+    updates = []
+    subscription = client.subscribe("KRDG? A", lambda time_stamp, response: updates.append(response), period=0.05)
+    deadline = time.monotonic() + 5.
+    while len(updates) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert updates[:3] == ["KRDG? A"] * 3
+    assert client.latest("KRDG? A")[1] == "KRDG? A"
+    client.unsubscribe(subscription)
+    time.sleep(0.1)
+    count = len(updates)
+    time.sleep(0.2)
+    assert len(updates) == count
+    assert not running.server.poller.tasks
+    assert not running.server.poller.latest
+
+
+def test_bad_subscription_period_is_refused(running):
+    client = client_tools.DeviceClient("E0", port=running.port)
+    with pytest.raises(protocol.ProtocolError):
+        client.subscribe("KRDG? A", print, period=-1.)
+    assert not running.server.poller.tasks
@@ -0,0 +1,77 @@
+"""
+Tests for server_stats: latency histogram percentiles stay within a bucket's width of the exact ones, timeouts are
+recognized by their type, and stats are grouped by device and command.
+
+author: Teddy Tortorici
+"""
+
+import math
+import random
+import pytest
+import pyvisa
+import gpib
+from server_stats import LatencyHistogram, ServerStats, is_timeout
+
+precision = 1.6 / 100       # every bucket is within about 1.5% of the values in it
+
+
+def exact_percentile(values: list, percent: float) -> float:
+    """The value that percent percent of the values are at or below (the same ranking the histogram uses)"""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * percent / 100)) - 1]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_percentiles_match_exact(seed):
+    generator = random.Random(seed)
+    values = [generator.lognormvariate(math.log(0.01), 1.5) for _ in range(20000)]     # microseconds to seconds
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values)
+    assert histogram.min == min(values) and histogram.max == max(values)
+    assert histogram.total / histogram.count == pytest.approx(sum(values) / len(values))
+    for percent in (1, 10, 50, 90, 99, 99.9, 100):
+        # values under a microsecond share bucket 0, so allow that much as well
+        assert histogram.percentile(percent) == pytest.approx(exact_percentile(values, percent), rel=precision,
+                                                              abs=1e-6)
+
+
+def test_buckets_cover_every_value():
+    for microseconds in list(range(1000)) + [2 ** n + offset for n in range(10, 40) for offset in (-1, 0, 1)]:
+        index = LatencyHistogram.index(microseconds)
+        assert LatencyHistogram.value(index) == pytest.approx(microseconds * 1e-6, rel=precision / 2, abs=1e-6)
+        assert LatencyHistogram.index(microseconds + 1) >= index
+
+
+def test_empty_and_negative():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0.
+    assert histogram.summary() == {"count": 0}
+    histogram.record(-1.)       # a clock going backwards counts as no time
+    assert histogram.max == histogram.min == 0.
+    assert set(histogram.summary()) >= {"count", "mean ms", "p50 ms", "p99.9 ms", "max ms"}
+
+
+def test_is_timeout_goes_by_type():
+    timeout = pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+    other = pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_resource_not_found)
+    assert is_timeout(timeout)
+    assert is_timeout(gpib.visa_error(timeout))
+    assert is_timeout(TimeoutError())
+    assert not is_timeout(other)
+    assert not is_timeout(gpib.visa_error(other))
+    assert not is_timeout("timed out")      # a device answering with the words isn't a timeout
+    assert not is_timeout(ValueError("timeout"))
+
+
+def test_server_stats_groups_commands():
+    stats = ServerStats()
+    stats.get("LS", "Q", "KRDG? A").requests += 1
+    stats.get("LS", "Q", "KRDG? B").requests += 1
+    stats.get("LS", "W", "SETP 1,300").requests += 1
+    devices = stats.snapshot()["devices"]
+    assert devices["LS"]["Q KRDG?"]["requests"] == 2
+    assert devices["LS"]["W SETP"]["requests"] == 1
+    stats.reset()
+    assert stats.snapshot()["devices"] == {}
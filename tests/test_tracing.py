@@ -0,0 +1,94 @@
+"""
+Tests for tracing.Tracer: the ring buffer keeps the newest events, flushing saves each event once (and counts the
+ones overwritten first), and saved traces load and export back.
+
+author: Teddy Tortorici
+"""
+
+import csv
+import threading
+import tracing
+from tracing import Tracer
+
+
+def messages(events: list) -> list:
+    return [event[4]["n"] for event in events]
+
+
+def test_keeps_the_newest_events():
+    tracer = Tracer(capacity=8)
+    for n in range(20):
+        tracer.info("test", "event {n}", n=n)
+    assert tracer.recorded == 20
+    assert messages(tracer.events()) == list(range(12, 20))
+    assert messages(tracer.events(since=15)) == list(range(15, 20))
+    assert messages(tracer.events(since=3)) == list(range(12, 20))     # older ones are gone
+
+
+def test_level_filter():
+    tracer = Tracer(level=tracing.WARNING)
+    assert not tracer.enabled(tracing.INFO)
+    tracer.debug("test", "quiet", n=0)
+    tracer.info("test", "quiet", n=1)
+    tracer.warning("test", "loud", n=2)
+    tracer.error("test", "loud", n=3)
+    assert messages(tracer.events()) == [2, 3]
+
+
+def test_flush_saves_each_event_once(tmp_path):
+    filename = str(tmp_path / "trace.jsonl")
+    tracer = Tracer(capacity=4, filename=filename, flush_interval=60.)
+    tracer.info("test", "event {n}", n=0)
+    tracer.flush()
+    tracer.flush()
+    for n in range(1, 8):       # more than fit, so 3 are overwritten before they're saved
+        tracer.info("test", "event {n}", n=n)
+    tracer.close()
+    assert tracer.dropped == 3
+    assert messages(tracing.load(filename)) == [0, 4, 5, 6, 7]
+    tracer.flush_thread.join(1.)
+    assert not tracer.flush_thread.is_alive()
+
+
+def test_flushes_in_the_background(tmp_path):
+    filename = str(tmp_path / "trace.jsonl")
+    tracer = Tracer(filename=filename, flush_interval=0.02)
+    tracer.info("test", "event {n}", n=0)
+    tracer.closed.wait(0.2)
+    assert messages(tracing.load(filename)) == [0]
+    tracer.close()
+
+
+def test_recording_from_threads():
+    tracer = Tracer(capacity=1 << 12)
+
+    def record(thread):
+        for n in range(500):
+            tracer.debug("test", "{thread} {n}", thread=thread, n=n)
+    threads = [threading.Thread(target=record, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tracer.recorded == 2000
+    assert len(tracer.events()) == 2000
+
+
+def test_fields_named_like_arguments():
+    tracer = Tracer()
+    tracer.info("test", "{level} {message}", level="high", message="hello")
+    assert tracing.format_event(tracer.events()[0], start=0).endswith("test: high hello")
+
+
+def test_export_quotes_text(tmp_path):
+    tracer = Tracer()
+    tracer.info("server", 'Querying {dev_id} with "{message}"', dev_id="LS", message="KRDG? A, B")
+    trace_filename = str(tmp_path / "trace.jsonl")
+    csv_filename = str(tmp_path / "trace.csv")
+    tracer.dump(trace_filename)
+    tracing.export(tracing.load(trace_filename), csv_filename)
+    with open(csv_filename, newline="") as f:
+        rows = list(csv.reader(f, quoting=csv.QUOTE_NONNUMERIC))
+    assert rows[0] == ["Time [s]", "Level", "Source", "Message"]
+    assert rows[1][1:] == ["INFO", "server", 'Querying LS with "KRDG? A, B"']
+    assert rows[1][0] == tracer.events()[0][0]
@@ -0,0 +1,212 @@
+"""
+Records what the server and the GUI are doing without slowing them down the way printing does.
+
+Events go in a fixed size ring buffer in memory (the newest 'capacity' events are kept). An event below the tracer's
+level is dropped before anything about it is formatted, and events that are kept are only formatted when they're
+printed, saved or viewed. They can be saved to a JSON lines file by a background thread, and looked at later with
+    python tracing.py view [trace file] [--source server] [--level INFO] [--contains LS]
+or turned into a csv file with
+    python tracing.py export [trace file] [csv file]
+
+author: Teddy Tortorici
+"""
+
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+level_names = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+level_numbers = {name: number for number, name in level_names.items()}
+
+
+def format_event(event: tuple, start: float = None) -> str:
+    """
+    Turn an event into one line of text
+    :param event: (time stamp, level, source, message, fields)
+    :param start: show the time relative to this time stamp instead of the time of day
+    """
+    time_stamp, level, source, message, fields = event
+    if start is None:
+        when = time.strftime("%H:%M:%S", time.localtime(time_stamp)) + f".{int(time_stamp % 1 * 1e3):03d}"
+    else:
+        when = f"{time_stamp - start:12.6f}"
+    try:
+        text = message.format(**fields)
+    except (KeyError, IndexError, ValueError):
+        text = f"{message} {fields}"
+    return f"{when} {level_names.get(level, level):7s} {source}: {text}"
+
+
+class Tracer:
+
+    def __init__(self, capacity: int = 1 << 16, level: int = DEBUG, filename: str = None, flush_interval: float = 1.,
+                 echo: bool = False):
+        """
+        Records events in memory
+        :param capacity: most events to keep in memory. The oldest ones are overwritten past this
+        :param level: events below this level (DEBUG, INFO, WARNING, ERROR) aren't recorded
+        :param filename: JSON lines file to save events to in the background. None to only keep them in memory
+        :param flush_interval: how often (in seconds) to save new events to filename
+        :param echo: also print each event as it's recorded (slow, like print statements were)
+        """
+        self.capacity = capacity
+        self.level = level
+        self.echo = echo
+        self.buffer = [None] * capacity     # all the room for events is made up front
+        self.recorded = 0                   # number of events recorded (and the number of the next one)
+        # held only long enough to claim a slot, fill it and count it, so self.recorded never runs ahead of the buffer
+        self.record_lock = threading.Lock()
+        self.saved = 0                      # number of events saved to the file
+        self.dropped = 0                    # events overwritten before they could be saved
+
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()        # only for saving; recording never waits on it
+        self.closed = threading.Event()
+        self.flush_thread = None
+        if filename:
+            self.flush_thread = threading.Thread(target=self.flush_periodically, daemon=True)
+            self.flush_thread.start()
+
+    def enabled(self, level: int) -> bool:
+        """Check this before doing any work to make an event's fields"""
+        return level >= self.level
+
+    def record(self, level: int, source: str, template: str, /, **fields):
+        """
+        Record an event
+        :param level: DEBUG, INFO, WARNING or ERROR
+        :param source: what the event came from, like "server" or "data"
+        :param template: a format string for the fields, like 'Querying {dev_id} with "{message}"'. It's only
+        formatted when the event is shown
+        :param fields: values that go with the event (any names, even "message" or "level"). They should be JSON
+        serializable to be saved
+        """
+        if level < self.level:
+            return
+        event = (time.time(), level, source, template, fields)
+        with self.record_lock:
+            self.buffer[self.recorded % self.capacity] = event
+            self.recorded += 1
+        if self.echo:
+            print(format_event(event))
+
+    def debug(self, source: str, template: str, /, **fields):
+        self.record(DEBUG, source, template, **fields)
+
+    def info(self, source: str, template: str, /, **fields):
+        self.record(INFO, source, template, **fields)
+
+    def warning(self, source: str, template: str, /, **fields):
+        self.record(WARNING, source, template, **fields)
+
+    def error(self, source: str, template: str, /, **fields):
+        self.record(ERROR, source, template, **fields)
+
+    def events(self, since: int = 0) -> list:
+        """The events in memory, oldest first, starting from event number 'since' if it's still in memory"""
+        end = self.recorded
+        start = max(since, end - self.capacity)
+        return [self.buffer[number % self.capacity] for number in range(start, end)
+                if self.buffer[number % self.capacity] is not None]
+
+    def flush(self):
+        """Save events recorded since the last flush to the file"""
+        if not self.filename:
+            return
+        with self.lock:
+            end = self.recorded
+            if end - self.saved > self.capacity:
+                self.dropped += end - self.saved - self.capacity
+            events = self.events(self.saved)
+            self.saved = end
+            if events:
+                with open(self.filename, "a") as f:
+                    f.write("".join([event_to_json(event) + "\n" for event in events]))
+
+    def flush_periodically(self):
+        """Saves new events every flush_interval seconds until closed. This runs in its own thread"""
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def dump(self, filename: str):
+        """Save every event in memory to a file (whether or not this tracer saves to its own file)"""
+        with open(filename, "w") as f:
+            f.write("".join([event_to_json(event) + "\n" for event in self.events()]))
+
+    def close(self):
+        """Save whatever hasn't been saved and stop the background thread"""
+        self.closed.set()
+        self.flush()
+
+
+def event_to_json(event: tuple) -> str:
+    time_stamp, level, source, message, fields = event
+    return json.dumps({"t": time_stamp, "level": level_names.get(level, level), "source": source,
+                       "message": message, "fields": fields}, default=str)
+
+
+def load(filename: str) -> list:
+    """Read a trace file back into a list of events"""
+    events = []
+    with open(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                events.append((entry["t"], level_numbers.get(entry["level"], entry["level"]), entry["source"],
+                               entry["message"], entry["fields"]))
+    return events
+
+
+def view(events: list, source: str = None, level: int = DEBUG, contains: str = None, relative: bool = True):
+    """Print a timeline of events, optionally only ones from a source, at or above a level, or containing some text"""
+    start = events[0][0] if events and relative else None
+    for event in events:
+        if event[1] < level or (source and event[2] != source):
+            continue
+        line = format_event(event, start)
+        if contains and contains not in line:
+            continue
+        print(line)
+
+
+def export(events: list, csv_filename: str):
+    """
+    Save events to a csv file with columns for time, level, source and the formatted message. Text is quoted the
+    standard csv way, so messages keep their commas and quotes
+    """
+    with open(csv_filename, "w", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(["Time [s]", "Level", "Source", "Message"])
+        for event in events:
+            text = format_event(event, start=0).split(": ", 1)[-1]
+            writer.writerow([event[0], level_names.get(event[1], event[1]), event[2], text])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look at a trace file")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    view_parser = subparsers.add_parser("view", help="print the timeline of a trace file")
+    view_parser.add_argument("filename")
+    view_parser.add_argument("--source", default=None)
+    view_parser.add_argument("--level", default="DEBUG", choices=list(level_numbers))
+    view_parser.add_argument("--contains", default=None)
+    view_parser.add_argument("--clock", action="store_true", help="show the time of day instead of seconds since "
+                                                                  "the start")
+    export_parser = subparsers.add_parser("export", help="save a trace file as a csv file")
+    export_parser.add_argument("filename")
+    export_parser.add_argument("csv_filename")
+    args = parser.parse_args()
+
+    if args.action == "view":
+        view(load(args.filename), args.source, level_numbers[args.level], args.contains, not args.clock)
+    else:
+        export(load(args.filename), args.csv_filename)
+    sys.exit(0)